@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from backend.basket import baskets_with, recalculate_totals, recalculate_shop_totals
+from backend.caching import bump_catalog
+from backend.documents import refresh_documents, refresh_facets
 from backend.models import (
     User,
     Shop,
@@ -13,9 +16,80 @@ from backend.models import (
     OrderItem,
     Contact,
     ConfirmEmailToken,
+    ImportJob,
+    ShopOrder,
+    OutboxEmail,
 )
 
 
+class DocumentRefreshMixin:
+    # Удаление параметров не удаляет товар, поэтому документы поиска
+    # затронутых товаров пересобираем вручную. Сохранение обрабатывают сигналы
+    document_lookup = None
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        ids = list(
+            ProductInfo.objects.filter(**{self.document_lookup: queryset}).values_list(
+                "id", flat=True
+            )
+        )
+        super().delete_queryset(request, queryset)
+        refresh_documents(ProductInfo.objects.filter(id__in=ids))
+        bump_catalog()
+
+
+class CatalogDeleteMixin:
+    # Удаление из каталога сбрасывает кеш ответов каталога всех магазинов
+    # и пересчитывает корзины, позиции которых остаются без товара.
+    # Корзины и магазины собираются до удаления: после него ссылка позиции
+    # на товар обнуляется. Документы поиска удаленных товаров удаляет каскад,
+    # сводку фасетов магазинов пересобираем
+    product_info_lookup = None
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        product_infos = ProductInfo.objects.filter(
+            **{self.product_info_lookup: queryset}
+        )
+        baskets = list(
+            baskets_with(product_infos.values("id")).values_list("order_id", flat=True)
+        )
+        shop_ids = set(product_infos.values_list("shop_id", flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_facets(shop_ids)
+        bump_catalog()
+        if baskets:
+            recalculate_totals(Order.objects.filter(id__in=baskets))
+
+
+class OrderTotalsMixin:
+    # Правка позиций в админке пересчитывает итоги затронутых заказов
+    # и заказов магазинов
+    def save_model(self, request, obj, form, change):
+        order_ids = {obj.order_id, form.initial.get("order")}
+        super().save_model(request, obj, form, change)
+        self.recalculate(order_ids - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recalculate({obj.order_id})
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list("order_id", flat=True))
+        super().delete_queryset(request, queryset)
+        self.recalculate(order_ids)
+
+    @staticmethod
+    def recalculate(order_ids):
+        recalculate_totals(Order.objects.filter(id__in=order_ids))
+        recalculate_shop_totals(ShopOrder.objects.filter(order_id__in=order_ids))
+
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     # Панель управления пользователями
@@ -49,9 +123,10 @@ class CustomUserAdmin(UserAdmin):
 
 
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
+class ShopAdmin(CatalogDeleteMixin, admin.ModelAdmin):
     # Список магазинов
     model = Shop
+    product_info_lookup = "shop__in"
     list_display = ["id", "name", "user", "state"]
     search_fields = (
         "name",
@@ -61,17 +136,19 @@ class ShopAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(CatalogDeleteMixin, admin.ModelAdmin):
     # Список категорий
     model = Category
+    product_info_lookup = "product__category__in"
     list_display = ["id", "name"]
     search_fields = ("name",)
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(CatalogDeleteMixin, admin.ModelAdmin):
     # Список продуктов
     model = Product
+    product_info_lookup = "product__in"
     list_display = ["id", "name", "category"]
     search_fields = (
         "id",
@@ -81,8 +158,9 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductInfo)
-class ProductInfoAdmin(admin.ModelAdmin):
+class ProductInfoAdmin(CatalogDeleteMixin, admin.ModelAdmin):
     model = ProductInfo
+    product_info_lookup = "id__in"
     list_display = [
         "id",
         "model",
@@ -105,15 +183,16 @@ class ProductInfoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Parameter)
-class ParameterAdmin(admin.ModelAdmin):
+class ParameterAdmin(DocumentRefreshMixin, admin.ModelAdmin):
     # Список имен параметров
-    pass
+    document_lookup = "product_parameters__parameter__in"
 
 
 @admin.register(ProductParameter)
-class ProductParameterAdmin(admin.ModelAdmin):
+class ProductParameterAdmin(DocumentRefreshMixin, admin.ModelAdmin):
     # Список параметров
     model = ProductParameter
+    document_lookup = "product_parameters__in"
     list_display = ["product_name", "parameter", "value"]
     search_fields = ("parameter__name", "product_name", "value")
 
@@ -147,7 +226,8 @@ class ContactAdmin(admin.ModelAdmin):
 class OrderAdmin(admin.ModelAdmin):
     # Список заказов
     model = Order
-    list_display = ["id", "user", "datatime", "contact", "state"]
+    list_display = ["id", "user", "datatime", "contact", "state", "total_sum"]
+    readonly_fields = ("total_sum", "items_count")
     search_fields = (
         "id",
         "user__first_name",
@@ -155,8 +235,18 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ShopOrder)
+class ShopOrderAdmin(admin.ModelAdmin):
+    # Список заказов магазинов
+    model = ShopOrder
+    list_display = ["id", "order", "shop", "created_at", "state", "total_sum"]
+    readonly_fields = ("total_sum", "items_count")
+    list_filter = ("state",)
+    search_fields = ("order__id", "shop__name")
+
+
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(OrderTotalsMixin, admin.ModelAdmin):
     # Список заказанных позиций
     model = OrderItem
 
@@ -184,3 +274,17 @@ class ConfirmEmailTokenAdmin(admin.ModelAdmin):
         "key",
         "created_at",
     )
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    # Загрузки прайсов поставщиков
+    list_display = ("id", "user", "url", "state", "phase", "processed", "created_at")
+    list_filter = ("state",)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    # Очередь писем: что ушло, что ждет повтора и почему
+    list_display = ("id", "subject", "to", "state", "attempts", "next_attempt_at")
+    list_filter = ("state",)
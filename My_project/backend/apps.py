@@ -5,3 +5,7 @@ class BackendConfig(AppConfig):
     verbose_name = "Основная часть"
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend"
+
+    def ready(self):
+        # Подключаем обработчики сигналов
+        import backend.signals
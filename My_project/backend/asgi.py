@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+
+
+class AsyncURLConfRequest(ASGIRequest):
+    # Запросы под ASGI разрешаются по ASGI_URLCONF, а не по ROOT_URLCONF
+    @property
+    def urlconf(self):
+        return settings.ASGI_URLCONF
+
+
+class AsyncURLConfHandler(ASGIHandler):
+    request_class = AsyncURLConfRequest
+
+
+class ConcurrencyLimit:
+    # Не больше limit одновременно обрабатываемых HTTP запросов на процесс.
+    # Остальные ждут в очереди до timeout секунд, затем получают 503.
+    # limit=0 - без ограничения
+    def __init__(self, app, limit=None, timeout=None):
+        self.app = app
+        self.limit = settings.ASGI_CONCURRENCY_LIMIT if limit is None else limit
+        self.timeout = settings.ASGI_QUEUE_TIMEOUT if timeout is None else timeout
+        self.semaphore = asyncio.Semaphore(self.limit or 1)
+        self.active = self.waiting = self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limit:
+            return await self.app(scope, receive, send)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+        except TimeoutError:
+            self.rejected += 1
+            return await self.reject(send)
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+            self.semaphore.release()
+
+    async def reject(self, send):
+        body = json.dumps(
+            {"Status": False, "Error": "Сервер перегружен, повторите запрос позже"},
+            ensure_ascii=False,
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, round(self.timeout))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
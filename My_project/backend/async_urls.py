@@ -0,0 +1,25 @@
+from django.urls import path
+
+from backend import async_views
+from backend.urls import app_name, urlpatterns as sync_urlpatterns
+
+# Те же адреса и имена, что в backend.urls, но эндпоинты чтения обслуживают
+# асинхронные представления. Используется под ASGI (my_project.asgi_urls)
+ASYNC_VIEWS = {
+    "categories": async_views.CategoryView,
+    "shops": async_views.ShopView,
+    "products": async_views.ProductInfoView,
+    "order": async_views.OrderView,
+    "partner/orders": async_views.PartnerOrders,
+}
+
+urlpatterns = [
+    path(
+        str(pattern.pattern),
+        ASYNC_VIEWS[str(pattern.pattern)].as_view(),
+        name=pattern.name,
+    )
+    if str(pattern.pattern) in ASYNC_VIEWS
+    else pattern
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,248 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseBase, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from backend import views
+from backend.caching import (
+    acatalog_versions,
+    cached_response,
+    response_entry,
+    response_key,
+)
+from backend.models import Category, Shop
+from backend.pagination import AsyncPageNumberPagination, ProductCursorPagination
+from backend.replicas import SAFE_METHODS, ReplicaReadMixin, use_replica
+from backend.search import ProductSearch
+from backend.serializers import (
+    CategorySerializer,
+    ProductDocumentSerializer,
+    ShopSerializer,
+)
+
+# Асинхронные версии представлений для чтения: запросы к базе идут через
+# асинхронный ORM, кеш и throttling - через асинхронные методы хранилищ.
+# Ответы те же, что у синхронных представлений: JSON собирается теми же
+# сериализаторами и JSONRenderer. Подключаются только при запуске под ASGI
+# (my_project.asgi_urls), остальные методы этих адресов обрабатывают
+# синхронные представления
+
+
+async def authenticate(authenticator, request):
+    if isinstance(authenticator, SessionAuthentication):
+        # CSRF для GET не проверяется, нужен только пользователь сессии
+        user = await request._request.auser()
+        return (user, None) if user and user.is_active else None
+    if hasattr(authenticator, "aauthenticate"):
+        return await authenticator.aauthenticate(request)
+    return await sync_to_async(authenticator.authenticate)(request)
+
+
+class AsyncAPIView(View):
+    # Аутентификация, throttling и ошибки как у APIView: классы берутся
+    # у синхронного представления sync_view
+    sync_view = None
+    sync_handler = None
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        handler = sync_to_async(cls.sync_view.as_view())
+        return csrf_exempt(super().as_view(sync_handler=handler, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await self.sync_handler(request, *args, **kwargs)
+        sync_view = self.sync_view()
+        sync_view.setup(request, *args, **kwargs)
+        self.headers = sync_view.default_response_headers
+        self.sync_instance = sync_view
+        request = Request(request)
+        token = use_replica.set(False)
+        try:
+            await self.initial(request)
+            response = await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = self.handle_exception(request, exc)
+        finally:
+            use_replica.reset(token)
+        for key, value in self.headers.items():
+            response[key] = value
+        return response
+
+    async def initial(self, request):
+        for authenticator in self.get_authenticators():
+            try:
+                result = await authenticate(authenticator, request)
+            except exceptions.APIException:
+                request.user = api_settings.UNAUTHENTICATED_USER()
+                raise
+            if result is not None:
+                request.user, request.auth = result
+                break
+        else:
+            request.user = api_settings.UNAUTHENTICATED_USER()
+        await self.check_throttles(request)
+        await self.choose_database(request)
+
+    async def choose_database(self, request):
+        # Реплика для чтения, как у ReplicaReadMixin синхронного представления
+        if (
+            isinstance(self.sync_instance, ReplicaReadMixin)
+            and settings.DATABASE_REPLICAS
+        ):
+            keys = self.sync_instance.get_write_keys(request)
+            use_replica.set(not await cache.aget_many(keys))
+
+    def get_authenticators(self):
+        return [auth() for auth in self.sync_view.authentication_classes]
+
+    async def check_throttles(self, request):
+        durations = []
+        for throttle_class in self.sync_view.throttle_classes:
+            throttle = throttle_class()
+            if hasattr(throttle, "aallow_request"):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = throttle.allow_request(request, self)
+            if not allowed:
+                durations.append(throttle.wait())
+        if durations:
+            raise exceptions.Throttled(
+                max(
+                    (duration for duration in durations if duration is not None),
+                    default=None,
+                )
+            )
+
+    def handle_exception(self, request, exc):
+        # Первый класс аутентификации - сессия, у нее нет WWW-Authenticate,
+        # поэтому DRF отвечает 403, а не 401
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            authenticate_header = self.get_authenticators()[0].authenticate_header(
+                request
+            )
+            if authenticate_header:
+                exc.auth_header = authenticate_header
+            else:
+                exc.status_code = 403
+        response = exception_handler(exc, {"view": self, "request": request})
+        headers = {
+            key: value
+            for key, value in response.items()
+            if key in ("WWW-Authenticate", "Retry-After")
+        }
+        return self.render(response.data, response.status_code, headers)
+
+    @staticmethod
+    def render(data, status=200, headers=None):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            content_type="application/json",
+            status=status,
+            headers=headers,
+        )
+
+
+class CatalogListView(AsyncAPIView):
+    # Списки каталога с кешем ответов и ETag, как у CatalogCacheMixin
+    throttle_scope = "catalog"
+    pagination_class = AsyncPageNumberPagination
+
+    def get_catalog_versions(self, request):
+        return self.sync_view.get_catalog_versions(self, request)
+
+    async def get(self, request, *args, **kwargs):
+        version_keys = self.get_catalog_versions(request)
+        versions = await acatalog_versions(version_keys)
+        key = response_key(request, request.query_params, version_keys, versions)
+        cached = await cache.aget(key)
+        if cached is None:
+            data = await self.get_data(request)
+            if isinstance(data, HttpResponseBase):
+                return data
+            cached = response_entry(data)
+            await cache.aset(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        return cached_response(request, cached)
+
+    async def get_data(self, request):
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(self.get_queryset(), request, self)
+        serializer = self.serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data
+
+
+class CategoryView(CatalogListView):
+    sync_view = views.CategoryView
+    serializer_class = CategorySerializer
+
+    def get_queryset(self):
+        return Category.objects.all()
+
+
+class ShopView(CatalogListView):
+    sync_view = views.ShopView
+    serializer_class = ShopSerializer
+
+    def get_queryset(self):
+        return Shop.objects.filter(state=True)
+
+
+class ProductInfoView(CatalogListView):
+    sync_view = views.ProductInfoView
+    serializer_class = ProductDocumentSerializer
+    pagination_class = ProductCursorPagination
+
+    async def get_data(self, request):
+        try:
+            search = ProductSearch(request.query_params)
+        except ValueError as error:
+            return JsonResponse(
+                {"Status": False, "Errors": str(error)},
+                json_dumps_params={"ensure_ascii": False},
+                status=400,
+            )
+        queryset = views.product_documents(request.query_params, search)
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        serializer = self.serializer_class(page, many=True)
+        data = paginator.get_paginated_response(serializer.data).data
+        # Фасеты только с первой страницей, как в синхронной версии
+        if not request.query_params.get("cursor"):
+            data["facets"] = await search.afacets(
+                queryset, views.catalog_scope(request.query_params)
+            )
+        return data
+
+
+class OrderView(AsyncAPIView):
+    # Заказы пользователя; оформление заказа (POST) - синхронное представление
+    sync_view = views.OrderView
+
+    async def get(self, request, *args, **kwargs):
+        response = views.login_required(request)
+        if response:
+            return response
+        orders = views.placed_orders(request.user.id)
+        return self.render(await views.placed_order_serializer.aserialize(orders))
+
+
+class PartnerOrders(AsyncAPIView):
+    sync_view = views.PartnerOrders
+
+    async def get(self, request, *args, **kwargs):
+        response = views.login_required(request) or views.only_for_shops(request)
+        if response:
+            return response
+        orders = views.shop_orders(request.user.id)
+        return self.render(await views.shop_order_serializer.aserialize(orders))
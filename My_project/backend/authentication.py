@@ -0,0 +1,231 @@
+from collections import OrderedDict
+from copy import copy
+from datetime import timedelta
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from backend.caching import new_version
+
+# Версия токена в общем кеше: меняется при изменении пользователя, удалении
+# токена и входе. Запись кеша токенов запоминает версию, с которой была
+# построена, и при несовпадении читается из базы заново. Так изменение,
+# сделанное в одном процессе, видят все процессы с общим кешем (Redis)
+# Версия создается только для найденного в базе токена и хранится
+# AUTH_TOKEN_CACHE_TIMEOUT секунд с последней выборки: случайные ключи
+# не занимают общий кеш. Сам токен в ключ не попадает, только его хеш
+TOKEN_VERSION = "auth:version:token:{}"
+
+
+def version_key(key):
+    return TOKEN_VERSION.format(sha256(key.encode()).hexdigest()[:32])
+
+
+class TokenCache:
+    # Токен -> пользователь в памяти процесса: не больше size записей
+    # (вытесняются давно не использованные) и не дольше timeout секунд
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] > monotonic():
+                self.entries.move_to_end(key)
+                return entry
+            if entry is not None:
+                del self.entries[key]
+            return None
+
+    def set(self, key, token, version):
+        with self.lock:
+            self.entries[key] = {
+                "token": token,
+                "version": version,
+                "expires": monotonic() + self.timeout,
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                if self.entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+
+def token_expired(token):
+    # AUTH_TOKEN_TTL - срок жизни токена в секундах, 0 - бессрочно
+    ttl = settings.AUTH_TOKEN_TTL
+    return bool(ttl) and token.created + timedelta(seconds=ttl) <= now()
+
+
+def bump_token_versions(version_keys):
+    # Сменить версии токенов; отсутствующая версия создается, чтобы выборка,
+    # начатая до сброса, не закешировала старые данные (см. remember_token)
+    for key in version_keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, new_version(), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def remember_token(key, token, version):
+    # Закешировать токен, найденный в базе. version - версия, прочитанная до
+    # выборки. Если ее не было, версия создается сейчас; если ее успел
+    # создать сброс, данные могли устареть и не кешируются
+    timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+    if version is None:
+        version = new_version()
+        if not cache.add(version_key(key), version, timeout):
+            return
+    else:
+        cache.touch(version_key(key), timeout)
+    token_cache.set(key, token, version)
+
+
+async def aremember_token(key, token, version):
+    timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+    if version is None:
+        version = new_version()
+        if not await cache.aadd(version_key(key), version, timeout):
+            return
+    else:
+        await cache.atouch(version_key(key), timeout)
+    token_cache.set(key, token, version)
+
+
+def invalidate_tokens(keys):
+    # Сбросить закешированные токены во всех процессах
+    # Версия меняется сразу и еще раз после фиксации: до фиксации
+    # параллельный запрос читает из базы старые данные и может закешировать
+    # их под уже новой версией
+    version_keys = [version_key(key) for key in keys]
+    token_cache.discard(keys)
+    bump_token_versions(version_keys)
+    transaction.on_commit(lambda: bump_token_versions(version_keys))
+    transaction.on_commit(lambda: token_cache.discard(keys))
+
+
+def invalidate_user(user_id):
+    invalidate_tokens(
+        list(Token.objects.filter(user_id=user_id).values_list("pk", flat=True))
+    )
+
+
+def issue_token(user):
+    # Токен для входа: существующий, если он не устарел, иначе новый
+    # При AUTH_TOKEN_ROTATE_ON_LOGIN каждый вход выдает новый токен,
+    # а старый перестает действовать
+    token = Token.objects.filter(user=user).first()
+    if token is not None and (
+        settings.AUTH_TOKEN_ROTATE_ON_LOGIN or token_expired(token)
+    ):
+        token.delete()
+        token = None
+    if token is None:
+        token = Token.objects.create(user=user)
+    invalidate_user(user.id)
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # TokenAuthentication с кешем: повторные запросы с тем же токеном не
+    # обращаются к базе, пока не изменится пользователь или его токен
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        # Версия читается до выборки из базы: если пользователь изменится
+        # после выборки, версия сменится и запись не будет использована
+        current = cache.get(version_key(key))
+        if entry is not None and current is not None and entry["version"] == current:
+            token_cache.count(hit=True)
+            return self.check(copy(entry["token"]))
+        token_cache.count(hit=False)
+        try:
+            token = Token.objects.select_related("user").get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed("Недействительный токен")
+        remember_token(key, token, current)
+        return self.check(copy(token))
+
+    async def aauthenticate(self, request):
+        # Для асинхронных представлений: заголовок разбирается так же,
+        # токен проверяется через асинхронные кеш и ORM
+        key = TokenHeader().authenticate(request)
+        if key is None:
+            return None
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        current = await cache.aget(version_key(key))
+        if entry is not None and current is not None and entry["version"] == current:
+            token_cache.count(hit=True)
+            return self.check(copy(entry["token"]))
+        token_cache.count(hit=False)
+        try:
+            token = await Token.objects.select_related("user").aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed("Недействительный токен")
+        await aremember_token(key, token, current)
+        return self.check(copy(token))
+
+    def check(self, token):
+        # Каждый запрос получает свою копию пользователя: изменения в одном
+        # запросе не должны попасть в другой через общий кеш
+        if token_expired(token):
+            raise exceptions.AuthenticationFailed("Срок действия токена истек")
+        user = copy(token.user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("Пользователь не активен или удален")
+        token.user = user
+        return user, token
+
+
+class TokenHeader(TokenAuthentication):
+    # Только разбор заголовка Authorization: возвращает ключ токена
+    def authenticate_credentials(self, key):
+        return key
@@ -0,0 +1,272 @@
+from django.db import transaction
+from django.db.models import BigIntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+from backend.caching import bump_stock
+from backend.documents import refresh_facets
+from backend.models import (
+    Contact,
+    Order,
+    OrderItem,
+    ProductInfo,
+    ProductDocument,
+    ShopOrder,
+)
+
+
+# Поля позиции, которые копируются из каталога при оформлении заказа
+SNAPSHOT_FIELDS = ("product_name", "model", "shop_name", "price", "price_rrc")
+
+
+class BasketError(Exception):
+    # Ошибка в позициях корзины, текст уходит клиенту
+    pass
+
+
+def join_ids(ids):
+    return ", ".join(map(str, sorted(ids)))
+
+
+def check_stock(quantities, stock):
+    # quantities и stock - словари id -> запрошенное количество и остаток
+    short = {
+        key for key, quantity in quantities.items() if quantity > stock.get(key, 0)
+    }
+    if short:
+        raise BasketError(f"Недостаточно товара на складе: {join_ids(short)}")
+
+
+def recalculate_totals(orders):
+    # Пересчитать сохраненные итоги заказов выборки одним UPDATE
+    # Оформленные позиции считаются по цене из снимка, позиции корзины -
+    # по текущей цене каталога. Позиции корзины без товара в сумму не входят
+    return update_totals(orders, "order_id")
+
+
+def recalculate_shop_totals(shop_orders):
+    # То же для заказов магазинов
+    return update_totals(shop_orders, "shop_order_id")
+
+
+def update_totals(queryset, key):
+    # key - поле позиции, которое ссылается на строку выборки
+    lines = OrderItem.objects.filter(**{key: OuterRef("pk")}).order_by().values(key)
+    total_sum = lines.annotate(
+        total=Sum(
+            Cast("quantity", BigIntegerField())
+            * Coalesce("price", "product_info__price"),
+            output_field=BigIntegerField(),
+        )
+    ).values("total")
+    items_count = lines.annotate(count=Sum("quantity")).values("count")
+    return queryset.order_by().update(
+        total_sum=Coalesce(Subquery(total_sum), 0),
+        items_count=Coalesce(Subquery(items_count), 0),
+    )
+
+
+def baskets_with(product_info_ids):
+    # Корзины, в которых лежат эти товары
+    return OrderItem.objects.filter(
+        order__state="basket", product_info_id__in=product_info_ids
+    ).values("order_id")
+
+
+def recalculate_baskets(product_info_ids):
+    # Пересчитать корзины с этими товарами после смены цены
+    # Итоги оформленных заказов зафиксированы и не меняются
+    return recalculate_totals(
+        Order.objects.filter(id__in=baskets_with(product_info_ids))
+    )
+
+
+def add_to_basket(user_id, items):
+    # Добавить позиции в корзину пользователя
+    # items - список словарей product_info и quantity, уже проверенных по формату
+    # Повторы одного товара в запросе складываются, а товар, который уже
+    # лежит в корзине, получает новое количество. Наличие и остатки товаров
+    # проверяются одним запросом, позиции пишутся одним INSERT ... ON CONFLICT, поэтому число
+    # запросов не зависит от размера корзины. Корзина меняется целиком или никак
+    quantities = {}
+    for item in items:
+        quantities[item["product_info"]] = (
+            quantities.get(item["product_info"], 0) + item["quantity"]
+        )
+    with transaction.atomic():
+        basket, _ = Order.objects.get_or_create(user_id=user_id, state="basket")
+        product_infos = ProductInfo.objects.filter(id__in=quantities).values_list(
+            "id", "shop_id", "product__category_id", "quantity"
+        )
+        order_items = []
+        stock = {}
+        for product_info_id, shop_id, category_id, in_stock in product_infos:
+            stock[product_info_id] = in_stock
+            order_items.append(
+                OrderItem(
+                    order_id=basket.id,
+                    product_info_id=product_info_id,
+                    shop_id=shop_id,
+                    category_id=category_id,
+                    quantity=quantities[product_info_id],
+                )
+            )
+        missing = set(quantities) - set(stock)
+        if missing:
+            raise BasketError(f"Товары не найдены: {join_ids(missing)}")
+        check_stock(quantities, stock)
+        OrderItem.objects.bulk_create(
+            order_items,
+            update_conflicts=True,
+            unique_fields=["order", "product_info"],
+            update_fields=["quantity"],
+        )
+        recalculate_totals(Order.objects.filter(id=basket.id))
+    return len(order_items)
+
+
+def update_basket(user_id, items):
+    # Изменить количество позиций корзины пользователя
+    # items - список словарей id позиции и quantity, уже проверенных по формату
+    # Позиции и остатки читаются одним запросом, новые количества пишутся
+    # одним UPDATE. Позиции не из корзины пользователя пропускаются
+    quantities = {item["id"]: item["quantity"] for item in items}
+    with transaction.atomic():
+        order_items = OrderItem.objects.filter(
+            order__user_id=user_id, order__state="basket", id__in=quantities
+        ).values_list("id", "product_info__quantity")
+        stock = {
+            order_item_id: in_stock or 0 for order_item_id, in_stock in order_items
+        }
+        check_stock({key: quantities[key] for key in stock}, stock)
+        OrderItem.objects.bulk_update(
+            [
+                OrderItem(id=order_item_id, quantity=quantities[order_item_id])
+                for order_item_id in stock
+            ],
+            ["quantity"],
+        )
+        recalculate_totals(Order.objects.filter(user_id=user_id, state="basket"))
+    return len(stock)
+
+
+def place_order(user_id, order_id, contact_id):
+    # Оформить корзину как заказ и списать товары со склада
+    # Все делается в одной транзакции: либо списаны все позиции и заказ
+    # оформлен, либо не изменилось ничего. Строки товаров блокируются
+    # SELECT ... FOR UPDATE по возрастанию id, поэтому параллельные заказы
+    # с общими товарами ждут друг друга, а не попадают во взаимную блокировку,
+    # и остаток не может уйти в минус. Число запросов не зависит от размера заказа
+    with transaction.atomic():
+        order = (
+            Order.objects.select_for_update()
+            .filter(id=order_id, user_id=user_id, state="basket")
+            .first()
+        )
+        if order is None:
+            raise BasketError("Корзина не найдена")
+        if not Contact.objects.filter(id=contact_id, user_id=user_id).exists():
+            raise BasketError("Контакт не найден")
+        lines = list(
+            OrderItem.objects.filter(order_id=order.id).values(
+                "id",
+                "product_info_id",
+                "quantity",
+                "product_info__shop_id",
+                "product_info__product__name",
+                "product_info__model",
+                "product_info__shop__name",
+                "product_info__price",
+                "product_info__price_rrc",
+            )
+        )
+        if not lines:
+            raise BasketError("Корзина пуста")
+        quantities = {line["product_info_id"]: line["quantity"] for line in lines}
+        if None in quantities:
+            raise BasketError("В корзине есть товары, которые больше не продаются")
+        # Заказ делится на заказы магазинов, снимок товаров и итоги
+        # фиксируются по ценам на момент оформления
+        shop_orders = {}
+        for line in lines:
+            shop_order = shop_orders.setdefault(
+                line["product_info__shop_id"],
+                ShopOrder(order_id=order.id, shop_id=line["product_info__shop_id"]),
+            )
+            shop_order.total_sum += line["quantity"] * line["product_info__price"]
+            shop_order.items_count += line["quantity"]
+        ShopOrder.objects.bulk_create(shop_orders.values())
+        OrderItem.objects.bulk_update(
+            [
+                OrderItem(
+                    id=line["id"],
+                    shop_id=line["product_info__shop_id"],
+                    shop_order_id=shop_orders[line["product_info__shop_id"]].id,
+                    product_name=line["product_info__product__name"],
+                    model=line["product_info__model"],
+                    shop_name=line["product_info__shop__name"],
+                    price=line["product_info__price"],
+                    price_rrc=line["product_info__price_rrc"],
+                )
+                for line in lines
+            ],
+            ["shop", "shop_order", *SNAPSHOT_FIELDS],
+        )
+        order.contact_id = contact_id
+        order.state = "new"
+        order.total_sum = sum(
+            shop_order.total_sum for shop_order in shop_orders.values()
+        )
+        order.items_count = sum(quantities.values())
+        order.save(update_fields=["contact", "state", "total_sum", "items_count"])
+        # Товары блокируются последними, чтобы популярный товар
+        # был заблокирован как можно меньше времени
+        stock = {}
+        shop_of = {}
+        for product_info_id, in_stock, shop_id in (
+            ProductInfo.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by("id")
+            .values_list("id", "quantity", "shop_id")
+        ):
+            stock[product_info_id] = in_stock
+            shop_of[product_info_id] = shop_id
+        shop_ids = set(shop_of.values())
+        check_stock(quantities, stock)
+        # Строки заблокированы, поэтому новые остатки считаются здесь
+        # и пишутся одним UPDATE в товары и в документы поиска
+        ProductInfo.objects.bulk_update(
+            [
+                ProductInfo(id=key, quantity=stock[key] - quantities[key])
+                for key in quantities
+            ],
+            ["quantity"],
+        )
+        ProductDocument.objects.bulk_update(
+            [
+                ProductDocument(
+                    product_info_id=key, quantity=stock[key] - quantities[key]
+                )
+                for key in quantities
+            ],
+            ["quantity"],
+        )
+        # Распроданные товары уходят из фасетов "в наличии". Сводка
+        # пересобирается после фиксации: блокировка магазинов внутри заказа
+        # могла бы встать в очередь за сменой статуса магазина
+        sold_out = {
+            shop_id for key, shop_id in shop_of.items() if stock[key] == quantities[key]
+        }
+        if sold_out:
+            transaction.on_commit(lambda: refresh_facets(sold_out))
+        bump_stock(shop_ids)
+    return order
+
+
+def remove_from_basket(user_id, ids):
+    # Удалить позиции из корзины пользователя и пересчитать ее итоги
+    with transaction.atomic():
+        deleted, _ = OrderItem.objects.filter(
+            order__user_id=user_id, order__state="basket", id__in=ids
+        ).delete()
+        recalculate_totals(Order.objects.filter(user_id=user_id, state="basket"))
+    return deleted
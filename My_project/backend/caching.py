@@ -0,0 +1,140 @@
+from hashlib import md5
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from backend.replicas import CATALOG_WRITES, SHOP_WRITES, remember_write
+
+# Версии каталога входят в ключ кеша ответов, поэтому смена версии
+# делает недоступными все ответы, построенные по старым данным.
+# Общая версия меняется при любом изменении каталога, кроме остатков, версия
+# магазина - при изменении его товаров, базовая - при изменениях, общих для
+# всех магазинов (категории, названия товаров и параметров)
+CATALOG_VERSION = "catalog:version"
+BASE_VERSION = "catalog:version:base"
+SHOP_VERSION = "catalog:version:shop:{}"
+
+
+def new_version():
+    # Версия начинается со времени, а не с единицы: если ключ версии вытеснят
+    # из кеша, новая версия не совпадет со старой и старый ответ не отдастся
+    return int(time() * 1000)
+
+
+def catalog_versions(keys):
+    # Текущие версии по списку ключей, недостающие создаются
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+async def acatalog_versions(keys):
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, new_version(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return versions
+
+
+def bump_catalog(shop_ids=None):
+    # Сменить версию каталога магазинов shop_ids, без shop_ids - всех магазинов
+    # Версия меняется после фиксации транзакции, иначе параллельный запрос
+    # успеет положить в кеш еще не измененные данные под новой версией
+    keys = [CATALOG_VERSION]
+    if shop_ids is None:
+        keys.append(BASE_VERSION)
+    else:
+        keys.extend(SHOP_VERSION.format(shop_id) for shop_id in shop_ids)
+    transaction.on_commit(lambda: catalog_changed(keys))
+
+
+def bump_stock(shop_ids):
+    # Остатки меняются каждым заказом, поэтому сбрасывается только выдача
+    # магазинов shop_ids. Категории и магазины от остатков не зависят, а общая
+    # выдача товаров показывает старые остатки не дольше CATALOG_CACHE_TIMEOUT:
+    # заказ все равно проверяет остатки по базе
+    keys = [SHOP_VERSION.format(shop_id) for shop_id in shop_ids]
+    transaction.on_commit(lambda: stock_changed(shop_ids, keys))
+
+
+def stock_changed(shop_ids, keys):
+    increment(keys)
+    for shop_id in shop_ids:
+        remember_write(SHOP_WRITES.format(shop_id))
+
+
+def catalog_changed(keys):
+    increment(keys)
+    # Пока реплики не догнали изменение, каталог читается из основной базы
+    remember_write(CATALOG_WRITES)
+
+
+def increment(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, new_version(), timeout=None)
+
+
+def response_key(request, params, version_keys, versions):
+    # Ключ ответа: адрес, параметры запроса и версии каталога
+    return (
+        "catalog:response:"
+        + md5(
+            repr(
+                (
+                    request.build_absolute_uri(request.path),
+                    sorted(params.lists()),
+                    [versions[version_key] for version_key in version_keys],
+                )
+            ).encode()
+        ).hexdigest()
+    )
+
+
+def response_entry(data):
+    content = JSONRenderer().render(data)
+    return f'"{md5(content).hexdigest()}"', content
+
+
+def cached_response(request, cached):
+    etag, content = cached
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in if_none_match or "*" in if_none_match:
+        return HttpResponseNotModified(headers={"ETag": etag})
+    return HttpResponse(
+        content, content_type="application/json", headers={"ETag": etag}
+    )
+
+
+class CatalogCacheMixin:
+    # Кеширование ответов списков каталога с поддержкой ETag/If-None-Match
+    # Ключ строится из адреса, параметров запроса и версий каталога
+    # Кешируются только ответы в JSON со статусом 200
+    def get_catalog_versions(self, request):
+        return [CATALOG_VERSION]
+
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return super().get(request, *args, **kwargs)
+        version_keys = self.get_catalog_versions(request)
+        versions = catalog_versions(version_keys)
+        key = response_key(request, request.query_params, version_keys, versions)
+        cached = cache.get(key)
+        if cached is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = response_entry(response.data)
+            cache.set(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        return cached_response(request, cached)
@@ -0,0 +1,45 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseCreation
+
+from backend.db_pool.pool import close_pools, get_pool
+
+
+class DatabaseCreation(BaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Базу нельзя удалить, пока в пуле остаются соединения с ней
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # PostgreSQL с пулом соединений: настройки пула - OPTIONS["pool"]
+    # (max_size, timeout, max_lifetime, check). close() возвращает соединение
+    # в пул вместо закрытия. Служебные подключения без имени базы (создание
+    # тестовой базы) идут мимо пула
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options or not self.settings_dict["NAME"]:
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(conn_params, options)
+        return self.pool.getconn(partial(super().get_new_connection, conn_params))
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # Соединение закрывается посреди транзакции: обертка продолжает
+            # на него ссылаться, поэтому в пул оно не возвращается
+            self.pool.discard(self.connection)
+        else:
+            self.pool.putconn(self.connection)
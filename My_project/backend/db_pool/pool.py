@@ -0,0 +1,254 @@
+import os
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+# Пул соединений с PostgreSQL в памяти процесса. Django закрывает соединение
+# в конце каждого запроса (CONN_MAX_AGE=0), с пулом закрытие возвращает
+# соединение в пул, а следующий запрос берет его без нового подключения.
+# Работает одинаково под WSGI (соединение на поток) и ASGI (асинхронный ORM
+# выполняет запросы в потоках), число соединений процесса не больше max_size
+
+pools = {}
+pools_lock = Lock()
+
+
+class ConnectionPool:
+    # max_size - соединений на процесс, timeout - сколько секунд ждать
+    # свободного, max_lifetime - через сколько секунд соединение закрывается
+    # и заменяется новым, check - проверять соединение запросом при выдаче
+    def __init__(
+        self,
+        max_size=10,
+        timeout=10,
+        max_lifetime=3600,
+        check=True,
+        name="",
+        dbname=None,
+    ):
+        self.name = name
+        self.dbname = dbname
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check = check
+        self.condition = Condition()
+        self.idle = deque()
+        self.created = {}
+        self.size = 0
+        self.waiting = 0
+        self.closed = False
+        self.checkouts = self.waits = self.timeouts = 0
+        self.opened = self.recycled = self.broken = 0
+        self.wait_time = self.wait_max = 0.0
+
+    def getconn(self, connect):
+        # connect - функция, открывающая новое соединение
+        started = monotonic()
+        while True:
+            connection = self.take(started)
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    self.release()
+                    raise
+                with self.condition:
+                    self.created[connection] = monotonic()
+                    self.opened += 1
+                return connection
+            if self.healthy(connection):
+                return connection
+            self.discard(connection, broken=True)
+
+    def take(self, started):
+        # Свободное соединение, либо None - можно открыть новое
+        with self.condition:
+            waited = False
+            while True:
+                if self.closed:
+                    raise psycopg2.OperationalError("Пул соединений закрыт")
+                connection = None
+                # Пришедший поток не обгоняет ждущих: иначе вернувший
+                # соединение поток сразу забирает его снова, а ждущие
+                # простаивают до таймаута
+                while self.idle and (waited or not self.waiting):
+                    connection = self.idle.pop()
+                    if not self.expired(connection):
+                        break
+                    self.close(connection)
+                    self.recycled += 1
+                    connection = None
+                if connection is not None or (
+                    self.size < self.max_size and (waited or not self.waiting)
+                ):
+                    if connection is None:
+                        self.size += 1
+                    self.checkouts += 1
+                    if waited:
+                        elapsed = monotonic() - started
+                        self.waits += 1
+                        self.wait_time += elapsed
+                        self.wait_max = max(self.wait_max, elapsed)
+                    return connection
+                remaining = started + self.timeout - monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    # Пробуждение могло достаться этому потоку, передаем
+                    # его следующему ждущему
+                    self.condition.notify()
+                    raise psycopg2.OperationalError(
+                        f"Нет свободных соединений в пуле за {self.timeout} с "
+                        f"(занято {self.size} из {self.max_size})"
+                    )
+                waited = True
+                self.waiting += 1
+                self.condition.wait(remaining)
+                self.waiting -= 1
+
+    def healthy(self, connection):
+        if connection.closed:
+            return False
+        if not self.check:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def putconn(self, connection):
+        # Соединение возвращается в пул без открытой транзакции
+        if (
+            not connection.closed
+            and connection.info.transaction_status != TRANSACTION_STATUS_IDLE
+        ):
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                pass
+        if connection.closed or (
+            connection.info.transaction_status != TRANSACTION_STATUS_IDLE
+        ):
+            return self.discard(connection, broken=True)
+        with self.condition:
+            if self.closed or self.expired(connection):
+                if not self.closed:
+                    self.recycled += 1
+                self.close(connection)
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection, broken=False):
+        # Закрыть соединение, не возвращая его в пул
+        with self.condition:
+            if broken:
+                self.broken += 1
+            self.close(connection)
+            self.condition.notify()
+
+    def release(self):
+        # Новое соединение не открылось, место в пуле освобождается
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def close(self, connection):
+        # Вызывается под self.condition
+        self.size -= 1
+        self.created.pop(connection, None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def expired(self, connection):
+        created = self.created.get(connection)
+        return (
+            bool(self.max_lifetime)
+            and created is not None
+            and monotonic() - created >= self.max_lifetime
+        )
+
+    def close_all(self):
+        # Закрыть свободные соединения; занятые закроются при возврате
+        with self.condition:
+            self.closed = True
+            while self.idle:
+                self.close(self.idle.pop())
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "max_size": self.max_size,
+                "size": self.size,
+                "in_use": self.size - len(self.idle),
+                "idle": len(self.idle),
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 4),
+                "wait_max": round(self.wait_max, 4),
+                "timeouts": self.timeouts,
+                "opened": self.opened,
+                "recycled": self.recycled,
+                "broken": self.broken,
+            }
+
+
+def get_pool(conn_params, options):
+    # Один пул на набор параметров подключения, общий для всех потоков
+    key = repr(sorted(conn_params.items()))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None or pool.closed:
+            dbname = conn_params.get("dbname")
+            pool = pools[key] = ConnectionPool(
+                name="{}:{}/{}".format(
+                    conn_params.get("host", ""), conn_params.get("port", ""), dbname
+                ),
+                dbname=dbname,
+                **options,
+            )
+        return pool
+
+
+def close_pools(dbname=None):
+    # Закрыть пулы базы dbname, без dbname - все
+    with pools_lock:
+        for key, pool in list(pools.items()):
+            if dbname is None or pool.dbname == dbname:
+                pool.close_all()
+                del pools[key]
+
+
+def pool_stats():
+    # Статистика пулов процесса: адрес базы -> счетчики
+    with pools_lock:
+        return {pool.name: pool.stats() for pool in pools.values()}
+
+
+# Соединения, унаследованные от родительского процесса
+inherited = []
+
+
+def forget_pools():
+    # После fork соединения родителя нельзя ни использовать, ни закрывать:
+    # закрытие отправит серверу завершение сеанса, которым пользуется
+    # родитель. Они остаются в памяти до конца процесса
+    global pools_lock
+    pools_lock = Lock()
+    for pool in pools.values():
+        inherited.extend(pool.created)
+    pools.clear()
+
+
+os.register_at_fork(after_in_child=forget_pools)
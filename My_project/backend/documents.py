@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Min, Q
+
+from backend.models import (
+    ProductInfo,
+    ProductParameter,
+    ProductDocument,
+    ProductFacet,
+    ProductPriceRange,
+    Shop,
+)
+
+# Словарь полнотекстового поиска Postgres со стеммингом для русского языка
+SEARCH_CONFIG = "russian"
+
+DOCUMENT_FIELDS = (
+    "external_id",
+    "model",
+    "name",
+    "category_id",
+    "category_name",
+    "shop_id",
+    "shop_name",
+    "shop_state",
+    "quantity",
+    "price",
+    "price_rrc",
+    "parameters",
+    "keywords",
+)
+
+
+def search_vector():
+    # Поисковый вектор документа: название, модель и значения параметров
+    return SearchVector("name", "model", "keywords", config=SEARCH_CONFIG)
+
+
+def refresh_documents(product_infos, batch_size=None, facets=True):
+    # Пересобрать документы поиска для выборки ProductInfo и фасеты их магазинов
+    # Документы удаленных товаров удаляет каскад по product_info.
+    # Импорт пересобирает фасеты сам, один раз после всех пачек (facets=False)
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    ids = list(product_infos.order_by().values_list("id", flat=True).distinct())
+    shop_ids = set()
+    for start in range(0, len(ids), batch_size):
+        shop_ids |= build_documents(ids[start : start + batch_size])
+    if facets and shop_ids:
+        refresh_facets(shop_ids)
+    return len(ids)
+
+
+def refresh_facets(shop_ids=None):
+    # Пересобрать сводку фасетов (ProductFacet и ProductPriceRange) магазинов
+    # shop_ids, без shop_ids - всего каталога. Считается по документам поиска.
+    # Строки магазинов блокируются, чтобы параллельные пересборки одного
+    # магазина не задвоили сводку
+    facets = ProductFacet.objects.all()
+    prices = ProductPriceRange.objects.all()
+    documents = ProductDocument.objects.filter(shop_state=True)
+    parameters = ProductParameter.objects.filter(
+        product_info__document__shop_state=True
+    )
+    shops = Shop.objects.all()
+    if shop_ids is not None:
+        shop_ids = list(shop_ids)
+        facets = facets.filter(shop_id__in=shop_ids)
+        prices = prices.filter(shop_id__in=shop_ids)
+        documents = documents.filter(shop_id__in=shop_ids)
+        parameters = parameters.filter(product_info__document__shop_id__in=shop_ids)
+        shops = shops.filter(id__in=shop_ids)
+    with transaction.atomic():
+        list(shops.select_for_update().order_by("id").values_list("id"))
+        facets.delete()
+        prices.delete()
+        ProductPriceRange.objects.bulk_create(
+            (
+                ProductPriceRange(**row)
+                for row in documents.annotate(
+                    in_stock=ExpressionWrapper(
+                        Q(quantity__gt=0), output_field=BooleanField()
+                    )
+                )
+                .values("shop_id", "category_id", "in_stock")
+                .annotate(min=Min("price"), max=Max("price"))
+                .order_by()
+            ),
+            batch_size=settings.IMPORT_BATCH_SIZE,
+        )
+        ProductFacet.objects.bulk_create(
+            (
+                ProductFacet(
+                    shop_id=row["product_info__document__shop_id"],
+                    category_id=row["product_info__document__category_id"],
+                    in_stock=row["in_stock"],
+                    name=row["parameter__name"],
+                    value=row["value"],
+                    products=row["count"],
+                )
+                for row in parameters.annotate(
+                    in_stock=ExpressionWrapper(
+                        Q(product_info__document__quantity__gt=0),
+                        output_field=BooleanField(),
+                    )
+                )
+                .values(
+                    "product_info__document__shop_id",
+                    "product_info__document__category_id",
+                    "in_stock",
+                    "parameter__name",
+                    "value",
+                )
+                .annotate(count=Count("id"))
+                .order_by()
+            ),
+            batch_size=settings.IMPORT_BATCH_SIZE,
+        )
+
+
+def build_documents(ids):
+    # Четыре запроса на пачку: товары, параметры, upsert документов и вектор
+    # Возвращает магазины пересобранных документов
+    rows = ProductInfo.objects.filter(id__in=ids).values_list(
+        "id",
+        "external_id",
+        "model",
+        "product__name",
+        "product__category_id",
+        "product__category__name",
+        "shop_id",
+        "shop__name",
+        "shop__state",
+        "quantity",
+        "price",
+        "price_rrc",
+    )
+    parameters = {}
+    for product_info_id, name, value in (
+        ProductParameter.objects.filter(product_info_id__in=ids)
+        .order_by("id")
+        .values_list("product_info_id", "parameter__name", "value")
+    ):
+        parameters.setdefault(product_info_id, []).append(
+            {"parameter": name, "value": value}
+        )
+    documents = []
+    for (
+        product_info_id,
+        external_id,
+        model,
+        name,
+        category_id,
+        category_name,
+        shop_id,
+        shop_name,
+        shop_state,
+        quantity,
+        price,
+        price_rrc,
+    ) in rows:
+        product_parameters = parameters.get(product_info_id, [])
+        documents.append(
+            ProductDocument(
+                product_info_id=product_info_id,
+                external_id=external_id,
+                model=model,
+                name=name,
+                category_id=category_id,
+                category_name=category_name,
+                shop_id=shop_id,
+                shop_name=shop_name,
+                shop_state=shop_state,
+                quantity=quantity,
+                price=price,
+                price_rrc=price_rrc,
+                parameters=product_parameters,
+                keywords=" ".join(row["value"] for row in product_parameters),
+            )
+        )
+    ProductDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["product_info"],
+        update_fields=DOCUMENT_FIELDS,
+    )
+    ProductDocument.objects.filter(product_info_id__in=ids).update(
+        search=search_vector()
+    )
+    return {document.shop_id for document in documents}
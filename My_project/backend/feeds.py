@@ -0,0 +1,204 @@
+from contextlib import contextmanager
+from shutil import copyfileobj
+from tempfile import TemporaryFile
+
+from requests import get
+from ujson import loads as load_json
+from yaml import (
+    AliasEvent,
+    MappingEndEvent,
+    MappingNode,
+    MappingStartEvent,
+    ScalarEvent,
+    ScalarNode,
+    SequenceEndEvent,
+    SequenceNode,
+    SequenceStartEvent,
+    YAMLError,
+)
+
+try:
+    # Парсер на libyaml в разы быстрее чистого Python
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def guess_format(url):
+    # Формат прайса по расширению файла в ссылке
+    if url.split("?")[0].endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "yaml"
+
+
+@contextmanager
+def open_price_list(url):
+    # Открыть прайс по ссылке как поток, не читая тело ответа целиком
+    with get(url, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield response.raw
+
+
+def read_price_list(stream, format="yaml"):
+    # Прочитать прайс из потока
+    # Возвращает словарь с ключами shop, categories и goods, где goods - генератор,
+    # который разбирает товары по одному по мере чтения потока
+    if format == "jsonl":
+        return read_json_lines(stream)
+    return read_yaml(stream)
+
+
+def read_json_lines(stream):
+    # Первая строка - шапка с shop и categories, каждая следующая - один товар
+    lines = (line for line in stream if line.strip())
+    header = next(lines, None)
+    if header is None:
+        raise ValueError("Прайс пуст")
+    header = load_json(header)
+    return {
+        "shop": header["shop"],
+        "categories": header.get("categories", []),
+        "goods": (load_json(line) for line in lines),
+    }
+
+
+def read_yaml(stream):
+    # Документ разбирается по событиям: шапка прайса строится целиком,
+    # а список goods отдается генератором по одному товару.
+    # Шапка нужна импорту до товаров, поэтому shop и categories должны идти
+    # в прайсе раньше goods. Порядок ключей проверяется первым проходом до
+    # первого товара, чтобы ошибочный прайс не успел попасть в каталог
+    stream = rewindable(stream)
+    start = stream.tell()
+    check_keys(scan_keys(stream))
+    stream.seek(start)
+    loader = SafeLoader(stream)
+    loader.get_event()  # StreamStartEvent
+    loader.get_event()  # DocumentStartEvent
+    if not isinstance(loader.get_event(), MappingStartEvent):
+        loader.dispose()
+        raise ValueError("Прайс должен быть словарем")
+    header = {"categories": []}
+    anchors = {}
+    while not loader.check_event(MappingEndEvent):
+        key = construct(loader, anchors)
+        if key == "goods":
+            header["goods"] = iter_goods(loader, anchors)
+            return header
+        header[key] = construct(loader, anchors)
+    loader.dispose()
+    raise ValueError("В прайсе нет списка goods")
+
+
+def rewindable(stream):
+    # Прайс читается дважды. Поток из сети перематывать нельзя, поэтому он
+    # сначала копируется во временный файл на диске, а не в память
+    if stream.seekable():
+        return stream
+    spool = TemporaryFile()
+    copyfileobj(stream, spool)
+    spool.seek(0)
+    return spool
+
+
+def scan_keys(stream):
+    # Ключи верхнего уровня по порядку. Значения пропускаются по событиям без
+    # построения объектов, поэтому проход не зависит от размера прайса по
+    # памяти. При ошибке синтаксиса возвращаются ключи до нее: саму ошибку
+    # покажет второй проход, дойдя до того же места
+    loader = SafeLoader(stream)
+    keys = []
+    try:
+        loader.get_event()  # StreamStartEvent
+        loader.get_event()  # DocumentStartEvent
+        if not isinstance(loader.get_event(), MappingStartEvent):
+            raise ValueError("Прайс должен быть словарем")
+        while not loader.check_event(MappingEndEvent):
+            event = loader.peek_event()
+            keys.append(event.value if isinstance(event, ScalarEvent) else None)
+            skip(loader)
+            skip(loader)
+    except YAMLError:
+        return keys, False
+    finally:
+        loader.dispose()
+    return keys, True
+
+
+def check_keys(scan):
+    keys, complete = scan
+    if "goods" not in keys:
+        if complete:
+            raise ValueError("В прайсе нет списка goods")
+        return
+    position = keys.index("goods")
+    if "shop" not in keys[:position]:
+        raise ValueError("Ключ shop должен идти в прайсе раньше goods")
+    if "categories" in keys[position:]:
+        raise ValueError("Ключ categories должен идти в прайсе раньше goods")
+
+
+def skip(loader):
+    # Пропустить один узел: скаляр, ссылку или вложенную коллекцию
+    depth = 0
+    while True:
+        event = loader.get_event()
+        if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def iter_goods(loader, anchors):
+    # Отдаем товары из списка goods по одному
+    try:
+        if not isinstance(loader.get_event(), SequenceStartEvent):
+            raise ValueError("goods должен быть списком")
+        while not loader.check_event(SequenceEndEvent):
+            yield construct(loader, anchors)
+    finally:
+        loader.dispose()
+
+
+def construct(loader, anchors):
+    # Собрать из событий один узел и превратить его в объект Python
+    return loader.construct_document(compose(loader, anchors))
+
+
+def compose(loader, anchors):
+    # Аналог Composer.compose_node, которого нет у парсера на libyaml
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(
+            tag, event.value, event.start_mark, event.end_mark, style=event.style
+        )
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None)
+        while not loader.check_event(MappingEndEvent):
+            key = compose(loader, anchors)
+            node.value.append((key, compose(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise ValueError(f"Неожиданное событие YAML: {event}")
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
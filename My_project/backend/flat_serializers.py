@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField, StringRelatedField
+
+from backend.models import Category, Parameter
+
+# Быстрый путь для больших списков: те же данные, что у сериализатора DRF,
+# но из кортежей values_list(), без объектов моделей и обхода полей DRF на
+# каждый объект. Сериализатор разбирается один раз при создании:
+# поля становятся колонками запроса, вложенные сериализаторы по внешнему
+# ключу - колонками того же запроса через соединение таблиц, списки
+# (many=True) - одним запросом на связь для всех объектов. Из разобранных
+# полей собирается выражение, которое строит словарь из строки запроса.
+# Списки связей упорядочены по ordering модели и id.
+# Поля, которые не разбираются (SerializerMethodField, свойства модели),
+# дают ошибку при создании - такой сериализатор остается на DRF
+
+# Поля, у которых to_representation не меняет значение из базы
+PLAIN_FIELDS = {
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.URLField,
+    serializers.SlugField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+}
+
+# Колонка, которую возвращает __str__ модели, для StringRelatedField
+STR_COLUMNS = {Category: "name", Parameter: "name"}
+
+
+class FlatSerializer:
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.columns = []
+        # (номер колонки ключа, поле связи, FlatSerializer связанной модели)
+        self.relations = []
+        self.namespace = {}
+        expression = self.compile(serializer, self.model, "")
+        # Колонки проверяются сразу: FieldError, если источник поля не в базе
+        self.model._default_manager.values_list(*self.columns)
+        self.build = eval(f"lambda row, related: {expression}", self.namespace)
+
+    def serialize(self, queryset):
+        # Предзагрузка связей не нужна: списки берутся отдельными запросами
+        rows = queryset.prefetch_related(None).values_list(*self.columns)
+        return self.render(list(rows))
+
+    async def aserialize(self, queryset):
+        return await sync_to_async(self.serialize)(queryset)
+
+    def render(self, rows):
+        related = [
+            child.group(field, {row[index] for row in rows} - {None})
+            for index, field, child in self.relations
+        ]
+        build = self.build
+        return [build(row, related) for row in rows]
+
+    def group(self, field, keys):
+        # Объекты связи по ключам keys: ключ -> список словарей
+        groups = defaultdict(list)
+        if not keys:
+            return groups
+        rows = list(
+            self.model._default_manager.filter(**{f"{field}__in": keys})
+            .order_by(*self.model._meta.ordering, "pk")
+            .values_list(*self.columns, field)
+        )
+        for row, item in zip(rows, self.render(rows)):
+            groups[row[-1]].append(item)
+        return groups
+
+    def column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return f"row[{self.columns.index(path)}]"
+
+    def compile(self, serializer, model, prefix):
+        # Выражение словаря объекта model, колонки которого начинаются с prefix
+        items = [
+            f"{field.field_name!r}: {self.compile_field(field, model, prefix)}"
+            for field in serializer.fields.values()
+            if not field.write_only
+        ]
+        return "{" + ", ".join(items) + "}"
+
+    def compile_field(self, field, model, prefix):
+        if not field.source_attrs:
+            # source="*": SerializerMethodField и поля от всего объекта
+            raise TypeError(
+                f"{field.field_name}: поле {type(field).__name__} не разбирается"
+            )
+        path = prefix + "__".join(field.source_attrs)
+        if isinstance(field, serializers.ListSerializer):
+            relation = model._meta.get_field(field.source)
+            if not relation.one_to_many:
+                raise TypeError(
+                    f"{field.field_name}: поддерживаются только обратные ForeignKey"
+                )
+            key = self.column(prefix + model._meta.pk.name)
+            child = FlatSerializer(type(field.child))
+            self.relations.append(
+                (
+                    self.columns.index(prefix + model._meta.pk.name),
+                    relation.field.name,
+                    child,
+                )
+            )
+            return f"(related[{len(self.relations) - 1}].get({key}) or [])"
+        if isinstance(field, serializers.BaseSerializer):
+            value = self.column(path)
+            nested = self.compile(field, field.Meta.model, path + "__")
+            return f"(None if {value} is None else {nested})"
+        if isinstance(field, StringRelatedField):
+            related = self.follow(model, field.source_attrs)
+            if related not in STR_COLUMNS:
+                raise TypeError(f"{field.field_name}: неизвестен __str__ {related}")
+            return self.column(f"{path}__{STR_COLUMNS[related]}")
+        value = self.column(path)
+        if type(field) in PLAIN_FIELDS or (
+            type(field) is PrimaryKeyRelatedField and field.pk_field is None
+        ):
+            return value
+        # Остальные поля (дата, Decimal) преобразуются своим to_representation
+        name = f"convert_{len(self.namespace)}"
+        self.namespace[name] = field.to_representation
+        return f"(None if {value} is None else {name}({value}))"
+
+    @staticmethod
+    def follow(model, attrs):
+        for attr in attrs:
+            model = model._meta.get_field(attr).related_model
+        return model
@@ -0,0 +1,608 @@
+from datetime import datetime, timedelta
+from io import StringIO
+from random import Random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils.timezone import now
+from ujson import dumps as dump_json
+
+from backend.basket import SNAPSHOT_FIELDS
+from backend.caching import bump_catalog
+from backend.documents import DOCUMENT_FIELDS, refresh_facets, search_vector
+from backend.importer import chunks
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Parameter,
+    ProductParameter,
+    ProductDocument,
+    Contact,
+    Order,
+    OrderItem,
+    ShopOrder,
+)
+
+# Шаблоны категорий по образцу data/shop1.yaml: линейки моделей по брендам,
+# параметры с весами значений и диапазон цен. Значение параметра variant
+# попадает в название товара, как объем памяти в "iPhone XR 256GB (красный)"
+TEMPLATES = [
+    {
+        "name": "Смартфоны",
+        "title": "Смартфон",
+        "brands": {
+            "Apple": ["iPhone XS Max", "iPhone XS", "iPhone XR", "iPhone 8"],
+            "Samsung": ["Galaxy S10", "Galaxy A50", "Galaxy Note 10"],
+            "Xiaomi": ["Redmi Note 8", "Mi 9", "Mi A3"],
+            "Huawei": ["P30", "P30 Lite", "Honor 20"],
+        },
+        "parameters": {
+            "Диагональ (дюйм)": {5.8: 2, 6.1: 4, 6.4: 3, 6.5: 2},
+            "Разрешение (пикс)": {"2688x1242": 1, "1792x828": 2, "2340x1080": 3},
+            "Встроенная память (Гб)": {32: 1, 64: 4, 128: 4, 256: 2, 512: 1},
+            "Цвет": {
+                "черный": 5,
+                "белый": 3,
+                "синий": 2,
+                "красный": 1,
+                "золотистый": 1,
+            },
+        },
+        "variant": ("Встроенная память (Гб)", "{}GB"),
+        "price": (8000, 110000),
+    },
+    {
+        "name": "Аксессуары",
+        "title": "Чехол",
+        "brands": {
+            "Apple": ["Silicone Case", "Leather Case"],
+            "Samsung": ["Clear View Cover", "Silicone Cover"],
+            "Deppa": ["Gel Case", "Air Case"],
+        },
+        "parameters": {
+            "Материал": {"силикон": 4, "кожа": 1, "пластик": 3},
+            "Цвет": {"черный": 5, "прозрачный": 3, "красный": 1, "синий": 1},
+        },
+        "variant": ("Материал", "{}"),
+        "price": (300, 5000),
+    },
+    {
+        "name": "Flash-накопители",
+        "title": "Флеш-накопитель",
+        "brands": {
+            "Kingston": ["DataTraveler 100", "DataTraveler SE9"],
+            "SanDisk": ["Cruzer Blade", "Ultra Flair"],
+            "Transcend": ["JetFlash 790"],
+        },
+        "parameters": {
+            "Объем (Гб)": {16: 2, 32: 4, 64: 3, 128: 1},
+            "Интерфейс": {"USB 2.0": 1, "USB 3.0": 3, "USB Type-C": 1},
+            "Цвет": {"черный": 3, "серебристый": 2, "синий": 1},
+        },
+        "variant": ("Объем (Гб)", "{}GB"),
+        "price": (300, 3000),
+    },
+    {
+        "name": "Ноутбуки",
+        "title": "Ноутбук",
+        "brands": {
+            "Apple": ["MacBook Air", "MacBook Pro"],
+            "Lenovo": ["IdeaPad 3", "ThinkPad E14"],
+            "ASUS": ["VivoBook 15", "ZenBook 14"],
+        },
+        "parameters": {
+            "Диагональ (дюйм)": {13.3: 2, 14: 3, 15.6: 4},
+            "Оперативная память (Гб)": {4: 1, 8: 4, 16: 2},
+            "Накопитель (Гб)": {256: 4, 512: 3, 1024: 1},
+            "Цвет": {"серый": 4, "серебристый": 2, "черный": 3},
+        },
+        "variant": ("Накопитель (Гб)", "{}GB"),
+        "price": (30000, 200000),
+    },
+    {
+        "name": "Наушники",
+        "title": "Наушники",
+        "brands": {
+            "Apple": ["AirPods", "AirPods Pro"],
+            "Sony": ["WH-1000XM3", "WF-1000XM3"],
+            "JBL": ["Tune 500BT", "Free X"],
+        },
+        "parameters": {
+            "Тип подключения": {"беспроводные": 4, "проводные": 1},
+            "Цвет": {"черный": 4, "белый": 3, "синий": 1},
+        },
+        "variant": ("Тип подключения", "{}"),
+        "price": (1000, 30000),
+    },
+]
+
+STATES = {
+    "new": 2,
+    "confirmed": 2,
+    "assembled": 1,
+    "sent": 2,
+    "delivered": 6,
+    "canceled": 1,
+}
+
+SHOP_NAMES = ["Связной", "Евросеть", "М.Видео", "DNS", "Ситилинк", "Эльдорадо"]
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург"]
+
+STREETS = ["Ленина", "Тверская", "Невский проспект", "Мира", "Садовая"]
+
+PASSWORD = "11ff22FF33cc44CC"
+
+
+def weighted(rng, values):
+    # Случайное значение словаря значение -> вес
+    return rng.choices(list(values), list(values.values()))[0]
+
+
+class DataGenerator:
+    # Детерминированный генератор каталога, покупателей и заказов
+    # Каждый магазин получает свой генератор случайных чисел из seed и своего
+    # номера, поэтому его прайс не зависит от того, сколько всего магазинов
+    # создается и в каком порядке они пишутся
+    def __init__(self, seed=0, shops=3, categories=3, products=100):
+        self.seed = seed
+        self.shops = shops
+        self.products = products
+        # id категорий начинаются с 1000, чтобы не пересекаться с прайсами
+        # вроде data/shop1.yaml, где id категорий небольшие
+        self.categories = []
+        self.templates = {}
+        for number in range(categories):
+            template = TEMPLATES[number % len(TEMPLATES)]
+            name = template["name"]
+            if number >= len(TEMPLATES):
+                name = f"{name} {number // len(TEMPLATES) + 1}"
+            self.categories.append({"id": 1000 + number, "name": name})
+            self.templates[1000 + number] = template
+
+    def random(self, *key):
+        return Random("/".join(map(str, (self.seed, *key))))
+
+    def shop_name(self, shop_number):
+        name = SHOP_NAMES[shop_number % len(SHOP_NAMES)]
+        if shop_number >= len(SHOP_NAMES):
+            name = f"{name} {shop_number // len(SHOP_NAMES) + 1}"
+        return name
+
+    def shop_size(self, shop_number):
+        # Товары делятся между магазинами поровну
+        return self.products // self.shops + (shop_number < self.products % self.shops)
+
+    @staticmethod
+    def external_id(number):
+        return 4_000_000 + number
+
+    def shop_categories(self, shop_number):
+        # Магазин торгует частью категорий, но хотя бы одной
+        rng = self.random("shop", shop_number, "categories")
+        return sorted(
+            rng.sample(self.categories, rng.randint(1, len(self.categories))),
+            key=lambda category: category["id"],
+        )
+
+    def price_list(self, shop_number):
+        # Прайс магазина в формате data/shop1.yaml, goods - генератор
+        categories = self.shop_categories(shop_number)
+        return {
+            "shop": self.shop_name(shop_number),
+            "categories": categories,
+            "goods": self.goods(shop_number, categories),
+        }
+
+    def goods(self, shop_number, categories):
+        rng = self.random("shop", shop_number, "goods")
+        for number in range(self.shop_size(shop_number)):
+            category = rng.choice(categories)
+            template = self.templates[category["id"]]
+            brand = rng.choice(list(template["brands"]))
+            line = rng.choice(template["brands"][brand])
+            parameters = {
+                name: weighted(rng, values)
+                for name, values in template["parameters"].items()
+            }
+            variant, variant_format = template["variant"]
+            low, high = template["price"]
+            # Дешевых товаров больше, чем дорогих
+            price = round(low + (high - low) * rng.random() ** 2, -1)
+            yield {
+                "id": self.external_id(number),
+                "category": category["id"],
+                "model": f"{brand}/{line}".lower().replace(" ", "-"),
+                "name": (
+                    f"{template['title']} {brand} {line} "
+                    f"{variant_format.format(parameters[variant])} "
+                    f"({parameters.get('Цвет', 'без цвета')})"
+                ),
+                "price": int(price),
+                "price_rrc": int(round(price * rng.uniform(1.03, 1.15), -1) - 10),
+                # Часть товаров закончилась
+                "quantity": 0 if rng.random() < 0.15 else rng.randint(1, 50),
+                "parameters": parameters,
+            }
+
+
+def to_json(value):
+    return dump_json(value, ensure_ascii=False, escape_forward_slashes=False)
+
+
+def write_yaml(price_list, file):
+    # Прайс пишется потоком по одному товару, строки в кавычках JSON,
+    # которые YAML читает так же
+    file.write(f"shop: {to_json(price_list['shop'])}\n")
+    file.write("categories:\n")
+    for category in price_list["categories"]:
+        file.write(f"  - id: {category['id']}\n    name: {to_json(category['name'])}\n")
+    file.write("\ngoods:\n")
+    for item in price_list["goods"]:
+        file.write(f"  - id: {item['id']}\n    category: {item['category']}\n")
+        for field in ("model", "name"):
+            file.write(f"    {field}: {to_json(item[field])}\n")
+        for field in ("price", "price_rrc", "quantity"):
+            file.write(f"    {field}: {item[field]}\n")
+        file.write("    parameters:\n")
+        for name, value in item["parameters"].items():
+            file.write(f"      {to_json(name)}: {to_json(value)}\n")
+
+
+def write_json_lines(price_list, file):
+    header = {key: price_list[key] for key in ("shop", "categories")}
+    file.write(to_json(header) + "\n")
+    for item in price_list["goods"]:
+        file.write(to_json(item) + "\n")
+
+
+def copy_value(value):
+    # Значение в текстовом формате COPY
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = to_json(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(model, fields, rows):
+    # Записать строки через COPY ... FROM STDIN
+    # bulk_create строит SQL по каждому значению, и на миллионах строк
+    # время уходит на Python, а не на базу. COPY принимает готовый текст
+    buffer = StringIO()
+    for row in rows:
+        buffer.write("\t".join(map(copy_value, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(
+        quote_name(model._meta.get_field(field).column) for field in fields
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote_name(model._meta.db_table)} ({columns}) FROM STDIN", buffer
+        )
+
+
+def allocate_ids(model, count):
+    # Первичные ключи для строк COPY берутся из последовательности таблицы
+    # заранее, одним запросом, чтобы сразу ссылаться на них из других таблиц
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class DataWriter:
+    # Запись сгенерированных данных прямо в базу
+    # В отличие от загрузки прайса сверять с базой нечего: все строки новые,
+    # поэтому товары, параметры, документы и заказы пишутся через COPY
+    # пачками по batch_size, а поисковый вектор документов - одним UPDATE на пачку
+    def __init__(self, generator, batch_size=None, pool_size=100_000, progress=None):
+        self.generator = generator
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.password = make_password(PASSWORD)
+        self.products = {}
+        self.parameters = dict(Parameter.objects.values_list("name", "id"))
+        # Товары, из которых набираются корзины и заказы: первые товары
+        # каждого магазина, чтобы не держать в памяти весь каталог
+        self.pool = []
+        self.pool_per_shop = -(-pool_size // generator.shops)
+        # Даты заказов отсчитываются от момента запуска
+        self.started = now()
+
+    def email(self, kind, number):
+        return f"{kind}{number}-{self.generator.seed}@example.com"
+
+    def exists(self):
+        return User.objects.filter(
+            email__in=[self.email("partner", 0), self.email("buyer", 0)]
+        ).exists()
+
+    def create_users(self, kind, count, **fields):
+        users = []
+        for part in chunks(range(count), self.batch_size):
+            users += User.objects.bulk_create(
+                User(
+                    email=self.email(kind, number),
+                    username=f"{kind}{number}",
+                    password=self.password,
+                    is_active=True,
+                    **fields,
+                )
+                for number in part
+            )
+        return users
+
+    def write_catalog(self):
+        generator = self.generator
+        Category.objects.bulk_create(
+            [Category(**category) for category in generator.categories],
+            ignore_conflicts=True,
+        )
+        category_names = {
+            category["id"]: category["name"] for category in generator.categories
+        }
+        partners = self.create_users("partner", generator.shops, type="shop")
+        processed = 0
+        shop_ids = []
+        for shop_number, partner in enumerate(partners):
+            price_list = generator.price_list(shop_number)
+            shop = Shop.objects.create(name=price_list["shop"], user=partner)
+            shop_ids.append(shop.id)
+            through = Category.shops.through
+            through.objects.bulk_create(
+                through(category_id=category["id"], shop_id=shop.id)
+                for category in price_list["categories"]
+            )
+            for batch in chunks(price_list["goods"], self.batch_size):
+                with transaction.atomic():
+                    self.write_goods(shop, category_names, batch)
+                processed += len(batch)
+                if self.progress is not None:
+                    self.progress("goods", processed)
+        refresh_facets(shop_ids)
+        bump_catalog()
+        return processed
+
+    def write_goods(self, shop, category_names, goods):
+        new_products = {
+            (item["name"], item["category"])
+            for item in goods
+            if (item["name"], item["category"]) not in self.products
+        }
+        new_products = dict(
+            zip(sorted(new_products), allocate_ids(Product, len(new_products)))
+        )
+        copy_rows(
+            Product,
+            ["id", "name", "category"],
+            ((product_id, *key) for key, product_id in new_products.items()),
+        )
+        self.products.update(new_products)
+        new_parameters = [
+            Parameter(name=name)
+            for name in sorted({name for item in goods for name in item["parameters"]})
+            if name not in self.parameters
+        ]
+        Parameter.objects.bulk_create(new_parameters)
+        for parameter in new_parameters:
+            self.parameters[parameter.name] = parameter.id
+        ids = allocate_ids(ProductInfo, len(goods))
+        copy_rows(
+            ProductInfo,
+            [
+                "id",
+                "product",
+                "shop",
+                "external_id",
+                "model",
+                "quantity",
+                "price",
+                "price_rrc",
+            ],
+            (
+                (
+                    product_info_id,
+                    self.products[(item["name"], item["category"])],
+                    shop.id,
+                    item["id"],
+                    item["model"],
+                    item["quantity"],
+                    item["price"],
+                    item["price_rrc"],
+                )
+                for product_info_id, item in zip(ids, goods)
+            ),
+        )
+        parameters = [
+            [
+                {"parameter": name, "value": str(value)}
+                for name, value in item["parameters"].items()
+            ]
+            for item in goods
+        ]
+        copy_rows(
+            ProductParameter,
+            ["product_info", "parameter", "value"],
+            (
+                (product_info_id, self.parameters[row["parameter"]], row["value"])
+                for product_info_id, rows in zip(ids, parameters)
+                for row in rows
+            ),
+        )
+        # Документы собираются из тех же данных, без чтения только что записанного
+        copy_rows(
+            ProductDocument,
+            ["product_info", *DOCUMENT_FIELDS],
+            (
+                (
+                    product_info_id,
+                    item["id"],
+                    item["model"],
+                    item["name"],
+                    item["category"],
+                    category_names[item["category"]],
+                    shop.id,
+                    shop.name,
+                    shop.state,
+                    item["quantity"],
+                    item["price"],
+                    item["price_rrc"],
+                    rows,
+                    " ".join(row["value"] for row in rows),
+                )
+                for product_info_id, item, rows in zip(ids, goods, parameters)
+            ),
+        )
+        ProductDocument.objects.filter(product_info_id__in=ids).update(
+            search=search_vector()
+        )
+        for product_info_id, item in zip(ids, goods):
+            if item["id"] < self.generator.external_id(self.pool_per_shop):
+                self.pool.append((product_info_id, item, shop))
+
+    def write_buyers(self, users, baskets, orders, lines):
+        # Покупатели с контактом, корзины первых baskets покупателей
+        # и orders оформленных заказов в среднем по lines позиций
+        buyers = self.create_users("buyer", users)
+        contacts = []
+        for part in chunks(buyers, self.batch_size):
+            contacts += Contact.objects.bulk_create(
+                self.contact(number, buyer)
+                for number, buyer in enumerate(part, start=len(contacts))
+            )
+        if not buyers or not self.pool:
+            return buyers
+        rng = self.generator.random("baskets")
+        for part in chunks(buyers[:baskets], self.batch_size):
+            with transaction.atomic():
+                self.write_orders(
+                    [
+                        (buyer.id, None, "basket", 0, self.lines(rng, lines))
+                        for buyer in part
+                    ]
+                )
+        rng = self.generator.random("orders")
+        for part in chunks(range(orders), self.batch_size):
+            placed = []
+            for _ in part:
+                number = rng.randrange(len(buyers))
+                placed.append(
+                    (
+                        buyers[number].id,
+                        contacts[number].id,
+                        weighted(rng, STATES),
+                        # Заказы разбросаны по последнему году
+                        rng.randrange(365 * 24 * 3600),
+                        self.lines(rng, lines),
+                    )
+                )
+            with transaction.atomic():
+                self.write_orders(placed)
+        return buyers
+
+    def contact(self, number, buyer):
+        rng = self.generator.random("buyer", number)
+        return Contact(
+            user=buyer,
+            city=rng.choice(CITIES),
+            street=rng.choice(STREETS),
+            house=str(rng.randint(1, 200)),
+            apartment=str(rng.randint(1, 300)),
+            phone=f"+7999{rng.randrange(10**7):07d}",
+        )
+
+    def lines(self, rng, lines):
+        # От одной до 2 * lines - 1 разных позиций, в среднем lines
+        count = min(rng.randint(1, 2 * lines - 1), len(self.pool))
+        return [(line, rng.randint(1, 3)) for line in rng.sample(self.pool, count)]
+
+    def write_orders(self, orders):
+        # orders - список (покупатель, контакт, статус, возраст в секундах, позиции)
+        # Оформленные заказы получают снимок товаров и заказы магазинов,
+        # как после place_order
+        order_ids = allocate_ids(Order, len(orders))
+        order_rows = []
+        shop_orders = {}
+        order_items = []
+        for order_id, (user_id, contact_id, state, age, lines) in zip(
+            order_ids, orders
+        ):
+            created_at = self.started - timedelta(seconds=age)
+            order_rows.append(
+                (
+                    order_id,
+                    user_id,
+                    created_at,
+                    state,
+                    contact_id,
+                    sum(item["price"] * quantity for (_, item, _), quantity in lines),
+                    sum(quantity for _, quantity in lines),
+                )
+            )
+            for (product_info_id, item, shop), quantity in lines:
+                key = None
+                snapshot = ("", "", "", None, None)
+                if state != "basket":
+                    key = (order_id, shop.id)
+                    shop_order = shop_orders.setdefault(
+                        key, [order_id, shop.id, state, created_at, 0, 0]
+                    )
+                    shop_order[4] += item["price"] * quantity
+                    shop_order[5] += quantity
+                    snapshot = (
+                        item["name"],
+                        item["model"],
+                        shop.name,
+                        item["price"],
+                        item["price_rrc"],
+                    )
+                order_items.append(
+                    (order_id, product_info_id, shop.id, item["category"], key)
+                    + (quantity, *snapshot)
+                )
+        copy_rows(
+            Order,
+            ["id", "user", "datatime", "state", "contact", "total_sum", "items_count"],
+            order_rows,
+        )
+        shop_order_ids = dict(
+            zip(shop_orders, allocate_ids(ShopOrder, len(shop_orders)))
+        )
+        copy_rows(
+            ShopOrder,
+            ["id", "order", "shop", "state", "created_at", "total_sum", "items_count"],
+            ((shop_order_ids[key], *row) for key, row in shop_orders.items()),
+        )
+        copy_rows(
+            OrderItem,
+            [
+                "order",
+                "product_info",
+                "shop",
+                "category",
+                "shop_order",
+                "quantity",
+                *SNAPSHOT_FIELDS,
+            ],
+            ((*row[:4], shop_order_ids.get(row[4]), *row[5:]) for row in order_items),
+        )
@@ -0,0 +1,388 @@
+from itertools import islice
+from time import perf_counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from ujson import dumps as dump_json, loads as load_json
+
+from backend.basket import recalculate_baskets, recalculate_totals
+from backend.caching import bump_catalog
+from backend.documents import refresh_documents, refresh_facets
+from backend.models import (
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Parameter,
+    ProductParameter,
+    Order,
+    ImportRow,
+)
+
+# Поля ProductInfo, которые синхронизируются с прайсом
+SYNC_FIELDS = ("product_id", "model", "price", "price_rrc", "quantity")
+
+
+def chunks(items, size):
+    # Делим последовательность на части не больше size элементов
+    # Работает и с генераторами: в памяти держится только текущая часть
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def to_python(model, field, value):
+    # Приводим значение из прайса к типу поля, чтобы сравнение с БД было честным
+    return model._meta.get_field(field).to_python(value)
+
+
+class PriceListImporter:
+    # Массовая загрузка прайса поставщика
+    # Товары обрабатываются пачками по batch_size: на пачку приходится несколько
+    # запросов, строки пишутся через bulk_create/bulk_update.
+    # Синхронизация идет по ключу (магазин, external_id): новые товары вставляются,
+    # изменившиеся обновляются, отсутствующие в прайсе удаляются.
+    # Прайс сначала читается в промежуточную таблицу ImportRow, по пачке в
+    # транзакции: чтение из сети не держит транзакцию каталога, а ход работы
+    # виден снаружи через progress. Затем товары переносятся в каталог одной
+    # транзакцией, и при любой ошибке магазин остается в прежнем состоянии
+    def __init__(self, user_id, batch_size=None, progress=None):
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.phases = {}
+        self.rows = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        self.parameters = {}
+        self.import_id = uuid4()
+
+    def run(self, data):
+        # Загрузить прайс и вернуть время и количество строк по каждому этапу
+        started = perf_counter()
+        try:
+            processed = self.stage(data["goods"])
+            self._report("apply", processed)
+            with transaction.atomic():
+                shop = self.import_shop(data["shop"])
+                self.import_categories(shop, data["categories"])
+                for batch in chunks(self.staged(), self.batch_size):
+                    self.import_batch(shop, batch)
+                self.delete_missing(shop)
+                self.update_facets(shop)
+                # Кеш каталога магазина сбрасывается только после фиксации
+                bump_catalog([shop.id])
+        finally:
+            ImportRow.objects.filter(import_id=self.import_id).delete()
+        return {
+            "phases": self.phases,
+            "rows": self.rows,
+            "seconds": round(perf_counter() - started, 4),
+        }
+
+    def _report(self, phase, processed):
+        # Сообщаем о ходе загрузки, если передан обработчик
+        if self.progress is not None:
+            self.progress(phase, processed)
+
+    def _phase(self, name, started, rows):
+        # Копим длительность этапа и количество затронутых строк по всем пачкам
+        phase = self.phases.setdefault(name, {"rows": 0, "seconds": 0})
+        phase["rows"] += rows
+        phase["seconds"] = round(phase["seconds"] + perf_counter() - started, 4)
+
+    def stage(self, goods):
+        # Сложить товары прайса в ImportRow, вернуть их количество
+        started = perf_counter()
+        processed = 0
+        for batch in chunks(goods, self.batch_size):
+            ImportRow.objects.bulk_create(
+                ImportRow(
+                    import_id=self.import_id,
+                    external_id=item["id"],
+                    # Даты из YAML сохраняются строкой, как их запишет CharField
+                    item=dump_json(item, default=str, ensure_ascii=False),
+                )
+                for item in batch
+            )
+            processed += len(batch)
+            self._report("goods", processed)
+        self._phase("stage", started, processed)
+        return processed
+
+    def staged(self):
+        # Товары из ImportRow в порядке прайса: из повторов external_id
+        # побеждает последний, как и внутри пачки
+        items = (
+            ImportRow.objects.filter(import_id=self.import_id)
+            .order_by("id")
+            .values_list("item", flat=True)
+            .iterator(chunk_size=self.batch_size)
+        )
+        return (load_json(item) for item in items)
+
+    def import_shop(self, name):
+        started = perf_counter()
+        shop, _ = Shop.objects.get_or_create(name=name, user_id=self.user_id)
+        self._phase("shop", started, 1)
+        return shop
+
+    def import_categories(self, shop, categories):
+        started = perf_counter()
+        names = {category["id"]: category["name"] for category in categories}
+        existing = Category.objects.in_bulk(list(names))
+        new_categories = []
+        renamed_categories = []
+        for category_id, name in names.items():
+            category = existing.get(category_id)
+            if category is None:
+                new_categories.append(Category(id=category_id, name=name))
+            elif category.name != name:
+                category.name = name
+                renamed_categories.append(category)
+        Category.objects.bulk_create(new_categories, batch_size=self.batch_size)
+        Category.objects.bulk_update(
+            renamed_categories, ["name"], batch_size=self.batch_size
+        )
+        if renamed_categories:
+            # Названия категорий в сводку фасетов не входят
+            refresh_documents(
+                ProductInfo.objects.filter(product__category__in=renamed_categories),
+                facets=False,
+            )
+            bump_catalog()
+        # Привязываем магазин ко всем категориям прайса одним запросом
+        through = Category.shops.through
+        through.objects.bulk_create(
+            [
+                through(category_id=category_id, shop_id=shop.id)
+                for category_id in names
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        self._phase("categories", started, len(names))
+
+    def import_batch(self, shop, goods):
+        # Синхронизировать одну пачку товаров
+        # Повторы external_id внутри пачки схлопываем, побеждает последний
+        goods = list({item["id"]: item for item in goods}.values())
+        products = self.import_products(goods)
+        parameters = self.import_parameters(goods)
+        product_infos, inserted, updated = self.sync_product_info(shop, goods, products)
+        updated |= self.sync_product_parameters(goods, product_infos, parameters)
+        self.update_documents(
+            [product_infos[external_id] for external_id in inserted | updated]
+        )
+        updated -= inserted
+        self.rows["inserted"] += len(inserted)
+        self.rows["updated"] += len(updated)
+        self.rows["unchanged"] += len(goods) - len(inserted) - len(updated)
+
+    def import_products(self, goods):
+        # Возвращает словарь (название, категория) -> id товара
+        started = perf_counter()
+        keys = {(item["name"], item["category"]) for item in goods}
+        products = {}
+        queryset = (
+            Product.objects.filter(name__in={name for name, _ in keys})
+            .order_by("-id")
+            .values_list("name", "category_id", "id")
+        )
+        for name, category_id, product_id in queryset:
+            products[(name, category_id)] = product_id
+        new_products = [
+            Product(name=name, category_id=category_id)
+            for name, category_id in keys
+            if (name, category_id) not in products
+        ]
+        Product.objects.bulk_create(new_products)
+        for product in new_products:
+            products[(product.name, product.category_id)] = product.id
+        self._phase("products", started, len(keys))
+        return products
+
+    def import_parameters(self, goods):
+        # Возвращает словарь название параметра -> id
+        # Имен параметров немного, поэтому они кешируются на весь прайс
+        started = perf_counter()
+        names = {name for item in goods for name in item["parameters"]}
+        missing = names - set(self.parameters)
+        if missing:
+            queryset = (
+                Parameter.objects.filter(name__in=missing)
+                .order_by("-id")
+                .values_list("name", "id")
+            )
+            self.parameters.update(queryset)
+            new_parameters = [
+                Parameter(name=name) for name in missing - set(self.parameters)
+            ]
+            Parameter.objects.bulk_create(new_parameters)
+            for parameter in new_parameters:
+                self.parameters[parameter.name] = parameter.id
+        self._phase("parameters", started, len(missing))
+        return self.parameters
+
+    def sync_product_info(self, shop, goods, products):
+        # Возвращает словарь external_id -> id, а также множества
+        # вставленных и измененных external_id
+        started = perf_counter()
+        external_ids = [item["id"] for item in goods]
+        existing = {
+            product_info.external_id: product_info
+            for product_info in ProductInfo.objects.filter(
+                shop_id=shop.id, external_id__in=external_ids
+            ).only("id", "external_id", *SYNC_FIELDS)
+        }
+        new_product_infos = []
+        changed_product_infos = []
+        repriced = []
+        for item in goods:
+            values = {
+                "product_id": products[(item["name"], item["category"])],
+                "model": to_python(ProductInfo, "model", item["model"]),
+                "price": to_python(ProductInfo, "price", item["price"]),
+                "price_rrc": to_python(ProductInfo, "price_rrc", item["price_rrc"]),
+                "quantity": to_python(ProductInfo, "quantity", item["quantity"]),
+            }
+            product_info = existing.get(item["id"])
+            if product_info is None:
+                new_product_infos.append(
+                    ProductInfo(shop_id=shop.id, external_id=item["id"], **values)
+                )
+                continue
+            if product_info.price != values["price"]:
+                repriced.append(product_info.id)
+            changed = False
+            for field, value in values.items():
+                if getattr(product_info, field) != value:
+                    setattr(product_info, field, value)
+                    changed = True
+            if changed:
+                changed_product_infos.append(product_info)
+        ProductInfo.objects.bulk_create(new_product_infos)
+        ProductInfo.objects.bulk_update(changed_product_infos, SYNC_FIELDS)
+        if repriced:
+            recalculate_baskets(repriced)
+        product_infos = {
+            external_id: product_info.id
+            for external_id, product_info in existing.items()
+        }
+        product_infos.update(
+            (product_info.external_id, product_info.id)
+            for product_info in new_product_infos
+        )
+        self._phase(
+            "product_info",
+            started,
+            len(new_product_infos) + len(changed_product_infos),
+        )
+        return (
+            product_infos,
+            {product_info.external_id for product_info in new_product_infos},
+            {product_info.external_id for product_info in changed_product_infos},
+        )
+
+    def sync_product_parameters(self, goods, product_infos, parameters):
+        # Возвращает множество external_id, у которых изменились параметры
+        started = perf_counter()
+        existing = {
+            (product_parameter.product_info_id, product_parameter.parameter_id): (
+                product_parameter
+            )
+            for product_parameter in ProductParameter.objects.filter(
+                product_info_id__in=product_infos.values()
+            ).only("id", "product_info_id", "parameter_id", "value")
+        }
+        new_parameters = []
+        changed_parameters = []
+        updated = set()
+        for item in goods:
+            product_info_id = product_infos[item["id"]]
+            for name, value in item["parameters"].items():
+                value = to_python(ProductParameter, "value", value)
+                product_parameter = existing.pop(
+                    (product_info_id, parameters[name]), None
+                )
+                if product_parameter is None:
+                    new_parameters.append(
+                        ProductParameter(
+                            product_info_id=product_info_id,
+                            parameter_id=parameters[name],
+                            value=value,
+                        )
+                    )
+                    updated.add(item["id"])
+                elif product_parameter.value != value:
+                    product_parameter.value = value
+                    changed_parameters.append(product_parameter)
+                    updated.add(item["id"])
+        # Все, что осталось в existing, из прайса пропало
+        removed_ids = [product_parameter.id for product_parameter in existing.values()]
+        external_ids = {
+            product_info_id: external_id
+            for external_id, product_info_id in product_infos.items()
+        }
+        updated.update(
+            external_ids[product_parameter.product_info_id]
+            for product_parameter in existing.values()
+        )
+        ProductParameter.objects.bulk_create(new_parameters, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(
+            changed_parameters, ["value"], batch_size=self.batch_size
+        )
+        if removed_ids:
+            ProductParameter.objects.filter(id__in=removed_ids).delete()
+        self._phase(
+            "product_parameters",
+            started,
+            len(new_parameters) + len(changed_parameters) + len(removed_ids),
+        )
+        return updated
+
+    def update_documents(self, ids):
+        # Пересобрать документы поиска для вставленных и измененных товаров
+        started = perf_counter()
+        if ids:
+            refresh_documents(
+                ProductInfo.objects.filter(id__in=ids), self.batch_size, facets=False
+            )
+        self._phase("documents", started, len(ids))
+
+    def update_facets(self, shop):
+        # Сводка фасетов магазина пересобирается один раз после всех пачек
+        started = perf_counter()
+        refresh_facets([shop.id])
+        self._phase("facets", started, 1)
+
+    def delete_missing(self, shop):
+        # Удалить товары магазина, которых нет в прайсе
+        started = perf_counter()
+        missing = (
+            ProductInfo.objects.filter(shop_id=shop.id)
+            .exclude(
+                Exists(
+                    ImportRow.objects.filter(
+                        import_id=self.import_id, external_id=OuterRef("external_id")
+                    )
+                )
+            )
+            .values_list("id", flat=True)
+            .iterator(chunk_size=self.batch_size)
+        )
+        deleted = 0
+        for part in chunks(missing, self.batch_size):
+            product_infos = ProductInfo.objects.filter(id__in=part)
+            # Позиции корзин теряют товар, поэтому корзины пересчитываются
+            baskets = list(
+                Order.objects.filter(
+                    state="basket", ordered_items__product_info__in=product_infos
+                ).values_list("id", flat=True)
+            )
+            product_infos.delete()
+            if baskets:
+                recalculate_totals(Order.objects.filter(id__in=baskets))
+            deleted += len(part)
+        self.rows["deleted"] += deleted
+        self._phase("delete", started, deleted)
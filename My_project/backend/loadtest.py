@@ -0,0 +1,363 @@
+import json
+from collections import defaultdict
+from functools import cache
+from io import StringIO
+from itertools import count
+from random import Random
+from threading import Lock, Thread
+from time import perf_counter
+
+import requests
+
+from backend.generator import PASSWORD, write_yaml
+
+# Сценарии и их доли по умолчанию: покупатели в основном смотрят каталог,
+# поставщики изредка загружают прайс
+DEFAULT_MIX = "browse=60,basket=25,order=5,partner_orders=8,partner_update=2"
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(text):
+    # "browse=60,basket=25" -> {"browse": 60, "basket": 25}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        if not weight.strip().isdigit():
+            raise ValueError(f"Доля сценария {name} должна быть целым числом")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("Хотя бы один сценарий должен иметь ненулевую долю")
+    return mix
+
+
+def percentile(values, share):
+    # Ближайший ранг: значение, не меньше которого share процентов замеров
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * share // 100))
+    return ordered[rank - 1]
+
+
+def summarize(samples, errors, elapsed):
+    # samples - метка запроса -> задержки в секундах, errors - метка -> число ошибок
+    report = {}
+    for label in sorted(samples):
+        latencies = samples[label]
+        report[label] = {
+            "count": len(latencies),
+            "errors": errors.get(label, 0),
+            "rps": round(len(latencies) / elapsed, 2),
+            **{
+                f"p{share}": round(percentile(latencies, share) * 1000, 2)
+                for share in PERCENTILES
+            },
+        }
+    return report
+
+
+def format_report(report):
+    header = f"{'Запрос':<32}{'Всего':>8}{'Ошибок':>8}{'RPS':>10}"
+    header += "".join(f"{f'p{share}, мс':>12}" for share in PERCENTILES)
+    lines = [header]
+    for label, row in report.items():
+        line = f"{label:<32}{row['count']:>8}{row['errors']:>8}{row['rps']:>10.2f}"
+        line += "".join(f"{row[f'p{share}']:>12.2f}" for share in PERCENTILES)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def compare(report, baseline, tolerance):
+    # Регрессия - рост задержки или доли ошибок, падение RPS больше чем на
+    # tolerance (доля) относительно базового прогона
+    regressions = []
+    for label, base in baseline.items():
+        row = report.get(label)
+        if row is None:
+            continue
+        for share in PERCENTILES:
+            key = f"p{share}"
+            if row[key] > base[key] * (1 + tolerance):
+                regressions.append(
+                    f"{label}: {key} {row[key]:.2f} мс, было {base[key]:.2f} мс"
+                )
+        if row["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: RPS {row['rps']:.2f}, было {base['rps']:.2f}")
+        error_rate = row["errors"] / row["count"]
+        base_rate = base["errors"] / base["count"] if base["count"] else 0
+        if error_rate > base_rate + tolerance / 10:
+            regressions.append(
+                f"{label}: ошибок {error_rate:.1%}, было {base_rate:.1%}"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)["endpoints"]
+
+
+def save_baseline(path, report, settings):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(
+            {"settings": settings, "endpoints": report},
+            file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+class Session:
+    # Клиент одного пользователя, каждый запрос замеряется драйвером
+    def __init__(self, driver, token=None):
+        self.driver = driver
+        self.http = requests.Session()
+        if token:
+            self.http.headers["Authorization"] = f"Token {token}"
+
+    def call(self, label, method, path, **kwargs):
+        # path - путь от /api/v1 или полная ссылка, например на следующую страницу
+        url = path if "://" in path else self.driver.base_url + path
+        started = perf_counter()
+        try:
+            response = self.http.request(method, url, timeout=60, **kwargs)
+        except requests.RequestException:
+            response = None
+        self.driver.record(label, perf_counter() - started, failed(method, response))
+        return response
+
+
+def failed(method, response):
+    # Ошибка - нет ответа, код 4xx/5xx или отказ {"Status": false} на изменение
+    if response is None or response.status_code >= 400:
+        return True
+    if method == "GET":
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("Status") is False
+
+
+def body(response):
+    # Ответ в JSON или None, если запрос не удался
+    if response is None or response.status_code >= 400:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def browse(driver, worker, rng):
+    # Покупатель листает каталог: фильтр, поиск, следующая страница
+    params = {"page_size": 20}
+    kind = rng.randrange(5)
+    if kind == 1:
+        params["shop_id"] = rng.choice(driver.shops)
+    elif kind == 2:
+        params["category_id"] = rng.choice(driver.categories)
+    elif kind == 3:
+        params["q"] = rng.choice(driver.words)
+    elif kind == 4:
+        params["in_stock"] = 1
+    page = body(
+        worker.anonymous.call("GET /products", "GET", "/products", params=params)
+    )
+    if page and page.get("next") and rng.random() < 0.3:
+        worker.anonymous.call("GET /products?cursor", "GET", page["next"])
+    if rng.random() < 0.2:
+        worker.anonymous.call("GET /categories", "GET", "/categories")
+    if rng.random() < 0.2:
+        worker.anonymous.call("GET /shops", "GET", "/shops")
+
+
+def basket(driver, worker, rng):
+    # Покупатель добавляет товары, меняет количество и убирает позицию
+    items = [
+        {"product_info": product_info, "quantity": 1}
+        for product_info in rng.sample(driver.products, min(3, len(driver.products)))
+    ]
+    worker.buyer.call("POST /basket", "POST", "/basket", json={"items": items})
+    baskets = body(worker.buyer.call("GET /basket", "GET", "/basket"))
+    lines = baskets[0]["ordered_items"] if baskets else []
+    if lines:
+        line = rng.choice(lines)
+        worker.buyer.call(
+            "PUT /basket",
+            "PUT",
+            "/basket",
+            json={"items": [{"id": line["id"], "quantity": rng.randint(1, 3)}]},
+        )
+    # Корзина не должна расти бесконечно
+    if len(lines) > 10:
+        worker.buyer.call(
+            "DELETE /basket",
+            "DELETE",
+            "/basket",
+            json={"items": ",".join(str(line["id"]) for line in lines[:-3])},
+        )
+
+
+def order(driver, worker, rng):
+    # Покупатель кладет товар в корзину и оформляет заказ, затем смотрит историю
+    item = {"product_info": rng.choice(driver.products), "quantity": 1}
+    worker.buyer.call("POST /basket", "POST", "/basket", json={"items": [item]})
+    baskets = body(worker.buyer.call("GET /basket", "GET", "/basket"))
+    if baskets:
+        worker.buyer.call(
+            "POST /order",
+            "POST",
+            "/order",
+            json={"id": baskets[0]["id"], "contact": worker.contact},
+        )
+    worker.buyer.call("GET /order", "GET", "/order")
+
+
+def partner_orders(driver, worker, rng):
+    worker.partner.call("GET /partner/orders", "GET", "/partner/orders")
+
+
+def partner_update(driver, worker, rng):
+    # Поставщик загружает свой прайс с локального сервера и проверяет статус
+    data = body(
+        worker.partner.call(
+            "POST /partner/update",
+            "POST",
+            "/partner/update",
+            json={"url": driver.feed_url(worker.shop_number)},
+        )
+    )
+    if data and data.get("Job"):
+        worker.partner.call(
+            "GET /partner/update/<job>", "GET", f"/partner/update/{data['Job']}"
+        )
+
+
+SCENARIOS = {
+    "browse": browse,
+    "basket": basket,
+    "order": order,
+    "partner_orders": partner_orders,
+    "partner_update": partner_update,
+}
+
+
+class Worker:
+    # Виртуальный пользователь: аноним, покупатель и поставщик в одном потоке
+    def __init__(self, driver, number):
+        self.number = number
+        self.anonymous = Session(driver)
+        buyer = driver.buyers[number % len(driver.buyers)]
+        self.buyer = Session(driver, buyer["token"])
+        self.contact = buyer["contact"]
+        partner = driver.partners[number % len(driver.partners)]
+        self.partner = Session(driver, partner["token"])
+        self.shop_number = partner["shop_number"]
+
+
+class LoadDriver:
+    # Прогоняет смесь сценариев в concurrency потоков, пока не выполнено
+    # iterations сценариев или не прошло duration секунд
+    # buyers и partners - адреса пользователей из generate_data,
+    # feed_server - FeedServer, который будет отдавать прайсы магазинов
+    def __init__(self, base_url, generator, buyers, partners, feed_server, mix):
+        self.base_url = base_url.rstrip("/")
+        self.generator = generator
+        self.buyer_emails = buyers
+        self.partner_emails = partners
+        self.feed_server = feed_server
+        self.mix = mix
+        self.lock = Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, latency, error):
+        with self.lock:
+            self.samples[label].append(latency)
+            if error:
+                self.errors[label] += 1
+
+    def login(self, email):
+        response = requests.post(
+            f"{self.base_url}/user/login",
+            data={"email": email, "password": PASSWORD},
+            timeout=60,
+        )
+        data = body(response)
+        if not data or not data.get("Status"):
+            raise RuntimeError(f"Не удалось войти как {email}: {response.text}")
+        return data["Token"]
+
+    def prepare(self):
+        # Вход пользователей и выборка каталога; эти запросы не замеряются
+        self.buyers = []
+        for email in self.buyer_emails:
+            token = self.login(email)
+            contacts = requests.get(
+                f"{self.base_url}/user/contact",
+                headers={"Authorization": f"Token {token}"},
+                timeout=60,
+            ).json()
+            if not contacts:
+                raise RuntimeError(f"У покупателя {email} нет контактов")
+            self.buyers.append({"token": token, "contact": contacts[0]["id"]})
+        self.partners = [
+            {"token": self.login(email), "shop_number": shop_number}
+            for shop_number, email in self.partner_emails
+        ]
+        for shop_number, _ in self.partner_emails:
+            self.feed_server.feeds[
+                f"/shop{shop_number}.yaml"
+            ] = lambda shop_number=shop_number: self.feed(shop_number)
+        self.shops = [shop["id"] for shop in self.fetch("/shops")]
+        self.categories = [category["id"] for category in self.fetch("/categories")]
+        products = self.fetch("/products", page_size=100, in_stock=1)
+        self.products = [product["id"] for product in products]
+        # Слова для поиска берутся из названий товаров
+        self.words = sorted(
+            {product["product"]["name"].split()[0] for product in products}
+        )
+        if not (self.shops and self.categories and self.products):
+            raise RuntimeError("Каталог пуст, сначала выполните generate_data")
+
+    def fetch(self, path, **params):
+        response = requests.get(f"{self.base_url}{path}", params=params, timeout=60)
+        response.raise_for_status()
+        return response.json()["results"]
+
+    @cache
+    def feed(self, shop_number):
+        # Прайс строится при первом запросе и дальше отдается из памяти
+        file = StringIO()
+        write_yaml(self.generator.price_list(shop_number), file)
+        return file.getvalue().encode()
+
+    def feed_url(self, shop_number):
+        return self.feed_server.url(f"/shop{shop_number}.yaml")
+
+    def run(self, concurrency, iterations=None, duration=None, seed=0):
+        remaining = count() if iterations is None else iter(range(iterations))
+        deadline = None if duration is None else perf_counter() + duration
+        names, weights = list(self.mix), list(self.mix.values())
+
+        def work(worker):
+            rng = Random(f"{seed}/{worker.number}")
+            while deadline is None or perf_counter() < deadline:
+                with self.lock:
+                    if next(remaining, None) is None:
+                        return
+                scenario = rng.choices(names, weights)[0]
+                SCENARIOS[scenario](self, worker, rng)
+
+        workers = [Worker(self, number) for number in range(concurrency)]
+        threads = [Thread(target=work, args=(worker,)) for worker in workers]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(self.samples, self.errors, perf_counter() - started)
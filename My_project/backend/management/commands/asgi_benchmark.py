@@ -0,0 +1,268 @@
+import asyncio
+import multiprocessing
+import socket
+from collections import defaultdict
+from time import perf_counter, sleep
+
+import psutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from backend.loadtest import format_report, summarize
+from backend.models import Order, ProductDocument, ShopOrder
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(kind, port, limit):
+    # Сервер в дочернем процессе: память и потоки меряются отдельно от клиента
+    # throttling отключен, иначе прогон упрется в частоты THROTTLE_RATES
+    settings.THROTTLE_RATES = {}
+    if kind == "wsgi":
+        server = ThreadedWSGIServer(("127.0.0.1", port), QuietHandler)
+        server.set_app(get_wsgi_application())
+        server.serve_forever()
+    else:
+        from backend.asgi import AsyncURLConfHandler, ConcurrencyLimit
+
+        uvicorn.run(
+            ConcurrencyLimit(AsyncURLConfHandler(), limit=limit),
+            host="127.0.0.1",
+            port=port,
+            log_level="warning",
+            access_log=False,
+            lifespan="off",
+        )
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        if not process.is_alive():
+            raise CommandError("Сервер завершился при запуске")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            sleep(0.1)
+    raise CommandError(f"Сервер не начал принимать соединения за {timeout} с")
+
+
+async def read_response(reader):
+    # Ответ HTTP/1.1: (статус, закрыл ли сервер соединение)
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+        return status, headers.get("connection", "").lower() == "close"
+    await reader.read()
+    return status, True
+
+
+async def client(port, requests, offset, deadline, samples, errors):
+    # Одно соединение с keep-alive, запросы по кругу до deadline
+    reader = writer = None
+    number = offset
+    while perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        label, raw = requests[number % len(requests)]
+        number += 1
+        started = perf_counter()
+        try:
+            writer.write(raw)
+            await writer.drain()
+            status, closed = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError):
+            status, closed = None, True
+        samples[label].append(perf_counter() - started)
+        if status is None or status >= 400:
+            errors[label] += 1
+        if closed:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, requests, connections, duration):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    started = perf_counter()
+    await asyncio.gather(
+        *(
+            client(port, requests, number, started + duration, samples, errors)
+            for number in range(connections)
+        )
+    )
+    return summarize(samples, errors, perf_counter() - started)
+
+
+async def hold_slow_clients(port, count, process):
+    # Медленные клиенты: соединение открыто, заголовки запроса не дописаны.
+    # Возвращает прирост памяти и потоков сервера, пока они висят
+    before = process.memory_info().rss, process.num_threads()
+    writers = []
+    for _ in range(count):
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /api/v1/categories HTTP/1.1\r\nHost: localhost\r\n")
+        await writer.drain()
+        writers.append(writer)
+    await asyncio.sleep(1)
+    after = process.memory_info().rss, process.num_threads()
+    for writer in writers:
+        writer.close()
+    # Память отдается страницами, на малых приростах разница бывает меньше нуля
+    return max(0, after[0] - before[0]), max(0, after[1] - before[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнить WSGI (поток на соединение) и ASGI (uvicorn, асинхронные "
+        "представления) на эндпоинтах чтения: RPS под нагрузкой и память "
+        "сервера на одно открытое соединение"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=200,
+            help="Сколько медленных соединений держать при замере памяти",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.ASGI_CONCURRENCY_LIMIT,
+            help="Ограничение одновременных запросов ASGI, 0 - без ограничения",
+        )
+        parser.add_argument(
+            "--only", choices=("wsgi", "asgi"), help="Замерить только один сервер"
+        )
+
+    def handle(self, *args, **options):
+        if uvicorn is None and options["only"] != "wsgi":
+            raise CommandError("Для замера ASGI нужен пакет uvicorn")
+        if options["connections"] < 1:
+            raise CommandError("--connections должно быть больше нуля")
+        requests = self.requests()
+        self.stdout.write(
+            f"Соединений: {options['connections']}, {options['duration']} с на "
+            f"сервер, медленных клиентов: {options['slow_clients']}"
+        )
+        # Дочерние процессы не должны унаследовать открытые соединения с базой
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        results = {}
+        for kind in ("wsgi", "asgi"):
+            if options["only"] and options["only"] != kind:
+                continue
+            port = free_port()
+            server = context.Process(
+                target=serve, args=(kind, port, options["limit"]), daemon=True
+            )
+            server.start()
+            try:
+                wait_for_port(port, server)
+                results[kind] = self.measure(kind, port, server.pid, requests, options)
+            finally:
+                server.terminate()
+                server.join()
+        if len(results) == 2:
+            wsgi, asgi = results["wsgi"], results["asgi"]
+            self.stdout.write(
+                f"ASGI/WSGI: RPS x{asgi['rps'] / wsgi['rps']:.2f}, память на "
+                f"соединение x{asgi['memory'] / max(wsgi['memory'], 1):.2f}"
+            )
+
+    def requests(self):
+        # Запросы к пяти эндпоинтам чтения; заказы - от имени пользователей,
+        # у которых они есть. Поставщик берется с наименьшим числом заказов,
+        # иначе замер сведется к сериализации одного огромного списка
+        buyer = (
+            Order.objects.exclude(state="basket").values_list("user_id", flat=True)
+        ).first()
+        partner = (
+            ShopOrder.objects.values("shop__user_id")
+            .annotate(count=Count("id"))
+            .order_by("count")
+            .values_list("shop__user_id", flat=True)
+            .first()
+        )
+        shop_id = ProductDocument.objects.values_list("shop_id", flat=True).first()
+        if buyer is None or partner is None or shop_id is None:
+            raise CommandError(
+                "Нужны товары и оформленные заказы, сначала выполните generate_data "
+                "и load_test"
+            )
+        tokens = {
+            "buyer": Token.objects.get_or_create(user_id=buyer)[0].key,
+            "partner": Token.objects.get_or_create(user_id=partner)[0].key,
+        }
+        paths = [
+            ("GET categories", "/api/v1/categories", None),
+            ("GET shops", "/api/v1/shops", None),
+            ("GET products", f"/api/v1/products?shop_id={shop_id}", None),
+            ("GET order", "/api/v1/order", "buyer"),
+            ("GET partner/orders", "/api/v1/partner/orders", "partner"),
+        ]
+        requests = []
+        for label, path, user in paths:
+            raw = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+            if user:
+                raw += f"Authorization: Token {tokens[user]}\r\n"
+            requests.append((label, (raw + "\r\n").encode()))
+        return requests
+
+    def measure(self, kind, port, pid, requests, options):
+        process = psutil.Process(pid)
+        # Прогрев: кеш каталога, соединения с базой, импорт модулей
+        asyncio.run(load(port, requests, 1, 1))
+        report = asyncio.run(
+            load(port, requests, options["connections"], options["duration"])
+        )
+        total = sum(row["count"] for row in report.values())
+        rps = sum(row["rps"] for row in report.values())
+        errors = sum(row["errors"] for row in report.values())
+        memory = threads = 0
+        if options["slow_clients"]:
+            memory, threads = asyncio.run(
+                hold_slow_clients(port, options["slow_clients"], process)
+            )
+            memory /= options["slow_clients"]
+        name = "WSGI" if kind == "wsgi" else f"ASGI, limit={options['limit']}"
+        self.stdout.write(f"\n{name}")
+        self.stdout.write(format_report(report))
+        self.stdout.write(
+            f"Всего {total} запросов, ошибок {errors}, {rps:.1f} RPS; "
+            f"память сервера {process.memory_info().rss / 2**20:.1f} МБ, на "
+            f"медленное соединение {memory / 1024:.1f} КБ и {threads} потоков "
+            f"на {options['slow_clients']} соединений"
+        )
+        return {"rps": rps, "memory": memory}
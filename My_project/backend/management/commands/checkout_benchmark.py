@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from backend.basket import BasketError, place_order
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Contact,
+    Order,
+    OrderItem,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замерить скорость оформления заказов, когда много покупателей "
+        "одновременно покупают один популярный товар"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--stock", type=int, default=100)
+        parser.add_argument("--quantity", type=int, default=1)
+
+    def handle(self, *args, **options):
+        # Данные замера создаются в отдельном магазине и удаляются после него
+        prefix = f"benchmark-{uuid4().hex[:8]}"
+        shop = Shop.objects.create(name=prefix[:50])
+        try:
+            checkouts = self.prepare(shop, prefix, options)
+            started = perf_counter()
+            # Каждый поток оформляет свою часть заказов через свое соединение
+            threads = options["threads"]
+            with ThreadPoolExecutor(threads) as executor:
+                parts = executor.map(
+                    self.worker, [checkouts[start::threads] for start in range(threads)]
+                )
+            results = [result for part in parts for result in part]
+            seconds = perf_counter() - started
+            placed = results.count(True)
+            product_info = ProductInfo.objects.get(shop=shop)
+            self.stdout.write(
+                f"Покупателей: {options['buyers']}, потоков: {options['threads']}\n"
+                f"Оформлено заказов: {placed}, отказов: {len(results) - placed}\n"
+                f"Остаток: {options['stock']} -> {product_info.quantity}\n"
+                f"Время: {seconds:.3f} с, {len(results) / seconds:.1f} оформлений/с"
+            )
+            if product_info.quantity != (
+                options["stock"] - placed * options["quantity"]
+            ):
+                self.stderr.write("Остаток не сходится с числом заказов")
+        finally:
+            users = User.objects.filter(email__startswith=prefix)
+            OrderItem.objects.filter(order__user__in=users).delete()
+            Order.objects.filter(user__in=users).delete()
+            users.delete()
+            category = Category.objects.filter(name=prefix).first()
+            Product.objects.filter(category=category).delete()
+            shop.delete()
+            if category is not None:
+                category.delete()
+
+    @staticmethod
+    def prepare(shop, prefix, options):
+        # Один товар с остатком stock и по корзине с ним у каждого покупателя
+        category = Category.objects.create(name=prefix)
+        product = Product.objects.create(name=prefix, category=category)
+        product_info = ProductInfo.objects.create(
+            product=product,
+            shop=shop,
+            external_id=0,
+            model=prefix,
+            quantity=options["stock"],
+            price=100,
+            price_rrc=100,
+        )
+        users = User.objects.bulk_create(
+            User(email=f"{prefix}-{number}@example.com", username=prefix)
+            for number in range(options["buyers"])
+        )
+        contacts = Contact.objects.bulk_create(
+            Contact(user=user, city="Москва", street="Тверская", phone="1")
+            for user in users
+        )
+        orders = Order.objects.bulk_create(
+            Order(user=user, state="basket") for user in users
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product_info=product_info, quantity=options["quantity"]
+            )
+            for order in orders
+        )
+        return [
+            (user.id, order.id, contact.id)
+            for user, order, contact in zip(users, orders, contacts)
+        ]
+
+    @staticmethod
+    def worker(checkouts):
+        try:
+            results = []
+            for arguments in checkouts:
+                try:
+                    place_order(*arguments)
+                    results.append(True)
+                except BasketError:
+                    results.append(False)
+            return results
+        finally:
+            connection.close()
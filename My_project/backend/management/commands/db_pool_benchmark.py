@@ -0,0 +1,109 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+from backend.db_pool.pool import close_pools, pool_stats
+from backend.loadtest import format_report, summarize
+
+# Запрос списка категорий, как у GET /categories
+QUERY = 'SELECT "id", "name" FROM "backend_category" ORDER BY "id" LIMIT 40'
+
+
+class Command(BaseCommand):
+    help = (
+        "Замерить задержку запроса к базе с подключением на каждый запрос "
+        "и с пулом соединений: цикл запроса Django - соединение, запрос, "
+        "закрытие в конце запроса"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            nargs="+",
+            default=[1, 8],
+            help="Число параллельных потоков, можно несколько значений",
+        )
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            help="Размер пула, по умолчанию DB_POOL_SIZE или число потоков",
+        )
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES["default"]
+        if database["ENGINE"] not in (
+            "django.db.backends.postgresql",
+            "backend.db_pool",
+        ):
+            raise CommandError("Пул соединений работает только с PostgreSQL")
+        pool = dict(database.get("OPTIONS", {}).get("pool") or {})
+        samples, errors = defaultdict(list), defaultdict(int)
+        elapsed = {}
+        for threads in options["threads"]:
+            pool["max_size"] = options["pool_size"] or pool.get("max_size") or threads
+            for name, engine, engine_options in (
+                ("без пула", "django.db.backends.postgresql", {}),
+                ("пул", "backend.db_pool", {"pool": pool}),
+            ):
+                label = f"{name}, потоков {threads}"
+                # Каждый прогон с пулом начинается с пустого пула
+                close_pools(database["NAME"])
+                handler = ConnectionHandler(
+                    {
+                        "default": {
+                            **database,
+                            "ENGINE": engine,
+                            "OPTIONS": engine_options,
+                        }
+                    }
+                )
+                elapsed[label] = self.run(
+                    handler, threads, options["requests"], label, samples, errors
+                )
+                if engine_options:
+                    stats = next(iter(pool_stats().values()))
+                    self.stdout.write(
+                        f"{label}: открыто соединений {stats['opened']}, "
+                        f"ожиданий свободного {stats['waits']}, "
+                        f"всего ждали {stats['wait_time']:.3f} с"
+                    )
+        # У каждого прогона своя длительность, RPS считается по ней
+        report = {}
+        for label in samples:
+            report.update(summarize({label: samples[label]}, errors, elapsed[label]))
+        self.stdout.write(format_report(report))
+
+    def run(self, handler, threads, requests, label, samples, errors):
+        def worker(count):
+            connection = handler["default"]
+            for _ in range(count):
+                started = perf_counter()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(QUERY)
+                        cursor.fetchall()
+                except Exception:
+                    errors[label] += 1
+                # Конец запроса: с CONN_MAX_AGE=0 соединение закрывается
+                connection.close_if_unusable_or_obsolete()
+                samples[label].append(perf_counter() - started)
+            connection.close()
+
+        started = perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(
+                executor.map(
+                    worker,
+                    [
+                        requests // threads + (number < requests % threads)
+                        for number in range(threads)
+                    ],
+                )
+            )
+        return perf_counter() - started
@@ -0,0 +1,95 @@
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.generator import (
+    PASSWORD,
+    DataGenerator,
+    DataWriter,
+    write_json_lines,
+    write_yaml,
+)
+
+WRITERS = {"yaml": (".yaml", write_yaml), "jsonl": (".jsonl", write_json_lines)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сгенерировать магазины, категории, товары, покупателей, корзины и заказы. "
+        "Одинаковые seed и размеры всегда дают одинаковые данные"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--shops", type=int, default=10)
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--baskets", type=int, default=50)
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument(
+            "--lines", type=int, default=3, help="Среднее число позиций заказа"
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--output",
+            help="Вместо записи в базу сохранить прайсы магазинов в эту папку",
+        )
+        parser.add_argument("--format", choices=list(WRITERS), default="yaml")
+
+    def handle(self, *args, **options):
+        for name in ("shops", "categories", "lines"):
+            if options[name] < 1:
+                raise CommandError(f"--{name} должно быть больше нуля")
+        generator = DataGenerator(
+            options["seed"],
+            options["shops"],
+            options["categories"],
+            options["products"],
+        )
+        started = perf_counter()
+        if options["output"]:
+            self.write_feeds(generator, Path(options["output"]), options["format"])
+        else:
+            self.write_database(generator, options)
+        self.stdout.write(f"Время: {perf_counter() - started:.1f} с")
+
+    def write_feeds(self, generator, folder, feed_format):
+        # Прайсы можно загрузить через partner/update, отдав папку любым
+        # HTTP сервером, например python -m http.server
+        folder.mkdir(parents=True, exist_ok=True)
+        extension, write = WRITERS[feed_format]
+        for shop_number in range(generator.shops):
+            path = folder / f"shop{shop_number}{extension}"
+            with open(path, "w", encoding="utf-8") as file:
+                write(generator.price_list(shop_number), file)
+            self.stdout.write(f"Прайс: {path}")
+
+    def write_database(self, generator, options):
+        self.reported = 0
+        writer = DataWriter(
+            generator, options["batch_size"], progress=self.report_progress
+        )
+        if writer.exists():
+            raise CommandError(
+                f"Данные с seed {generator.seed} уже созданы, укажите другой --seed"
+            )
+        products = writer.write_catalog()
+        writer.write_buyers(
+            options["users"], options["baskets"], options["orders"], options["lines"]
+        )
+        self.stdout.write(
+            f"Магазинов: {generator.shops}, товаров: {products}, "
+            f"покупателей: {options['users']}, корзин: "
+            f"{min(options['baskets'], options['users'])}, заказов: "
+            f"{options['orders'] if options['users'] else 0}\n"
+            f"Вход: {writer.email('partner', 0)}, {writer.email('buyer', 0)} "
+            f"и т.д., пароль {PASSWORD}"
+        )
+
+    def report_progress(self, phase, processed):
+        # Примерно раз на сто тысяч товаров
+        if processed // 100_000 > self.reported:
+            self.reported = processed // 100_000
+            self.stdout.write(f"Товаров записано: {processed}")
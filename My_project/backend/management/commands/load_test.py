@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from threading import Thread
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from rest_framework.views import APIView
+
+from backend.authentication import token_cache
+from backend.generator import DataGenerator, DataWriter
+from backend.loadtest import (
+    DEFAULT_MIX,
+    LoadDriver,
+    compare,
+    format_report,
+    load_baseline,
+    parse_mix,
+    save_baseline,
+)
+from backend.sinks import FeedServer, SMTPSink
+from my_project import celery_app
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон /api/v1: смесь сценариев покупателей и поставщиков "
+        "на данных generate_data, отчет RPS и p50/p95/p99 по запросам, "
+        "сравнение с сохраненным базовым прогоном"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="Адрес /api/v1 запущенного сервера; без него сервер "
+            "поднимается в процессе команды",
+        )
+        # seed и размеры должны совпадать с теми, что передавались generate_data
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--shops", type=int, default=10)
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--buyers", type=int, default=10)
+        parser.add_argument("--partners", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--iterations", type=int, help="Сколько сценариев выполнить всего"
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            help="Сколько секунд идет прогон, по умолчанию 30, если не задан "
+            "--iterations",
+        )
+        parser.add_argument("--mix", default=DEFAULT_MIX)
+        parser.add_argument("--baseline", help="Файл базового прогона для сравнения")
+        parser.add_argument("--save-baseline", help="Сохранить прогон в этот файл")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Допустимое ухудшение относительно базового прогона, доля",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as error:
+            raise CommandError(error)
+        for name in ("shops", "buyers", "partners", "concurrency"):
+            if options[name] < 1:
+                raise CommandError(f"--{name} должно быть больше нуля")
+        if options["iterations"] is None and options["duration"] is None:
+            options["duration"] = 30
+        generator = DataGenerator(
+            options["seed"],
+            options["shops"],
+            options["categories"],
+            options["products"],
+        )
+        writer = DataWriter(generator)
+        buyers = [writer.email("buyer", number) for number in range(options["buyers"])]
+        partners = [
+            (number, writer.email("partner", number))
+            for number in range(min(options["partners"], options["shops"]))
+        ]
+        if not options["url"] and not writer.exists():
+            raise CommandError(
+                f"Данных с seed {options['seed']} нет, сначала выполните generate_data"
+            )
+        token_cache.clear()
+        with FeedServer() as feed_server, SMTPSink() as smtp_sink:
+            with self.server(options["url"], smtp_sink) as base_url:
+                report = self.run(
+                    base_url, generator, buyers, partners, feed_server, mix, options
+                )
+        self.stdout.write(format_report(report))
+        if not options["url"]:
+            # Сервер работал в этом процессе, его кеш токенов виден здесь
+            stats = token_cache.stats()
+            self.stdout.write(
+                f"Кеш токенов: попаданий {stats['hit_rate']:.1%}, "
+                f"промахов {stats['misses']}, сбросов {stats['invalidations']}"
+            )
+        if smtp_sink.messages:
+            self.stdout.write(f"Писем отправлено: {len(smtp_sink.messages)}")
+        if options["save_baseline"]:
+            save_baseline(
+                options["save_baseline"],
+                report,
+                {
+                    name: options[name]
+                    for name in (
+                        "seed",
+                        "products",
+                        "buyers",
+                        "partners",
+                        "concurrency",
+                        "iterations",
+                        "duration",
+                        "mix",
+                    )
+                },
+            )
+            self.stdout.write(f"Базовый прогон сохранен: {options['save_baseline']}")
+        if options["baseline"]:
+            regressions = compare(
+                report, load_baseline(options["baseline"]), options["tolerance"]
+            )
+            for regression in regressions:
+                self.stdout.write(f"Регрессия: {regression}")
+            if regressions:
+                raise CommandError(f"Найдено регрессий: {len(regressions)}")
+            self.stdout.write("Регрессий нет")
+
+    def run(self, base_url, generator, buyers, partners, feed_server, mix, options):
+        driver = LoadDriver(base_url, generator, buyers, partners, feed_server, mix)
+        try:
+            driver.prepare()
+        except RuntimeError as error:
+            raise CommandError(error)
+        return driver.run(
+            options["concurrency"],
+            options["iterations"],
+            options["duration"],
+            options["seed"],
+        )
+
+    @contextmanager
+    def server(self, url, smtp_sink):
+        if url:
+            yield url
+            return
+        # Сервер в процессе команды: письма уходят в локальный SMTP, задачи
+        # Celery выполняются сразу без брокера, throttling отключен, иначе
+        # дневной лимит в 20 запросов закончится на первой секунде прогона
+        host, port = smtp_sink.address
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+        server.set_app(get_wsgi_application())
+        Thread(target=server.serve_forever, daemon=True).start()
+        throttle_classes = APIView.throttle_classes
+        always_eager = celery_app.conf.CELERY_TASK_ALWAYS_EAGER
+        APIView.throttle_classes = ()
+        celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True
+        try:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST=host,
+                EMAIL_PORT=port,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+                EMAIL_USE_SSL=False,
+                EMAIL_USE_TLS=False,
+            ):
+                host, port = server.server_address
+                yield f"http://{host}:{port}/api/v1"
+        finally:
+            server.shutdown()
+            server.server_close()
+            APIView.throttle_classes = throttle_classes
+            celery_app.conf.CELERY_TASK_ALWAYS_EAGER = always_eager
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.basket import recalculate_totals, recalculate_shop_totals
+from backend.importer import chunks
+from backend.models import Order, ShopOrder
+
+
+class Command(BaseCommand):
+    help = "Пересчитать сохраненные итоги заказов и заказов магазинов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Только заказы пользователя")
+        parser.add_argument("--state", help="Только заказы в этом статусе")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options["user"]:
+            orders = orders.filter(user_id=options["user"])
+        if options["state"]:
+            orders = orders.filter(state=options["state"])
+        # Пачками, чтобы не держать блокировку на всех заказах сразу
+        ids = orders.order_by("id").values_list("id", flat=True).iterator()
+        count = 0
+        for part in chunks(ids, settings.IMPORT_BATCH_SIZE):
+            count += recalculate_totals(Order.objects.filter(id__in=part))
+            recalculate_shop_totals(ShopOrder.objects.filter(order_id__in=part))
+        self.stdout.write(f"Пересчитано заказов: {count}")
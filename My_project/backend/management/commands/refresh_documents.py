@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from backend.documents import refresh_documents, refresh_facets
+from backend.models import ProductInfo
+
+
+class Command(BaseCommand):
+    help = "Пересобрать документы поиска товаров и сводку фасетов каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shop", type=int, help="Только товары магазина с этим id")
+
+    def handle(self, *args, **options):
+        product_infos = ProductInfo.objects.all()
+        shop_ids = None
+        if options["shop"]:
+            product_infos = product_infos.filter(shop_id=options["shop"])
+            shop_ids = [options["shop"]]
+        count = refresh_documents(product_infos, facets=False)
+        # Сводка пересобирается и для магазинов, у которых не осталось товаров
+        refresh_facets(shop_ids)
+        self.stdout.write(f"Пересобрано документов: {count}")
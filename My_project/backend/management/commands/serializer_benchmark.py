@@ -0,0 +1,128 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch, Sum, Window
+from rest_framework.renderers import JSONRenderer
+
+from backend.flat_serializers import FlatSerializer
+from backend.models import Order, OrderItem, ProductInfo, ProductParameter
+from backend.serializers import (
+    OrderItemCreateSerializer,
+    OrderSerializer,
+    PlacedOrderSerializer,
+    ProductInfoSerializer,
+)
+
+
+def parameters(lookup):
+    # Предзагрузка параметров в том же порядке, что у FlatSerializer
+    return Prefetch(
+        lookup, ProductParameter.objects.select_related("parameter").order_by("pk")
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнить сериализаторы DRF и FlatSerializer на списках из --items "
+        "позиций: время запросов, сериализации и JSON, ответы должны совпадать "
+        "байт в байт"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        items = options["items"]
+        orders = self.orders(items)
+        cases = [
+            (
+                "ProductInfoSerializer",
+                ProductInfoSerializer,
+                ProductInfo.objects.order_by("id")[:items],
+                lambda queryset: queryset.select_related(
+                    "product__category"
+                ).prefetch_related(parameters("product_parameters")),
+            ),
+            (
+                "OrderItemCreateSerializer",
+                OrderItemCreateSerializer,
+                OrderItem.objects.order_by("id")[:items],
+                lambda queryset: queryset.select_related(
+                    "product_info__product__category"
+                ).prefetch_related(parameters("product_info__product_parameters")),
+            ),
+            (
+                "OrderSerializer",
+                OrderSerializer,
+                orders,
+                lambda queryset: queryset.select_related("contact").prefetch_related(
+                    Prefetch(
+                        "ordered_items",
+                        OrderItem.objects.select_related(
+                            "product_info__product__category"
+                        ).order_by("pk"),
+                    ),
+                    parameters("ordered_items__product_info__product_parameters"),
+                ),
+            ),
+            (
+                "PlacedOrderSerializer",
+                PlacedOrderSerializer,
+                orders,
+                lambda queryset: queryset.select_related("contact").prefetch_related(
+                    Prefetch("ordered_items", OrderItem.objects.order_by("pk"))
+                ),
+            ),
+        ]
+        self.stdout.write(
+            f"Заказов: {orders.count()}, позиций в них: "
+            f"{OrderItem.objects.filter(order__in=orders).count()}"
+        )
+        renderer = JSONRenderer()
+        self.stdout.write(
+            f"{'Сериализатор':<28}{'Объектов':>10}{'DRF, мс':>12}"
+            f"{'Flat, мс':>12}{'Ускорение':>12}"
+        )
+        for name, serializer_class, queryset, prefetch in cases:
+            flat = FlatSerializer(serializer_class)
+            times = {"drf": [], "flat": []}
+            for _ in range(options["repeat"]):
+                started = perf_counter()
+                expected = renderer.render(
+                    serializer_class(prefetch(queryset.all()), many=True).data
+                )
+                times["drf"].append(perf_counter() - started)
+                started = perf_counter()
+                content = renderer.render(flat.serialize(queryset.all()))
+                times["flat"].append(perf_counter() - started)
+                if content != expected:
+                    raise CommandError(f"{name}: ответы DRF и FlatSerializer разные")
+            drf, fast = median(times["drf"]), median(times["flat"])
+            self.stdout.write(
+                f"{name:<28}{queryset.count():>10}{drf * 1000:>12.1f}"
+                f"{fast * 1000:>12.1f}{drf / fast:>11.1f}x"
+            )
+
+    @staticmethod
+    def orders(items):
+        # Оформленные заказы, в которых вместе около items позиций
+        orders = (
+            Order.objects.exclude(state="basket")
+            .annotate(
+                running=Window(Sum("items_count"), order_by=("id",)),
+            )
+            .order_by("id")
+            .values_list("id", "running")
+        )
+        ids = []
+        for order_id, running in orders.iterator():
+            ids.append(order_id)
+            if running >= items:
+                break
+        if not ids:
+            raise CommandError(
+                "Нет оформленных заказов, сначала выполните generate_data"
+            )
+        return Order.objects.filter(id__in=ids).order_by("id")
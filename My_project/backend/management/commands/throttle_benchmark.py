@@ -0,0 +1,73 @@
+from time import perf_counter
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.throttling import UserRateThrottle
+
+from backend.throttling import LocalBucketStore, RedisBucketStore, TokenBucketThrottle
+
+
+class Command(BaseCommand):
+    help = (
+        "Замерить накладные расходы throttling на один запрос: история "
+        "запросов DRF в кеше против корзины токенов в памяти и в Redis"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--rate", default="1000/min")
+        parser.add_argument(
+            "--redis", help="Адрес Redis, например redis://localhost:6379/2"
+        )
+
+    def handle(self, *args, **options):
+        requests = [
+            SimpleNamespace(
+                user=SimpleNamespace(is_authenticated=True, pk=number),
+                META={"REMOTE_ADDR": "127.0.0.1"},
+            )
+            for number in range(options["users"])
+        ]
+        view = SimpleNamespace(throttle_scope="benchmark")
+        self.stdout.write(
+            f"Запросов: {options['requests']}, пользователей: {options['users']}, "
+            f"частота: {options['rate']}"
+        )
+
+        class HistoryThrottle(UserRateThrottle):
+            rate = options["rate"]
+
+        cache.clear()
+        self.measure("DRF UserRateThrottle", HistoryThrottle, requests, view, options)
+        stores = [("корзина токенов, память", LocalBucketStore())]
+        if options["redis"]:
+            stores.append(
+                ("корзина токенов, Redis", RedisBucketStore(options["redis"]))
+            )
+        for name, store in stores:
+
+            class BucketThrottle(TokenBucketThrottle):
+                def get_store(self):
+                    return store
+
+            store.clear()
+            with override_settings(THROTTLE_RATES={"benchmark": options["rate"]}):
+                self.measure(name, BucketThrottle, requests, view, options)
+            store.clear()
+        cache.clear()
+
+    def measure(self, name, throttle_class, requests, view, options):
+        # Новый объект throttle на каждый запрос, как в DRF
+        allowed = 0
+        started = perf_counter()
+        for number in range(options["requests"]):
+            request = requests[number % len(requests)]
+            allowed += throttle_class().allow_request(request, view)
+        seconds = perf_counter() - started
+        self.stdout.write(
+            f"{name}: {seconds / options['requests'] * 1e6:.1f} мкс на запрос, "
+            f"пропущено {allowed}"
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0002_remove_orderitem_product_name_remove_orderitem_state"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="productinfo",
+            name="unique_product_info",
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="product_info",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="ordered_items",
+                to="backend.productinfo",
+                verbose_name="Информация о продукте",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productinfo",
+            constraint=models.UniqueConstraint(
+                fields=("shop", "external_id"), name="unique_product_info"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0004_import_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="format",
+            field=models.CharField(
+                choices=[("yaml", "YAML"), ("jsonl", "JSON Lines")],
+                default="yaml",
+                max_length=5,
+                verbose_name="Формат прайса",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-18 18:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0005_import_job_format"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector("name", config="russian"),
+                name="product_name_search",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productinfo",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector("model", config="russian"),
+                name="product_info_model_search",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productparameter",
+            index=models.Index(
+                fields=["parameter", "value"], name="product_parameter_value"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productparameter",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector("value", config="russian"),
+                name="product_parameter_search",
+            ),
+        ),
+    ]
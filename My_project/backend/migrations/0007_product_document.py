@@ -0,0 +1,144 @@
+# Generated by Django 5.0 on 2026-10-18 18:24
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Заполнение документов поиска для уже загруженных товаров
+FILL_DOCUMENTS = """
+INSERT INTO backend_productdocument (
+    product_info_id, external_id, model, name, category_id, category_name,
+    shop_id, shop_name, shop_state, quantity, price, price_rrc,
+    parameters, keywords, search
+)
+SELECT
+    product_info.id, product_info.external_id, product_info.model, product.name,
+    category.id, category.name, shop.id, shop.name, shop.state,
+    product_info.quantity, product_info.price, product_info.price_rrc,
+    COALESCE(parameters.parameters, '[]'::jsonb),
+    COALESCE(parameters.keywords, ''),
+    to_tsvector(
+        'russian'::regconfig,
+        COALESCE(product.name, '') || ' ' || COALESCE(product_info.model, '')
+        || ' ' || COALESCE(parameters.keywords, '')
+    )
+FROM backend_productinfo product_info
+JOIN backend_product product ON product.id = product_info.product_id
+JOIN backend_category category ON category.id = product.category_id
+JOIN backend_shop shop ON shop.id = product_info.shop_id
+LEFT JOIN LATERAL (
+    SELECT
+        jsonb_agg(
+            jsonb_build_object('parameter', parameter.name, 'value', value.value)
+            ORDER BY value.id
+        ) AS parameters,
+        string_agg(value.value, ' ' ORDER BY value.id) AS keywords
+    FROM backend_productparameter value
+    JOIN backend_parameter parameter ON parameter.id = value.parameter_id
+    WHERE value.product_info_id = product_info.id
+) parameters ON true
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0006_product_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductDocument",
+            fields=[
+                (
+                    "product_info",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="document",
+                        serialize=False,
+                        to="backend.productinfo",
+                        verbose_name="Информация о продукте",
+                    ),
+                ),
+                ("external_id", models.PositiveIntegerField(verbose_name="Внешний ИД")),
+                (
+                    "model",
+                    models.CharField(blank=True, max_length=80, verbose_name="Модель"),
+                ),
+                ("name", models.CharField(max_length=80, verbose_name="Название")),
+                ("category_id", models.BigIntegerField(verbose_name="ИД категории")),
+                (
+                    "category_name",
+                    models.CharField(max_length=40, verbose_name="Категория"),
+                ),
+                ("shop_id", models.BigIntegerField(verbose_name="ИД магазина")),
+                ("shop_name", models.CharField(max_length=50, verbose_name="Магазин")),
+                (
+                    "shop_state",
+                    models.BooleanField(verbose_name="Статус получения заказов"),
+                ),
+                ("quantity", models.PositiveIntegerField(verbose_name="Количество")),
+                ("price", models.PositiveIntegerField(verbose_name="Цена")),
+                (
+                    "price_rrc",
+                    models.PositiveIntegerField(verbose_name="Розничная цена"),
+                ),
+                (
+                    "parameters",
+                    models.JSONField(default=list, verbose_name="Параметры"),
+                ),
+                (
+                    "keywords",
+                    models.TextField(blank=True, verbose_name="Ключевые слова"),
+                ),
+                (
+                    "search",
+                    django.contrib.postgres.search.SearchVectorField(
+                        null=True, verbose_name="Поисковый вектор"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Документ поиска товара",
+                "verbose_name_plural": "Документы поиска товаров",
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_name_search",
+        ),
+        migrations.RemoveIndex(
+            model_name="productinfo",
+            name="product_info_model_search",
+        ),
+        migrations.RemoveIndex(
+            model_name="productparameter",
+            name="product_parameter_search",
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=models.Index(fields=["shop_id"], name="product_document_shop"),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=models.Index(
+                fields=["category_id"], name="product_document_category"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search"], name="product_document_search"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["parameters"],
+                name="product_document_parameters",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ),
+        migrations.RunSQL(FILL_DOCUMENTS, migrations.RunSQL.noop),
+    ]
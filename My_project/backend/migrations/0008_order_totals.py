@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+# Итоги существующих заказов по текущим ценам, как их раньше считали запросы
+FILL_TOTALS = """
+UPDATE backend_order AS o
+SET total_sum = totals.total_sum, items_count = totals.items_count
+FROM (
+    SELECT
+        i.order_id,
+        COALESCE(SUM(i.quantity::bigint * p.price), 0) AS total_sum,
+        COALESCE(SUM(i.quantity), 0) AS items_count
+    FROM backend_orderitem AS i
+    LEFT JOIN backend_productinfo AS p ON p.id = i.product_info_id
+    GROUP BY i.order_id
+) AS totals
+WHERE totals.order_id = o.id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0007_product_document"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="items_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Количество товаров"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_sum",
+            field=models.PositiveBigIntegerField(default=0, verbose_name="Сумма"),
+        ),
+        migrations.RunSQL(FILL_TOTALS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+# Снимок для уже оформленных заказов по текущему каталогу
+FILL_SNAPSHOT = """
+UPDATE backend_orderitem AS i
+SET product_name = p.name, model = pi.model, shop_name = s.name,
+    price = pi.price, price_rrc = pi.price_rrc
+FROM backend_order AS o, backend_productinfo AS pi, backend_product AS p,
+    backend_shop AS s
+WHERE o.id = i.order_id AND o.state <> 'basket'
+    AND pi.id = i.product_info_id AND p.id = pi.product_id AND s.id = pi.shop_id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0008_order_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="model",
+            field=models.CharField(
+                blank=True, default="", max_length=80, verbose_name="Модель"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="price",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Цена"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="price_rrc",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Розничная цена"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product_name",
+            field=models.CharField(
+                blank=True, default="", max_length=80, verbose_name="Название"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="shop_name",
+            field=models.CharField(
+                blank=True, default="", max_length=50, verbose_name="Название магазина"
+            ),
+        ),
+        migrations.RunSQL(FILL_SNAPSHOT, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.0 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Разбить уже оформленные заказы на заказы магазинов по позициям
+FILL_SHOP_ORDERS = """
+UPDATE backend_orderitem AS i
+SET shop_id = pi.shop_id
+FROM backend_productinfo AS pi
+WHERE i.shop_id IS NULL AND pi.id = i.product_info_id;
+
+INSERT INTO backend_shoporder (
+    order_id, shop_id, state, created_at, total_sum, items_count
+)
+SELECT
+    o.id, i.shop_id, o.state, o.datatime,
+    COALESCE(SUM(i.quantity::bigint * i.price), 0), SUM(i.quantity)
+FROM backend_order AS o
+JOIN backend_orderitem AS i ON i.order_id = o.id
+WHERE o.state <> 'basket' AND i.shop_id IS NOT NULL
+GROUP BY o.id, i.shop_id;
+
+UPDATE backend_orderitem AS i
+SET shop_order_id = so.id
+FROM backend_shoporder AS so
+WHERE so.order_id = i.order_id AND so.shop_id = i.shop_id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0009_order_item_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShopOrder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("basket", "Корзина"),
+                            ("new", "Новый"),
+                            ("confirmed", "Подтвержден"),
+                            ("assembled", "Собран"),
+                            ("sent", "Отправлено"),
+                            ("delivered", "Доставлен"),
+                            ("canceled", "Отменен"),
+                        ],
+                        default="new",
+                        max_length=15,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создан"),
+                ),
+                (
+                    "total_sum",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Сумма"),
+                ),
+                (
+                    "items_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество товаров"
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shop_orders",
+                        to="backend.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shop_orders",
+                        to="backend.shop",
+                        verbose_name="Магазин",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Заказ магазина",
+                "verbose_name_plural": "Список заказов магазинов",
+                "ordering": ("-created_at",),
+            },
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="shop_order",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="ordered_items",
+                to="backend.shoporder",
+                verbose_name="Заказ магазина",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shoporder",
+            index=models.Index(
+                fields=["shop", "-created_at"], name="shop_order_shop_created"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="shoporder",
+            constraint=models.UniqueConstraint(
+                fields=("order", "shop"), name="unique_shop_order"
+            ),
+        ),
+        migrations.RunSQL(FILL_SHOP_ORDERS, migrations.RunSQL.noop),
+    ]
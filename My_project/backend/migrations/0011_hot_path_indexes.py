@@ -0,0 +1,49 @@
+# Generated by Django 5.0 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0010_shop_order"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productdocument",
+            name="product_document_shop",
+        ),
+        migrations.RemoveIndex(
+            model_name="productdocument",
+            name="product_document_category",
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("state", "basket")),
+                fields=["user"],
+                name="order_basket",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=models.Index(
+                fields=["shop_id", "product_info"], name="product_document_shop_page"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=models.Index(
+                fields=["category_id", "product_info"],
+                name="product_document_category_page",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdocument",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", 0), ("shop_state", True)),
+                fields=["product_info"],
+                name="product_document_in_stock",
+            ),
+        ),
+    ]
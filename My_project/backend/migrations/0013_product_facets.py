@@ -0,0 +1,98 @@
+# Generated by Django 5.0 on 2026-10-18 21:16
+
+from django.db import migrations, models
+
+# Заполнение сводки фасетов по уже собранным документам поиска
+FILL_FACETS = """
+INSERT INTO backend_productpricerange (shop_id, category_id, in_stock, min, max)
+SELECT shop_id, category_id, quantity > 0, MIN(price), MAX(price)
+FROM backend_productdocument
+WHERE shop_state
+GROUP BY shop_id, category_id, quantity > 0;
+INSERT INTO backend_productfacet (
+    shop_id, category_id, in_stock, name, value, products
+)
+SELECT
+    document.shop_id, document.category_id, document.quantity > 0,
+    item ->> 'parameter', item ->> 'value', COUNT(*)
+FROM backend_productdocument document,
+    jsonb_array_elements(document.parameters) item
+WHERE document.shop_state
+GROUP BY 1, 2, 3, 4, 5;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0012_outbox_email"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductPriceRange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shop_id", models.BigIntegerField(verbose_name="ИД магазина")),
+                ("category_id", models.BigIntegerField(verbose_name="ИД категории")),
+                ("in_stock", models.BooleanField(verbose_name="В наличии")),
+                ("min", models.PositiveIntegerField(verbose_name="Минимальная цена")),
+                ("max", models.PositiveIntegerField(verbose_name="Максимальная цена")),
+            ],
+            options={
+                "verbose_name": "Диапазон цен каталога",
+                "verbose_name_plural": "Диапазоны цен каталога",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shop_id", models.BigIntegerField(verbose_name="ИД магазина")),
+                ("category_id", models.BigIntegerField(verbose_name="ИД категории")),
+                ("in_stock", models.BooleanField(verbose_name="В наличии")),
+                (
+                    "name",
+                    models.CharField(max_length=40, verbose_name="Название параметра"),
+                ),
+                ("value", models.CharField(max_length=100, verbose_name="Значение")),
+                (
+                    "products",
+                    models.PositiveIntegerField(verbose_name="Количество товаров"),
+                ),
+            ],
+            options={
+                "verbose_name": "Фасет каталога",
+                "verbose_name_plural": "Фасеты каталога",
+                "indexes": [
+                    models.Index(
+                        fields=["shop_id", "category_id"], name="product_facet_shop"
+                    ),
+                    models.Index(fields=["category_id"], name="product_facet_category"),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productpricerange",
+            constraint=models.UniqueConstraint(
+                fields=("shop_id", "category_id", "in_stock"),
+                name="unique_product_price_range",
+            ),
+        ),
+        migrations.RunSQL(FILL_FACETS, migrations.RunSQL.noop),
+    ]
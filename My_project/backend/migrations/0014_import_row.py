@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0013_product_facets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("import_id", models.UUIDField(verbose_name="Загрузка")),
+                ("external_id", models.PositiveIntegerField(verbose_name="Внешний ИД")),
+                ("item", models.TextField(verbose_name="Товар")),
+            ],
+            options={
+                "verbose_name": "Товар загружаемого прайса",
+                "verbose_name_plural": "Товары загружаемых прайсов",
+                "indexes": [
+                    models.Index(fields=["import_id", "id"], name="import_row_order"),
+                    models.Index(
+                        fields=["import_id", "external_id"], name="import_row_item"
+                    ),
+                ],
+            },
+        ),
+    ]
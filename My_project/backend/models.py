@@ -1,9 +1,12 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 from django.db import models
+from django.utils.timezone import now
 from time import gmtime, strftime
 
 STATE_CHOICES = (
@@ -21,6 +24,24 @@ USER_TYPE_CHOICES = (
     ("buyer", "Покупатель"),
 )
 
+FEED_FORMAT_CHOICES = (
+    ("yaml", "YAML"),
+    ("jsonl", "JSON Lines"),
+)
+
+IMPORT_STATE_CHOICES = (
+    ("queued", "В очереди"),
+    ("running", "Выполняется"),
+    ("done", "Завершена"),
+    ("failed", "Ошибка"),
+)
+
+EMAIL_STATE_CHOICES = (
+    ("pending", "Ожидает отправки"),
+    ("sent", "Отправлено"),
+    ("failed", "Не отправлено"),
+)
+
 
 class UserManager(BaseUserManager):
     use_in_migrations = True
@@ -181,7 +202,7 @@ class ProductInfo(models.Model):
         verbose_name_plural = "Список информации о продукте"
         constraints = [
             models.UniqueConstraint(
-                fields=["product", "shop", "external_id"], name="unique_product_info"
+                fields=["shop", "external_id"], name="unique_product_info"
             ),
         ]
 
@@ -229,6 +250,110 @@ class ProductParameter(models.Model):
                 fields=["product_info", "parameter"], name="unique_product_parameter"
             ),
         ]
+        indexes = [
+            models.Index(fields=["parameter", "value"], name="product_parameter_value"),
+        ]
+
+
+class ProductDocument(models.Model):
+    # Плоская копия ProductInfo для каталога и поиска: все, что отдает /products,
+    # лежит в одной строке, поэтому чтение обходится без соединений таблиц.
+    # Строки пересобираются в backend/documents.py при изменении исходных данных
+    product_info = models.OneToOneField(
+        ProductInfo,
+        verbose_name="Информация о продукте",
+        related_name="document",
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    external_id = models.PositiveIntegerField(verbose_name="Внешний ИД")
+    model = models.CharField(max_length=80, verbose_name="Модель", blank=True)
+    name = models.CharField(max_length=80, verbose_name="Название")
+    category_id = models.BigIntegerField(verbose_name="ИД категории")
+    category_name = models.CharField(max_length=40, verbose_name="Категория")
+    shop_id = models.BigIntegerField(verbose_name="ИД магазина")
+    shop_name = models.CharField(max_length=50, verbose_name="Магазин")
+    shop_state = models.BooleanField(verbose_name="Статус получения заказов")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    price = models.PositiveIntegerField(verbose_name="Цена")
+    price_rrc = models.PositiveIntegerField(verbose_name="Розничная цена")
+    # Список {"parameter": имя, "value": значение} в порядке ProductParameter.id
+    parameters = models.JSONField(verbose_name="Параметры", default=list)
+    # Значения параметров одной строкой, из них строится search
+    keywords = models.TextField(verbose_name="Ключевые слова", blank=True)
+    search = SearchVectorField(verbose_name="Поисковый вектор", null=True)
+
+    class Meta:
+        verbose_name = "Документ поиска товара"
+        verbose_name_plural = "Документы поиска товаров"
+        indexes = [
+            # Выдача магазина и категории постранично по product_info_id
+            # читается по индексу диапазоном, без сортировки
+            models.Index(
+                fields=["shop_id", "product_info"], name="product_document_shop_page"
+            ),
+            models.Index(
+                fields=["category_id", "product_info"],
+                name="product_document_category_page",
+            ),
+            # Выдача только товаров в наличии у работающих магазинов
+            models.Index(
+                fields=["product_info"],
+                condition=models.Q(shop_state=True, quantity__gt=0),
+                name="product_document_in_stock",
+            ),
+            GinIndex(fields=["search"], name="product_document_search"),
+            GinIndex(
+                fields=["parameters"],
+                opclasses=["jsonb_path_ops"],
+                name="product_document_parameters",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ProductFacet(models.Model):
+    # Сводка фасетов каталога без условий поиска: сколько товаров работающих
+    # магазинов с этим значением параметра в магазине и категории, отдельно
+    # в наличии и нет. Фасеты всего каталога, магазина или категории
+    # складываются из нескольких сотен строк вместо группировки всех
+    # параметров. Пересобирается по магазинам в backend/documents.py
+    shop_id = models.BigIntegerField(verbose_name="ИД магазина")
+    category_id = models.BigIntegerField(verbose_name="ИД категории")
+    in_stock = models.BooleanField(verbose_name="В наличии")
+    name = models.CharField(max_length=40, verbose_name="Название параметра")
+    value = models.CharField(max_length=100, verbose_name="Значение")
+    products = models.PositiveIntegerField(verbose_name="Количество товаров")
+
+    class Meta:
+        verbose_name = "Фасет каталога"
+        verbose_name_plural = "Фасеты каталога"
+        indexes = [
+            models.Index(fields=["shop_id", "category_id"], name="product_facet_shop"),
+            models.Index(fields=["category_id"], name="product_facet_category"),
+        ]
+
+
+class ProductPriceRange(models.Model):
+    # Диапазон цен товаров работающих магазинов в магазине и категории,
+    # отдельно в наличии и нет, для фасетов каталога без условий поиска
+    shop_id = models.BigIntegerField(verbose_name="ИД магазина")
+    category_id = models.BigIntegerField(verbose_name="ИД категории")
+    in_stock = models.BooleanField(verbose_name="В наличии")
+    min = models.PositiveIntegerField(verbose_name="Минимальная цена")
+    max = models.PositiveIntegerField(verbose_name="Максимальная цена")
+
+    class Meta:
+        verbose_name = "Диапазон цен каталога"
+        verbose_name_plural = "Диапазоны цен каталога"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop_id", "category_id", "in_stock"],
+                name="unique_product_price_range",
+            ),
+        ]
 
 
 class Contact(models.Model):
@@ -275,16 +400,75 @@ class Order(models.Model):
         null=True,
         on_delete=models.CASCADE,
     )
+    # Итоги хранятся в заказе и пересчитываются при изменении позиций,
+    # чтобы списки заказов не считали суммы по соединению таблиц
+    total_sum = models.PositiveBigIntegerField(verbose_name="Сумма", default=0)
+    items_count = models.PositiveIntegerField(
+        verbose_name="Количество товаров", default=0
+    )
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Список заказов"
         ordering = ("-datatime",)
+        indexes = [
+            # Корзина пользователя ищется при каждом запросе к корзине
+            models.Index(
+                fields=["user"],
+                condition=models.Q(state="basket"),
+                name="order_basket",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} {str(self.datatime)}"
 
 
+class ShopOrder(models.Model):
+    # Часть заказа, которую собирает один магазин
+    # Создается при оформлении, у каждого магазина свой статус и свои итоги
+    # Отдельные индексы внешних ключей не нужны: их покрывают составные индексы
+    order = models.ForeignKey(
+        Order,
+        verbose_name="Заказ",
+        related_name="shop_orders",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name="Магазин",
+        related_name="shop_orders",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    state = models.CharField(
+        max_length=15, verbose_name="Статус", choices=STATE_CHOICES, default="new"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    total_sum = models.PositiveBigIntegerField(verbose_name="Сумма", default=0)
+    items_count = models.PositiveIntegerField(
+        verbose_name="Количество товаров", default=0
+    )
+
+    class Meta:
+        verbose_name = "Заказ магазина"
+        verbose_name_plural = "Список заказов магазинов"
+        ordering = ("-created_at",)
+        constraints = [
+            models.UniqueConstraint(fields=["order", "shop"], name="unique_shop_order"),
+        ]
+        indexes = [
+            # Заказы магазина от новых к старым читаются одним проходом по индексу
+            models.Index(
+                fields=["shop", "-created_at"], name="shop_order_shop_created"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.shop} {self.order_id}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order,
@@ -303,15 +487,38 @@ class OrderItem(models.Model):
     shop = models.ForeignKey(
         Shop, verbose_name="магазин", blank=True, null=True, on_delete=models.SET_NULL
     )
+    shop_order = models.ForeignKey(
+        ShopOrder,
+        verbose_name="Заказ магазина",
+        related_name="ordered_items",
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
     product_info = models.ForeignKey(
         ProductInfo,
         verbose_name="Информация о продукте",
         related_name="ordered_items",
         null=True,
         blank=True,
-        on_delete=models.CASCADE,
+        on_delete=models.SET_NULL,
     )
     quantity = models.PositiveIntegerField(verbose_name="Количество")
+    # Снимок товара на момент оформления заказа: история заказов читается
+    # без каталога и не меняется при загрузке нового прайса
+    product_name = models.CharField(
+        max_length=80, verbose_name="Название", blank=True, default=""
+    )
+    model = models.CharField(
+        max_length=80, verbose_name="Модель", blank=True, default=""
+    )
+    shop_name = models.CharField(
+        max_length=50, verbose_name="Название магазина", blank=True, default=""
+    )
+    price = models.PositiveIntegerField(verbose_name="Цена", null=True, blank=True)
+    price_rrc = models.PositiveIntegerField(
+        verbose_name="Розничная цена", null=True, blank=True
+    )
 
     class Meta:
         verbose_name = "Заказанная позиция"
@@ -358,3 +565,109 @@ class ConfirmEmailToken(models.Model):
 
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
+
+
+class ImportJob(models.Model):
+    # Задача на загрузку прайса поставщика, выполняется в фоне
+    user = models.ForeignKey(
+        User,
+        verbose_name="Пользователь",
+        related_name="import_jobs",
+        on_delete=models.CASCADE,
+    )
+    url = models.URLField(verbose_name="Ссылка на прайс")
+    format = models.CharField(
+        max_length=5,
+        verbose_name="Формат прайса",
+        choices=FEED_FORMAT_CHOICES,
+        default="yaml",
+    )
+    state = models.CharField(
+        max_length=15,
+        verbose_name="Статус",
+        choices=IMPORT_STATE_CHOICES,
+        default="queued",
+    )
+    phase = models.CharField(max_length=20, verbose_name="Этап", blank=True)
+    processed = models.PositiveIntegerField(
+        verbose_name="Обработано товаров", default=0
+    )
+    errors = models.JSONField(verbose_name="Ошибки", default=list, blank=True)
+    stats = models.JSONField(verbose_name="Статистика", null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлена")
+
+    class Meta:
+        verbose_name = "Загрузка прайса"
+        verbose_name_plural = "Список загрузок прайса"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.url} {self.state}"
+
+    def set_progress(self, phase, processed):
+        # Пишем только поля хода выполнения, не трогая остальные
+        ImportJob.objects.filter(id=self.id).update(
+            state="running", phase=phase, processed=processed, updated_at=now()
+        )
+
+
+class ImportRow(models.Model):
+    # Товар прайса, принятый к загрузке. Прайс сначала целиком складывается
+    # сюда, а в каталог переносится одной транзакцией: ошибка в середине
+    # прайса не оставляет магазин наполовину обновленным
+    import_id = models.UUIDField(verbose_name="Загрузка")
+    external_id = models.PositiveIntegerField(verbose_name="Внешний ИД")
+    # Текст JSON, а не jsonb: jsonb переставляет ключи, а порядок параметров
+    # товара должен остаться как в прайсе
+    item = models.TextField(verbose_name="Товар")
+
+    class Meta:
+        verbose_name = "Товар загружаемого прайса"
+        verbose_name_plural = "Товары загружаемых прайсов"
+        indexes = [
+            models.Index(fields=["import_id", "id"], name="import_row_order"),
+            models.Index(fields=["import_id", "external_id"], name="import_row_item"),
+        ]
+
+
+class OutboxEmail(models.Model):
+    # Письмо в очереди на отправку. Пишется в той же транзакции, что и
+    # изменение, о котором оно сообщает, и отправляется фоновой задачей
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    body = models.TextField(verbose_name="Текст")
+    from_email = models.CharField(
+        max_length=255, verbose_name="Отправитель", blank=True
+    )
+    to = models.JSONField(verbose_name="Получатели", default=list)
+    state = models.CharField(
+        max_length=15,
+        verbose_name="Статус",
+        choices=EMAIL_STATE_CHOICES,
+        default="pending",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name="Попыток отправки", default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        verbose_name="Следующая попытка", default=now
+    )
+    last_error = models.TextField(verbose_name="Последняя ошибка", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(verbose_name="Отправлено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Письмо"
+        verbose_name_plural = "Очередь писем"
+        ordering = ("-created_at",)
+        indexes = [
+            # Воркер выбирает только ожидающие письма, срок которых наступил
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbox_email_pending",
+                condition=models.Q(state="pending"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} {self.state}"
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils.timezone import now
+
+from backend.models import OutboxEmail
+
+# Очередь писем. Письмо пишется в таблицу в транзакции запроса: если запрос
+# откатился, письма нет, если зафиксирован - письмо будет отправлено, даже
+# когда SMTP сервер недоступен. Запрос не ждет SMTP
+
+
+def enqueue_email(subject, body, to):
+    return OutboxEmail.objects.create(
+        subject=subject, body=body, from_email=settings.EMAIL_HOST_USER, to=to
+    )
+
+
+def retry_delay(attempts):
+    # 1, 2, 4, 8... интервала OUTBOX_RETRY_DELAY
+    return timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_batch(emails):
+    # Одно SMTP соединение на всю пачку; письма отправляются по одному через
+    # send_messages, чтобы ошибка одного письма не мешала остальным
+    connection = get_connection()
+    try:
+        connection.open()
+    except (OSError, SMTPException) as error:
+        return {email.id: str(error) for email in emails}
+    errors = {}
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                email.subject,
+                email.body,
+                email.from_email,
+                email.to,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except (OSError, SMTPException) as error:
+                errors[email.id] = str(error)
+    finally:
+        try:
+            connection.close()
+        except (OSError, SMTPException):
+            pass
+    return errors
+
+
+def claim_batch(batch_size, due):
+    # Захватить пачку писем, срок которых наступил до due: срок следующей
+    # попытки сдвигается на OUTBOX_LEASE секунд, и другие воркеры пачку не
+    # выбирают. Транзакция короткая и фиксируется до отправки. Если воркер
+    # упал, не записав результат, письма вернутся в очередь по истечении срока
+    lease = now() + timedelta(seconds=settings.OUTBOX_LEASE)
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(state="pending", next_attempt_at__lte=due)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            next_attempt_at=lease
+        )
+    return emails, lease
+
+
+def record_results(emails, errors, lease, stats):
+    # Записать результат отправки. Письма, срок захвата которых истек и
+    # которые уже захватил другой воркер, не трогаем
+    sent_at = now()
+    with transaction.atomic():
+        claimed = set(
+            OutboxEmail.objects.select_for_update()
+            .filter(
+                id__in=[email.id for email in emails],
+                state="pending",
+                next_attempt_at=lease,
+            )
+            .values_list("id", flat=True)
+        )
+        emails = [email for email in emails if email.id in claimed]
+        for email in emails:
+            email.attempts += 1
+            if email.id not in errors:
+                email.state = "sent"
+                email.sent_at = sent_at
+                email.last_error = ""
+                stats["sent"] += 1
+                continue
+            email.last_error = errors[email.id]
+            if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                email.state = "failed"
+                stats["failed"] += 1
+            else:
+                email.next_attempt_at = sent_at + retry_delay(email.attempts)
+                stats["retried"] += 1
+        OutboxEmail.objects.bulk_update(
+            emails,
+            ["state", "attempts", "next_attempt_at", "last_error", "sent_at"],
+        )
+
+
+def deliver_outbox(batch_size=None):
+    # Отправляет все письма, срок которых наступил, пачками по batch_size.
+    # Пачка захватывается в одной транзакции, отправляется вне транзакции,
+    # результат пишется в другой: соединение с базой и блокировки строк не
+    # держатся, пока идет SMTP
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    started = now()
+    while True:
+        emails, lease = claim_batch(batch_size, started)
+        if not emails:
+            return stats
+        record_results(emails, send_batch(emails), lease, stats)
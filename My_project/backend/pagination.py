@@ -0,0 +1,83 @@
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+    _reverse_ordering,
+)
+
+
+class ProductCursorPagination(CursorPagination):
+    # Курсор по первичному ключу: следующая страница ищется через WHERE id > ...,
+    # а не через OFFSET, который заставляет БД перебрать все предыдущие строки
+    ordering = "product_info_id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Как CursorPagination.paginate_queryset, но страница выбирается
+        # асинхронно. Ссылки и позиции считаются методами CursorPagination
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            order = self.ordering[0]
+            lookup = "lt" if self.cursor.reverse != order.startswith("-") else "gt"
+            queryset = queryset.filter(
+                **{f"{order.lstrip('-')}__{lookup}": current_position}
+            )
+        # Лишняя строка показывает, есть ли следующая страница
+        results = [
+            item async for item in queryset[offset : offset + self.page_size + 1]
+        ]
+        self.page = results[: self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        has_position = current_position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = has_position, current_position
+            self.has_previous = following_position is not None
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.next_position = following_position
+            self.has_previous, self.previous_position = has_position, current_position
+        return self.page
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    # PageNumberPagination для асинхронных представлений: количество строк и
+    # страница выбираются асинхронно, ответ и ошибки те же
+    async def apaginate_queryset(self, queryset, request, view=None):
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        items = [item async for item in queryset[bottom:top]]
+        self.page = paginator._get_page(items, number, paginator)
+        self.request = request
+        return items
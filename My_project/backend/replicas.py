@@ -0,0 +1,79 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+
+# Чтение с реплик. Каталог, история заказов и корзина на GET читаются с
+# реплики (DATABASE_REPLICAS), запись всегда идет в основную базу.
+# Реплика отстает от основной базы, поэтому после изменения данных
+# пользователем его чтение REPLICA_PIN_TIMEOUT секунд идет в основную базу:
+# отметка о записи хранится в общем кеше и видна всем процессам.
+# Так же после изменения каталога его списки читаются из основной базы,
+# иначе в кеш ответов под новой версией попадут данные реплики до изменения.
+# Заказ меняет только остатки своих магазинов и закрепляет за основной базой
+# только выдачу этих магазинов
+
+# Читать ли с реплики в текущем запросе, выставляет ReplicaReadMixin
+use_replica = ContextVar("use_replica", default=False)
+
+USER_WRITES = "replica:writes:user:{}"
+CATALOG_WRITES = "replica:writes:catalog"
+SHOP_WRITES = "replica:writes:shop:{}"
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def remember_write(key):
+    if settings.DATABASE_REPLICAS:
+        cache.set(key, True, settings.REPLICA_PIN_TIMEOUT)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе
+        return True
+
+
+class ReplicaReadMixin:
+    # GET и HEAD представления читают с реплики, если нет свежих записей
+    # по ключам get_write_keys. Проверка после аутентификации: запросы
+    # токена и сессии идут в основную базу
+    write_keys = []
+
+    def get_write_keys(self, request):
+        keys = list(self.write_keys)
+        if request.user.is_authenticated:
+            keys.append(USER_WRITES.format(request.user.id))
+        return keys
+
+    def dispatch(self, request, *args, **kwargs):
+        token = use_replica.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            use_replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            use_replica.set(not cache.get_many(self.get_write_keys(request)))
+
+
+class ReplicaWritesMiddleware(MiddlewareMixin):
+    # Отмечает изменения данных пользователем: POST, PUT, DELETE и PATCH.
+    # Пользователя токена DRF записывает в request при аутентификации
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                remember_write(USER_WRITES.format(user.id))
+        return response
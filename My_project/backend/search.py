@@ -0,0 +1,177 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Case, Count, F, FloatField, Max, Min, Sum, When
+from django.db.models.functions import Cast
+
+from backend.documents import SEARCH_CONFIG
+from backend.models import (
+    ProductFacet,
+    ProductParameter,
+    ProductPriceRange,
+)
+
+# Условие на параметр: "Цвет=черный", "Встроенная память (Гб)>=256"
+PARAMETER_FILTER = re.compile(
+    r"^(?P<name>.+?)(?P<operator>>=|<=|!=|=|>|<)(?P<value>.*)$"
+)
+
+NUMBER = r"^-?[0-9]+(\.[0-9]+)?$"
+
+NUMBER_LOOKUPS = {">=": "gte", "<=": "lte", ">": "gt", "<": "lt"}
+
+
+def parse_number(value, name):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name}: ожидается число, получено {value!r}")
+
+
+class ProductSearch:
+    # Поиск товаров по названию, модели и значениям параметров
+    # с фильтрами по параметрам и цене и подсчетом фасетов.
+    # Работает с выборкой ProductDocument
+    def __init__(self, query_params):
+        self.text = query_params.get("q", "").strip()
+        self.parameters = []
+        for condition in query_params.getlist("param"):
+            match = PARAMETER_FILTER.match(condition)
+            if match is None:
+                raise ValueError(f"Неверное условие на параметр: {condition}")
+            name, operator, value = match.group("name", "operator", "value")
+            if operator in NUMBER_LOOKUPS:
+                value = parse_number(value, name)
+            self.parameters.append((name.strip(), operator, value))
+        self.in_stock = query_params.get("in_stock", "").lower() in ("1", "true")
+        # Пустой параметр - граница не задана, 0 - граница
+        self.price_min = query_params.get("price_min") or None
+        self.price_max = query_params.get("price_max") or None
+        if self.price_min is not None:
+            self.price_min = parse_number(self.price_min, "price_min")
+        if self.price_max is not None:
+            self.price_max = parse_number(self.price_max, "price_max")
+
+    def filter(self, queryset):
+        if self.text:
+            queryset = queryset.filter(
+                search=SearchQuery(
+                    self.text, config=SEARCH_CONFIG, search_type="websearch"
+                )
+            )
+        for name, operator, value in self.parameters:
+            queryset = self.parameter_filter(queryset, name, operator, value)
+        if self.in_stock:
+            queryset = queryset.filter(quantity__gt=0)
+        if self.price_min is not None:
+            queryset = queryset.filter(price__gte=self.price_min)
+        if self.price_max is not None:
+            queryset = queryset.filter(price__lte=self.price_max)
+        return queryset
+
+    @staticmethod
+    def parameter_filter(queryset, name, operator, value):
+        # Равенство проверяется по JSONB документа через GIN индекс
+        if operator == "=":
+            return queryset.filter(
+                parameters__contains=[{"parameter": name, "value": value}]
+            )
+        if operator == "!=":
+            return queryset.filter(parameters__contains=[{"parameter": name}]).exclude(
+                parameters__contains=[{"parameter": name, "value": value}]
+            )
+        # Значения параметров хранятся строками, сравниваем только числовые
+        parameters = (
+            ProductParameter.objects.filter(parameter__name=name)
+            .annotate(
+                number=Case(
+                    When(value__regex=NUMBER, then=Cast("value", FloatField())),
+                    output_field=FloatField(),
+                )
+            )
+            .filter(**{f"number__{NUMBER_LOOKUPS[operator]}": value})
+        )
+        return queryset.filter(product_info_id__in=parameters.values("product_info_id"))
+
+    def narrowed(self):
+        # Есть ли условия поиска, кроме магазина, категории и наличия
+        return bool(
+            self.text
+            or self.parameters
+            or self.price_min is not None
+            or self.price_max is not None
+        )
+
+    def facets(self, queryset, scope):
+        # Количество товаров по значениям параметров и диапазон цен.
+        # Без условий поиска - точные, из сводки по магазину, категории
+        # и наличию (scope - фильтры shop_id и category_id). С условиями -
+        # по SEARCH_FACET_SAMPLE найденным товарам, exact=False, если
+        # нашлось больше: полный подсчет по сотням тысяч товаров стоит секунды
+        if not self.narrowed():
+            facets, prices = self.summary(scope)
+            price = prices.aggregate(min=Min("min"), max=Max("max"))
+            return self.build_facets(facets, price, True)
+        sample = list(self.sample(queryset))
+        rows = self.facet_rows([product_info_id for product_info_id, _ in sample])
+        return self.sample_facets(sample, rows)
+
+    async def afacets(self, queryset, scope):
+        if not self.narrowed():
+            facets, prices = self.summary(scope)
+            price = await prices.aaggregate(min=Min("min"), max=Max("max"))
+            return self.build_facets([row async for row in facets], price, True)
+        sample = [row async for row in self.sample(queryset)]
+        rows = self.facet_rows([product_info_id for product_info_id, _ in sample])
+        return self.sample_facets(sample, [row async for row in rows])
+
+    def summary(self, scope):
+        facets = ProductFacet.objects.filter(**scope)
+        prices = ProductPriceRange.objects.filter(**scope)
+        if self.in_stock:
+            facets = facets.filter(in_stock=True)
+            prices = prices.filter(in_stock=True)
+        facets = (
+            facets.values("name", "value")
+            .annotate(count=Sum("products"))
+            .order_by("-count", "name", "value")[: settings.SEARCH_FACET_LIMIT]
+        )
+        return facets, prices
+
+    @staticmethod
+    def sample(queryset):
+        # Любые найденные товары, без сортировки: с ней Postgres идет по
+        # первичному ключу и проверяет условие на каждой строке подряд.
+        # Выборка читается один раз: повторный поиск по индексу для частого
+        # слова стоит столько же, сколько первый
+        return queryset.order_by().values_list("product_info_id", "price")[
+            : settings.SEARCH_FACET_SAMPLE
+        ]
+
+    @staticmethod
+    def sample_facets(sample, rows):
+        prices = [price for _, price in sample]
+        return ProductSearch.build_facets(
+            rows,
+            {"min": min(prices, default=None), "max": max(prices, default=None)},
+            len(sample) < settings.SEARCH_FACET_SAMPLE,
+        )
+
+    @staticmethod
+    def facet_rows(product_info_ids):
+        return (
+            ProductParameter.objects.filter(product_info_id__in=product_info_ids)
+            .values("value", name=F("parameter__name"))
+            .annotate(count=Count("id"))
+            .order_by("-count", "name", "value")[: settings.SEARCH_FACET_LIMIT]
+        )
+
+    @staticmethod
+    def build_facets(rows, price, exact):
+        parameters = {}
+        for row in rows:
+            parameters.setdefault(row["name"], []).append(
+                {"value": row["value"], "count": row["count"]}
+            )
+        return {"parameters": parameters, "price": price, "exact": exact}
@@ -9,6 +9,9 @@ from backend.models import (
     OrderItem,
     Order,
     Contact,
+    ImportJob,
+    ProductDocument,
+    ShopOrder,
 )
 
 
@@ -109,6 +112,31 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
+class ProductDocumentSerializer(serializers.ModelSerializer):
+    # Отдает то же, что ProductInfoSerializer, но из одной строки ProductDocument
+    id = serializers.IntegerField(source="product_info_id", read_only=True)
+    product = serializers.SerializerMethodField()
+    shop = serializers.IntegerField(source="shop_id", read_only=True)
+    product_parameters = serializers.JSONField(source="parameters", read_only=True)
+
+    class Meta:
+        model = ProductDocument
+        fields = (
+            "id",
+            "model",
+            "product",
+            "shop",
+            "quantity",
+            "price",
+            "price_rrc",
+            "product_parameters",
+        )
+        read_only_fields = fields
+
+    def get_product(self, document):
+        return {"name": document.name, "category": document.category_name}
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -122,13 +150,24 @@ class OrderItemSerializer(serializers.ModelSerializer):
         extra_kwargs = {"order": {"write_only": True}}
 
 
+class BasketItemSerializer(serializers.Serializer):
+    # Позиция корзины из запроса: только проверка формата, без запросов к базе
+    product_info = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BasketQuantitySerializer(serializers.Serializer):
+    # Новое количество для позиции корзины из запроса
+    id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
 
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
-    total_sum = serializers.IntegerField()
     contact = ContactSerializer(read_only=True)
 
     class Meta:
@@ -139,6 +178,82 @@ class OrderSerializer(serializers.ModelSerializer):
             "state",
             "datatime",
             "total_sum",
+            "items_count",
             "contact",
         )
-        read_only_fields = ("id",)
+        read_only_fields = ("id", "total_sum", "items_count")
+
+
+class OrderItemSnapshotSerializer(serializers.ModelSerializer):
+    # Позиция оформленного заказа по снимку, без обращения к каталогу
+    class Meta:
+        model = OrderItem
+        fields = (
+            "id",
+            "product_info",
+            "product_name",
+            "model",
+            "shop",
+            "shop_name",
+            "quantity",
+            "price",
+            "price_rrc",
+        )
+        read_only_fields = fields
+
+
+class PlacedOrderSerializer(serializers.ModelSerializer):
+    # Оформленный заказ: позиции берутся из снимка на момент оформления
+    ordered_items = OrderItemSnapshotSerializer(read_only=True, many=True)
+    contact = ContactSerializer(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = (
+            "id",
+            "ordered_items",
+            "state",
+            "datatime",
+            "total_sum",
+            "items_count",
+            "contact",
+        )
+        read_only_fields = fields
+
+
+class ShopOrderSerializer(serializers.ModelSerializer):
+    # Заказ магазина: только позиции этого магазина
+    ordered_items = OrderItemSnapshotSerializer(read_only=True, many=True)
+    contact = ContactSerializer(source="order.contact", read_only=True)
+
+    class Meta:
+        model = ShopOrder
+        fields = (
+            "id",
+            "order",
+            "ordered_items",
+            "state",
+            "created_at",
+            "total_sum",
+            "items_count",
+            "contact",
+        )
+        read_only_fields = fields
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = (
+            "id",
+            "url",
+            "format",
+            "state",
+            "phase",
+            "processed",
+            "errors",
+            "stats",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = fields
@@ -1,14 +1,38 @@
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
-from backend.models import ConfirmEmailToken, User
+from rest_framework.authtoken.models import Token
+from backend.authentication import invalidate_tokens, invalidate_user
+from backend.basket import recalculate_baskets
+from backend.caching import bump_catalog
+from backend.documents import refresh_documents
+from backend.outbox import enqueue_email
+from backend.tasks import send_outbox
+from backend.models import (
+    ConfirmEmailToken,
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Parameter,
+    ProductParameter,
+)
 
 new_user_registered = Signal("user_id")
 
 new_order = Signal("user_id")
 
 
+def send_email(subject, body, to):
+    # Письмо ставится в очередь в текущей транзакции и отправляется в фоне
+    # после ее фиксации, запрос не ждет SMTP сервер. Если брокер недоступен,
+    # запрос не падает: письмо отправит периодический запуск send_outbox
+    enqueue_email(subject, body, to)
+    transaction.on_commit(send_outbox.delay, robust=True)
+
+
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, **kwargs):
     # Отправляем письмо с токеном для сброса пароля
@@ -19,17 +43,14 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
     # Параметр kwargs:
     # Вернуть:
     # Отправить электронное письмо пользователю
-    msg = EmailMultiAlternatives(
+    send_email(
         # title:
         f"Токен сброса пароля для {reset_password_token.user}",
         # message:
         reset_password_token.key,
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [reset_password_token.user.email],
     )
-    msg.send()
 
 
 @receiver(new_user_registered)
@@ -37,17 +58,14 @@ def new_user_registered_signal(user_id, **kwargs):
     # Отправляем письмо с подтверждением почты
     # отправить электронное письмо пользователю
     token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user_id)
-    msg = EmailMultiAlternatives(
+    send_email(
         # title:
         f"Токен сброса пароля для {token.user.email}",
         # message:
         token.key,
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [token.user.email],
     )
-    msg.send()
 
 
 @receiver(new_order)
@@ -55,14 +73,62 @@ def new_order_signal(user_id, **kwargs):
     # Отправляем письмо при изменении статуса заказа
     # отправить электронное письмо пользователю
     user = User.objects.get(id=user_id)
-    msg = EmailMultiAlternatives(
+    send_email(
         # title:
         f"Обновление статуса заказа",
         # message:
         f"Заказ сформирован",
-        # from:
-        settings.EMAIL_HOST_USER,
         # to:
         [user.email],
     )
-    msg.send()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Пользователь мог стать неактивным или сменить пароль:
+    # закешированные токены больше не действуют
+    if not created:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.pk])
+
+
+# Какие ProductInfo затрагивает сохранение объекта каждой модели каталога
+DOCUMENT_LOOKUPS = {
+    ProductInfo: "id",
+    Product: "product_id",
+    Category: "product__category_id",
+    Shop: "shop_id",
+    Parameter: "product_parameters__parameter_id",
+    ProductParameter: "product_parameters__id",
+}
+
+
+@receiver(post_save, sender=ProductInfo)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Parameter)
+@receiver(post_save, sender=ProductParameter)
+def catalog_saved(sender, instance, created, **kwargs):
+    # Пересобираем документы поиска после сохранения через админку или save()
+    # и сбрасываем кеш ответов каталога
+    # Массовые bulk_create/update сигналов не шлют, их обновляет сам импорт
+    product_infos = ProductInfo.objects.filter(
+        **{DOCUMENT_LOOKUPS[sender]: instance.pk}
+    )
+    if sender in (Product, Category, Parameter) and not created:
+        # Названия товаров, категорий и параметров видны во всех магазинах
+        bump_catalog()
+    else:
+        bump_catalog(set(product_infos.values_list("shop_id", flat=True)))
+    if created and sender not in (ProductInfo, ProductParameter):
+        # У только что созданного объекта еще нет товаров
+        return
+    refresh_documents(product_infos)
+    if sender is ProductInfo and not created:
+        # Цена могла измениться, итоги корзин с этим товаром пересчитываем
+        recalculate_baskets([instance.pk])
@@ -0,0 +1,131 @@
+from email import message_from_bytes
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+
+# Локальные заменители внешних сервисов для нагрузочных прогонов и тестов:
+# сайт поставщика, с которого partner/update скачивает прайс, и SMTP сервер,
+# на который уходят письма. Оба слушают 127.0.0.1 на свободном порту
+
+
+class LocalServer:
+    # Запуск сервера в фоновом потоке, можно использовать как контекстный менеджер
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.feeds.get(self.path.split("?")[0])
+        if callable(body):
+            body = body()
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FeedServer(LocalServer):
+    # Отдает прайсы по пути: feeds - словарь путь -> байты или функция,
+    # которая строит байты при запросе
+    def __init__(self, feeds=None):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        self.server.daemon_threads = True
+        self.server.feeds = self.feeds = feeds if feeds is not None else {}
+
+    def url(self, path):
+        host, port = self.address
+        return f"http://{host}:{port}{path}"
+
+
+class SMTPHandler(StreamRequestHandler):
+    # Минимальный SMTP: принимает любые письма и складывает их в сервер
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.sink.connected()
+        self.reply("220 localhost SMTP sink")
+        sender, recipients = None, []
+        while line := self.rfile.readline():
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip()
+                if recipient.strip("<>") in self.server.sink.reject:
+                    self.reply("550 Mailbox unavailable")
+                    continue
+                recipients.append(recipient)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.sink.receive(sender, recipients, self.read_data())
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # RSET, NOOP и все остальное
+                self.reply("250 OK")
+
+    def read_data(self):
+        lines = []
+        while (line := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+            # Точка в начале строки удваивается отправителем
+            line = line[1:] if line.startswith(b"..") else line
+            lines.append(line.rstrip(b"\r\n") + b"\n")
+        return b"".join(lines)
+
+
+class SMTPSink(LocalServer):
+    # Письма не уходят дальше, а копятся в messages
+    # EMAIL_HOST и EMAIL_PORT указываются из address, без SSL
+    # connections - сколько было SMTP соединений, адреса из reject отклоняются
+    def __init__(self, reject=()):
+        self.server = ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.lock = Lock()
+        self.messages = []
+        self.connections = 0
+        self.reject = set(reject)
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+
+    def receive(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=default_policy)
+        with self.lock:
+            self.messages.append({"from": sender, "to": recipients, "message": message})
@@ -0,0 +1,50 @@
+from celery import shared_task
+from django.utils.timezone import now
+
+from backend.feeds import open_price_list, read_price_list
+from backend.importer import PriceListImporter
+from backend.models import ImportJob
+from backend.outbox import deliver_outbox
+
+
+@shared_task
+def import_price_list(job_id):
+    # Фоновая загрузка прайса по задаче ImportJob
+    job = ImportJob.objects.get(id=job_id)
+    job.set_progress("download", 0)
+    try:
+        # Прайс читается потоком: товары разбираются и пишутся пачками
+        with open_price_list(job.url) as stream:
+            data = read_price_list(stream, job.format)
+            importer = PriceListImporter(job.user_id, progress=job.set_progress)
+            stats = importer.run(data)
+    except Exception as error:
+        ImportJob.objects.filter(id=job.id).update(
+            state="failed", errors=[*job.errors, str(error)], updated_at=now()
+        )
+        raise
+    ImportJob.objects.filter(id=job.id).update(
+        state="done", phase="done", stats=stats, updated_at=now()
+    )
+    return stats
+
+
+def enqueue_import(job_id):
+    # Поставить загрузку в очередь после фиксации задачи. Если брокер
+    # недоступен, задача помечается ошибочной, а не висит в очереди
+    try:
+        import_price_list.delay(job_id)
+    except Exception as error:
+        ImportJob.objects.filter(id=job_id).update(
+            state="failed",
+            errors=[f"Не удалось поставить загрузку в очередь: {error}"],
+            updated_at=now(),
+        )
+        raise
+
+
+@shared_task
+def send_outbox():
+    # Отправка очереди писем: запускается после фиксации транзакции,
+    # в которой письмо поставлено в очередь, и периодически для повторов
+    return deliver_outbox()
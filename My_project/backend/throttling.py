@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from functools import cache
+from math import ceil
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:
+    redis = None
+
+# Ограничение частоты запросов корзиной токенов: у каждого ключа (область
+# и пользователь или IP) есть корзина на capacity запросов, которая
+# пополняется со скоростью capacity за период. Проверка - одно обращение к
+# хранилищу, сколько бы запросов ни было сделано за период
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    # "100/min" -> (100, 100 / 60): емкость корзины и пополнение в секунду
+    number, period = rate.split("/")
+    capacity = int(number)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    # Корзины в памяти процесса: для разработки, тестов и одного процесса
+    # Хранит не больше size ключей, давно не использованные вытесняются
+    def __init__(self, size=100_000):
+        self.size = size
+        self.lock = Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, key, capacity, refill):
+        # Взять жетон: (разрешено, секунд до следующего жетона)
+        with self.lock:
+            now = monotonic()
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.size:
+                self.buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / refill
+
+    async def atake(self, key, capacity, refill):
+        # Блокировка держится микросекунды, ждать в отдельном потоке незачем
+        return self.take(key, capacity, refill)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+# Корзина в хеше Redis: t - жетоны, u - время обновления по часам Redis,
+# чтобы часы разных серверов приложения не влияли на счет. Ключ живет,
+# пока корзина не наполнится снова
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    # Общие для всех процессов корзины, проверка и списание атомарны
+    def __init__(self, url):
+        if redis is None:
+            raise ImproperlyConfigured("Для THROTTLE_STORE_URL нужен пакет redis")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+        # Для асинхронных представлений: тот же скрипт без блокировки потока
+        self.async_client = redis.asyncio.Redis.from_url(url)
+        self.async_script = self.async_client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, refill):
+        return self.result(self.script(keys=[key], args=[capacity, refill]), refill)
+
+    async def atake(self, key, capacity, refill):
+        return self.result(
+            await self.async_script(keys=[key], args=[capacity, refill]), refill
+        )
+
+    @staticmethod
+    def result(reply, refill):
+        allowed, tokens = reply
+        if allowed:
+            return True, 0
+        return False, (1 - float(tokens)) / refill
+
+    def clear(self):
+        for key in self.client.scan_iter("throttle:*"):
+            self.client.delete(key)
+
+
+@cache
+def bucket_store():
+    # THROTTLE_STORE_URL=redis://... - общее хранилище, без него - память процесса
+    if settings.THROTTLE_STORE_URL:
+        return RedisBucketStore(settings.THROTTLE_STORE_URL)
+    return LocalBucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Область берется из throttle_scope представления, без нее - user для
+    # вошедших пользователей и anon для остальных. Пользователи считаются по
+    # id, анонимы по IP. Частоты областей задаются в THROTTLE_RATES
+    def get_scope(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope:
+            return scope
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+    def get_bucket(self, request, view):
+        # (ключ, емкость, пополнение) или None, если область не ограничена
+        scope = self.get_scope(request, view)
+        rate = settings.THROTTLE_RATES.get(scope)
+        if rate is None:
+            return None
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+        return (f"throttle:{scope}:{ident}", *parse_rate(rate))
+
+    def allow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+        allowed, self.delay = self.get_store().take(*bucket)
+        return allowed
+
+    async def aallow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+        allowed, self.delay = await self.get_store().atake(*bucket)
+        return allowed
+
+    def get_store(self):
+        return bucket_store()
+
+    def wait(self):
+        return ceil(self.delay)
@@ -6,6 +6,7 @@ from django_rest_passwordreset.views import (
 
 from backend.views import (
     PartnerUpdate,
+    PartnerUpdateStatus,
     PartnerState,
     PartnerOrders,
     RegisterAccount,
@@ -18,6 +19,8 @@ from backend.views import (
     ProductInfoView,
     BasketView,
     OrderView,
+    DatabasePoolView,
+    TokenCacheView,
 )
 
 app_name = "backend"
@@ -27,6 +30,11 @@ urlpatterns = [
         PartnerUpdate.as_view(),
         name="Обновленная информация о партнерах",
     ),
+    path(
+        "partner/update/<int:job_id>",
+        PartnerUpdateStatus.as_view(),
+        name="Статус загрузки прайса",
+    ),
     path("partner/state", PartnerState.as_view(), name="partner-state"),
     path("partner/orders", PartnerOrders.as_view(), name="Заказы партнеров"),
     path("user/register", RegisterAccount.as_view(), name="Регистрация пользователя"),
@@ -49,4 +57,6 @@ urlpatterns = [
     path("products", ProductInfoView.as_view(), name="Продукты"),
     path("basket", BasketView.as_view(), name="Корзина"),
     path("order", OrderView.as_view(), name="Заказы"),
+    path("system/db-pool", DatabasePoolView.as_view(), name="Пул соединений"),
+    path("system/token-cache", TokenCacheView.as_view(), name="Кеш токенов"),
 ]
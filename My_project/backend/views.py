@@ -6,39 +6,62 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
-from django.db import IntegrityError
-from django.db.models import Q, Sum, F
+from django.db import transaction
+from django.db.models import Q, Subquery
 from django.http import JsonResponse
-from requests import get
-from rest_framework.authtoken.models import Token
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from ujson import loads as load_json
-from yaml import load as load_yaml, Loader
 
+from backend.authentication import issue_token, token_cache
+from backend.basket import (
+    BasketError,
+    add_to_basket,
+    update_basket,
+    place_order,
+    remove_from_basket,
+)
+from backend.caching import (
+    BASE_VERSION,
+    CATALOG_VERSION,
+    SHOP_VERSION,
+    CatalogCacheMixin,
+    bump_catalog,
+)
+from backend.db_pool.pool import pool_stats
+from backend.documents import refresh_facets
+from backend.feeds import guess_format
+from backend.flat_serializers import FlatSerializer
 from backend.models import (
+    FEED_FORMAT_CHOICES,
     Shop,
     Category,
-    Product,
-    ProductInfo,
-    Parameter,
-    ProductParameter,
     Order,
-    OrderItem,
     Contact,
     ConfirmEmailToken,
+    ImportJob,
+    ProductDocument,
+    ShopOrder,
 )
+from backend.pagination import ProductCursorPagination
+from backend.replicas import CATALOG_WRITES, SHOP_WRITES, ReplicaReadMixin
+from backend.search import ProductSearch
 from backend.serializers import (
     UserSerializer,
     CategorySerializer,
     ShopSerializer,
-    ProductInfoSerializer,
-    OrderItemSerializer,
+    ProductDocumentSerializer,
+    BasketItemSerializer,
+    BasketQuantitySerializer,
     OrderSerializer,
+    PlacedOrderSerializer,
+    ShopOrderSerializer,
     ContactSerializer,
+    ImportJobSerializer,
 )
-from backend.signals import new_user_registered_signal, new_order_signal
+from backend.signals import new_user_registered, new_order
+from backend.tasks import enqueue_import
 
 
 def login_required(request):
@@ -59,6 +82,56 @@ def only_for_shops(request):
         )
 
 
+def catalog_scope(query_params):
+    # Фильтры каталога по shop_id и category_id
+    return {
+        name: query_params[name]
+        for name in ("shop_id", "category_id")
+        if query_params.get(name)
+    }
+
+
+def product_documents(query_params, search):
+    # Товары каталога по shop_id и category_id с условиями поиска
+    scope = catalog_scope(query_params)
+    queryset = ProductDocument.objects.filter(shop_state=True, **scope).defer(
+        "keywords", "search"
+    )
+    if scope:
+        # Товары магазина и категории лежат в таблице кучно (прайс грузится
+        # целиком), а Postgres считает их разбросанными равномерно и ищет
+        # страницу перебором первичного ключа с начала таблицы. Граница по
+        # первому товару (одно чтение индекса) начинает перебор с него
+        queryset = queryset.filter(
+            product_info_id__gte=Subquery(
+                ProductDocument.objects.filter(**scope)
+                .order_by("product_info_id")
+                .values("product_info_id")[:1]
+            )
+        )
+    return search.filter(queryset)
+
+
+def placed_orders(user_id):
+    # Оформленные заказы пользователя
+    return Order.objects.filter(user_id=user_id).exclude(state="basket")
+
+
+def shop_orders(user_id):
+    # Заказы магазина поставщика
+    return ShopOrder.objects.filter(
+        shop_id=Subquery(Shop.objects.filter(user_id=user_id).values("id"))
+    ).order_by("-created_at")
+
+
+# Корзина и списки заказов собираются из кортежей values_list, а не полями
+# DRF: ответы те же, что у OrderSerializer, PlacedOrderSerializer и
+# ShopOrderSerializer, но без объектов моделей
+basket_serializer = FlatSerializer(OrderSerializer)
+placed_order_serializer = FlatSerializer(PlacedOrderSerializer)
+shop_order_serializer = FlatSerializer(ShopOrderSerializer)
+
+
 class RegisterAccount(APIView):
     # Для регистрации покупателей
     def post(self, request, *args, **kwargs):
@@ -89,14 +162,16 @@ class RegisterAccount(APIView):
                 request.data.update({})
                 user_serializer = UserSerializer(data=request.data)
                 if user_serializer.is_valid():
-                    # Сохраняем пользователя
-                    user = user_serializer.save()
-                    user.set_password(request.data["password"])
-                    user.save()
-                    token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.id)
-                    # new_user_registered_signal.send(
-                    #     sender=self.__class__, user_id=user.id
-                    # )
+                    # Сохраняем пользователя, письмо с токеном ставится в очередь
+                    # в той же транзакции и уходит в фоне
+                    with transaction.atomic():
+                        user = user_serializer.save()
+                        user.set_password(request.data["password"])
+                        user.save()
+                        token, _ = ConfirmEmailToken.objects.get_or_create(
+                            user_id=user.id
+                        )
+                        new_user_registered.send(sender=self.__class__, user_id=user.id)
                     return JsonResponse({"Status": True, "token": token.key})
                 else:
                     return JsonResponse(
@@ -139,13 +214,17 @@ class AccountDetails(APIView):
     # Класс для работы данными пользователя
     # получить данные пользователя
     def get(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
     # Редактирование методом POST
     def post(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         # Проверяем обязательные аргументы
         if "password" in request.data:
             errors = {}
@@ -177,6 +256,8 @@ class AccountDetails(APIView):
 
 class LoginAccount(APIView):
     # Класс для авторизации пользователей
+    throttle_scope = "login"
+
     # Авторизация методом POST
     def post(self, request, *args, **kwargs):
         if {"email", "password"}.issubset(request.data):
@@ -187,7 +268,10 @@ class LoginAccount(APIView):
             )
             if user is not None:
                 if user.is_active:
-                    token, _ = Token.objects.get_or_create(user=user)
+                    # Вход сбрасывает кеш токенов пользователя, устаревший
+                    # токен заменяется новым
+                    with transaction.atomic():
+                        token = issue_token(user)
                     return JsonResponse({"Status": True, "Token": token.key})
             return JsonResponse(
                 {"Status": False, "Errors": "Не удалось авторизовать"},
@@ -199,63 +283,89 @@ class LoginAccount(APIView):
         )
 
 
-class CategoryView(ListAPIView):
+class CategoryView(ReplicaReadMixin, CatalogCacheMixin, ListAPIView):
     # Класс для просмотра категорий
+    throttle_scope = "catalog"
+    write_keys = [CATALOG_WRITES]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
 
-class ShopView(ListAPIView):
+class ShopView(ReplicaReadMixin, CatalogCacheMixin, ListAPIView):
     # Класс для просмотра списка магазинов
+    throttle_scope = "catalog"
+    write_keys = [CATALOG_WRITES]
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
 
-class ProductInfoView(APIView):
+class ProductInfoView(ReplicaReadMixin, CatalogCacheMixin, ListAPIView):
     # Класс для поиска товаров
-    def get(self, request, *args, **kwargs):
-        query = Q(shop__state=True)
+    # Постраничный вывод по курсору: страница берется по индексу id,
+    # поэтому дальние страницы стоят столько же, сколько первая.
+    # Поиск: q - полнотекстовый по названию, модели и значениям параметров,
+    # param - условие на параметр (Цвет=черный, Встроенная память (Гб)>=256),
+    # price_min и price_max - диапазон цен, in_stock=1 - только товары в наличии
+    # Данные берутся из ProductDocument, без соединений таблиц
+    throttle_scope = "catalog"
+    write_keys = [CATALOG_WRITES]
+    serializer_class = ProductDocumentSerializer
+    pagination_class = ProductCursorPagination
+
+    def get_write_keys(self, request):
+        # Выдача магазина после заказа в нем читается из основной базы
+        keys = super().get_write_keys(request)
         shop_id = request.query_params.get("shop_id")
-        category_id = request.query_params.get("category_id")
         if shop_id:
-            query = query & Q(shop_id=shop_id)
-        if category_id:
-            query = query & Q(product__category_id=category_id)
-        queryset = (
-            ProductInfo.objects.filter(query)
-            .select_related("shop", "product__category")
-            .prefetch_related("product_parameters__parameter")
-            .distinct()
-        )
-        serializer = ProductInfoSerializer(queryset, many=True)
-        return Response(serializer.data)
+            keys.append(SHOP_WRITES.format(shop_id))
+        return keys
+
+    def get_catalog_versions(self, request):
+        # Выдача одного магазина не зависит от изменений в других магазинах
+        shop_id = request.query_params.get("shop_id")
+        if shop_id:
+            return [BASE_VERSION, SHOP_VERSION.format(shop_id)]
+        return [CATALOG_VERSION]
+
+    def get_queryset(self):
+        return product_documents(self.request.query_params, self.search)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.search = ProductSearch(request.query_params)
+        except ValueError as error:
+            return JsonResponse(
+                {"Status": False, "Errors": str(error)},
+                json_dumps_params={"ensure_ascii": False},
+                status=400,
+            )
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        # Фасеты считаются по всей выборке, поэтому отдаем их только с первой страницей
+        if not request.query_params.get("cursor"):
+            response.data["facets"] = self.search.facets(
+                queryset, catalog_scope(request.query_params)
+            )
+        return response
 
 
-class BasketView(APIView):
+class BasketView(ReplicaReadMixin, APIView):
     # Класс для работы с корзиной пользователя
     # Получить корзину
     def get(self, request, *args, **kwargs):
-        login_required(request)
-        basket = (
-            Order.objects.filter(user_id=request.user.id, state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .annotate(
-                total_sum=Sum(
-                    F("ordered_items__quantity")
-                    * F("ordered_items__product_info__price")
-                )
-            )
-            .distinct()
-        )
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        response = login_required(request)
+        if response:
+            return response
+        basket = Order.objects.filter(user_id=request.user.id, state="basket")
+        return Response(basket_serializer.serialize(basket))
 
     # Редактировать корзину
     def post(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         items_sting = request.data.get("items")
         if items_sting:
             try:
@@ -265,24 +375,18 @@ class BasketView(APIView):
                     {"Status": False, "Errors": "Неверный формат запроса"}
                 )
             else:
-                basket, _ = Order.objects.get_or_create(
-                    user_id=request.user.id, state="basket"
-                )
-                objects_created = 0
-                for order_item in items_sting:
-                    order_item.update({"order": basket.id})
-                    serializer = OrderItemSerializer(data=order_item)
-                    if serializer.is_valid():
-                        try:
-                            serializer.save()
-                        except IntegrityError as error:
-                            return JsonResponse({"Status": False, "Errors": str(error)})
-                        else:
-                            objects_created += 1
-                    else:
-                        return JsonResponse(
-                            {"Status": False, "Errors": serializer.errors}
-                        )
+                serializer = BasketItemSerializer(data=items_sting, many=True)
+                if not serializer.is_valid():
+                    return JsonResponse({"Status": False, "Errors": serializer.errors})
+                try:
+                    objects_created = add_to_basket(
+                        request.user.id, serializer.validated_data
+                    )
+                except BasketError as error:
+                    return JsonResponse(
+                        {"Status": False, "Errors": str(error)},
+                        json_dumps_params={"ensure_ascii": False},
+                    )
                 return JsonResponse(
                     {"Status": True, "Создано объектов": objects_created},
                     json_dumps_params={"ensure_ascii": False},
@@ -294,7 +398,9 @@ class BasketView(APIView):
 
     # Добавить позицию в корзину
     def put(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         items_sting = request.data.get("items")
         if items_sting:
             try:
@@ -304,18 +410,18 @@ class BasketView(APIView):
                     {"Status": False, "Errors": "Неверный формат запроса"}
                 )
             else:
-                basket, _ = Order.objects.get_or_create(
-                    user_id=request.user.id, state="basket"
-                )
-                objects_updated = 0
-                for order_item in items_sting:
-                    if (
-                        type(order_item["id"]) == int
-                        and type(order_item["quantity"]) == int
-                    ):
-                        objects_updated += OrderItem.objects.filter(
-                            order_id=basket.id, id=order_item["id"]
-                        ).update(quantity=order_item["quantity"])
+                serializer = BasketQuantitySerializer(data=items_sting, many=True)
+                if not serializer.is_valid():
+                    return JsonResponse({"Status": False, "Errors": serializer.errors})
+                try:
+                    objects_updated = update_basket(
+                        request.user.id, serializer.validated_data
+                    )
+                except BasketError as error:
+                    return JsonResponse(
+                        {"Status": False, "Errors": str(error)},
+                        json_dumps_params={"ensure_ascii": False},
+                    )
                 return JsonResponse(
                     {"Status": True, "Обновлено объектов": objects_updated},
                     json_dumps_params={"ensure_ascii": False},
@@ -327,21 +433,18 @@ class BasketView(APIView):
 
     # Удалить товары из корзины
     def delete(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         items_sting = request.data.get("items")
         if items_sting:
-            items_list = items_sting.split(",")
-            basket, _ = Order.objects.get_or_create(
-                user_id=request.user.id, state="basket"
-            )
-            query = Q()
-            objects_deleted = False
-            for order_item_id in items_list:
-                if order_item_id.isdigit():
-                    query = query | Q(order_id=basket.id, id=order_item_id)
-                    objects_deleted = True
-            if objects_deleted:
-                deleted_count = OrderItem.objects.filter(query).delete()[0]
+            ids = [
+                order_item_id
+                for order_item_id in items_sting.split(",")
+                if order_item_id.isdigit()
+            ]
+            if ids:
+                deleted_count = remove_from_basket(request.user.id, ids)
                 return JsonResponse(
                     {"Status": True, "Удалено объектов": deleted_count},
                     json_dumps_params={"ensure_ascii": False},
@@ -354,9 +457,12 @@ class BasketView(APIView):
 
 class PartnerUpdate(APIView):
     # Класс для обновления прайса от поставщика
+    throttle_scope = "partner_update"
+
     def post(self, request, *args, **kwargs):
-        login_required(request)
-        only_for_shops(request)
+        response = login_required(request) or only_for_shops(request)
+        if response:
+            return response
         url = request.data.get("url")
         if url:
             validate_url = URLValidator()
@@ -365,65 +471,75 @@ class PartnerUpdate(APIView):
             except ValidationError as er:
                 return JsonResponse({"Status": False, "Error": str(er)})
             else:
-                stream = get(url).content
-                data = load_yaml(stream, Loader=Loader)
-                shop, _ = Shop.objects.get_or_create(
-                    name=data["shop"], user_id=request.user.id
-                )
-                for category in data["categories"]:
-                    category_object, _ = Category.objects.get_or_create(
-                        id=category["id"], name=category["name"]
-                    )
-                    category_object.shops.add(shop.id)
-                    category_object.save()
-                ProductInfo.objects.filter(shop_id=shop.id).delete()
-                for item in data["goods"]:
-                    product, _ = Product.objects.get_or_create(
-                        name=item["name"], category_id=item["category"]
-                    )
-                    product_info = ProductInfo.objects.create(
-                        product_id=product.id,
-                        external_id=item["id"],
-                        model=item["model"],
-                        price=item["price"],
-                        price_rrc=item["price_rrc"],
-                        quantity=item["quantity"],
-                        shop_id=shop.id,
+                feed_format = request.data.get("format") or guess_format(url)
+                if feed_format not in dict(FEED_FORMAT_CHOICES):
+                    return JsonResponse(
+                        {"Status": False, "Errors": "Неизвестный формат прайса"},
+                        json_dumps_params={"ensure_ascii": False},
                     )
-                    for name, value in item["parameters"].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(
-                            product_info_id=product_info.id,
-                            parameter_id=parameter_object.id,
-                            value=value,
-                        )
-                return JsonResponse({"Status": True})
+                # Загрузка идет в фоне, клиент сразу получает номер задачи
+                job = ImportJob.objects.create(
+                    user_id=request.user.id, url=url, format=feed_format
+                )
+                # Сбой брокера не превращает принятый запрос в ошибку 500:
+                # enqueue_import отметит задачу ошибочной
+                transaction.on_commit(lambda: enqueue_import(job.id), robust=True)
+                return JsonResponse({"Status": True, "Job": job.id})
         return JsonResponse(
             {"Status": False, "Errors": "Не указаны все необходимые аргументы"},
             json_dumps_params={"ensure_ascii": False},
         )
 
 
+class PartnerUpdateStatus(APIView):
+    # Класс для просмотра хода загрузки прайса
+    def get(self, request, job_id, *args, **kwargs):
+        response = login_required(request) or only_for_shops(request)
+        if response:
+            return response
+        job = ImportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if job is None:
+            return JsonResponse(
+                {"Status": False, "Errors": "Задача не найдена"},
+                json_dumps_params={"ensure_ascii": False},
+                status=404,
+            )
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
 class PartnerState(APIView):
     # Класс для работы со статусом поставщика
     # получить текущий статус
     def get(self, request, *args, **kwargs):
-        login_required(request)
-        only_for_shops(request)
+        response = login_required(request) or only_for_shops(request)
+        if response:
+            return response
         shop = request.user.shop
         serializer = ShopSerializer(shop)
         return Response(serializer.data)
 
     # Изменить текущий статус
     def post(self, request, *args, **kwargs):
-        login_required(request)
-        only_for_shops(request)
+        response = login_required(request) or only_for_shops(request)
+        if response:
+            return response
         state = request.data.get("state")
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(
-                    state=strtobool(state)
+                state = strtobool(state)
+                shop_ids = list(
+                    Shop.objects.filter(user_id=request.user.id).values_list(
+                        "id", flat=True
+                    )
                 )
+                with transaction.atomic():
+                    Shop.objects.filter(id__in=shop_ids).update(state=state)
+                    ProductDocument.objects.filter(shop_id__in=shop_ids).update(
+                        shop_state=state
+                    )
+                    refresh_facets(shop_ids)
+                    bump_catalog(shop_ids)
                 return JsonResponse({"Status": True})
             except ValueError as error:
                 return JsonResponse({"Status": False, "Errors": str(error)})
@@ -433,45 +549,33 @@ class PartnerState(APIView):
         )
 
 
-class PartnerOrders(APIView):
+class PartnerOrders(ReplicaReadMixin, APIView):
     # Класс для получения заказов поставщиками
+    # Магазин видит только свои заказы магазина и только свои позиции,
+    # выборка идет по индексу (магазин, дата создания)
     def get(self, request, *args, **kwargs):
-        login_required(request)
-        only_for_shops(request)
-        order = (
-            Order.objects.filter(
-                ordered_items__product_info__shop__user_id=request.user.id
-            )
-            .exclude(state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .select_related("contact")
-            .annotate(
-                total_sum=Sum(
-                    F("ordered_items__quantity")
-                    * F("ordered_items__product_info__price")
-                )
-            )
-            .distinct()
-        )
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        response = login_required(request) or only_for_shops(request)
+        if response:
+            return response
+        return Response(shop_order_serializer.serialize(shop_orders(request.user.id)))
 
 
 class ContactView(APIView):
     # Класс для работы с контактами покупателей
     # получить мои контакты
     def get(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         contact = Contact.objects.filter(user_id=request.user.id)
         serializer = ContactSerializer(contact, many=True)
         return Response(serializer.data)
 
     # Добавить новый контакт
     def post(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         if {"city", "street", "phone"}.issubset(request.data):
             # request.data._mutable = True
             request.data.update({"user": request.user.id})
@@ -487,7 +591,9 @@ class ContactView(APIView):
         )
 
     def delete(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         items_sting = request.data.get("items")
         if items_sting:
             items_list = items_sting.split(",")
@@ -510,7 +616,9 @@ class ContactView(APIView):
 
     # Редактировать контакт
     def put(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         if "id" in request.data:
             if request.data["id"].isdigit():
                 contact = Contact.objects.filter(
@@ -534,52 +642,70 @@ class ContactView(APIView):
         )
 
 
-class OrderView(APIView):
+class OrderView(ReplicaReadMixin, APIView):
     # Класс для получения и размещения заказов пользователями
     # получить мои заказы
     def get(self, request, *args, **kwargs):
-        login_required(request)
-        order = (
-            Order.objects.filter(user_id=request.user.id)
-            .exclude(state="basket")
-            .prefetch_related(
-                "ordered_items__product_info__product__category",
-                "ordered_items__product_info__product_parameters__parameter",
-            )
-            .select_related("contact")
-            .annotate(
-                total_sum=Sum(
-                    F("ordered_items__quantity")
-                    * F("ordered_items__product_info__price")
-                )
-            )
-            .distinct()
-        )
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        response = login_required(request)
+        if response:
+            return response
+        orders = placed_order_serializer.serialize(placed_orders(request.user.id))
+        return Response(orders)
 
     # Разместить заказ из корзины
     def post(self, request, *args, **kwargs):
-        login_required(request)
+        response = login_required(request)
+        if response:
+            return response
         if {"id", "contact"}.issubset(request.data):
-            if request.data["id"].isdigit():
+            if (
+                str(request.data["id"]).isdigit()
+                and str(request.data["contact"]).isdigit()
+            ):
+                # Товары списываются со склада при оформлении,
+                # при нехватке хотя бы одной позиции заказ не оформляется
+                # Письмо о заказе ставится в очередь в той же транзакции
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data["id"]
-                    ).update(contact_id=request.data["contact"], state="new")
-                except IntegrityError as error:
-                    print(error)
+                    with transaction.atomic():
+                        place_order(
+                            request.user.id,
+                            int(request.data["id"]),
+                            int(request.data["contact"]),
+                        )
+                        new_order.send(sender=self.__class__, user_id=request.user.id)
+                except BasketError as error:
                     return JsonResponse(
-                        {"Status": False, "Errors": "Неправильно указаны аргументы"},
+                        {"Status": False, "Errors": str(error)},
                         json_dumps_params={"ensure_ascii": False},
                     )
-                else:
-                    if is_updated:
-                        # new_order_signal.send(
-                        #     sender=self.__class__, user_id=request.user.id
-                        # )
-                        return JsonResponse({"Status": True})
+                return JsonResponse({"Status": True})
         return JsonResponse(
             {"Status": False, "Errors": "Не указаны все необходимые аргументы"},
             json_dumps_params={"ensure_ascii": False},
         )
+
+
+class DatabasePoolView(APIView):
+    # Статистика пулов соединений с базой в этом процессе: занятые и свободные
+    # соединения, ожидание свободного, замены по сроку жизни и проверке
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse(
+                {"Status": False, "Error": "Только для администраторов"},
+                json_dumps_params={"ensure_ascii": False},
+                status=403,
+            )
+        return Response(pool_stats())
+
+
+class TokenCacheView(APIView):
+    # Статистика кеша токенов в этом процессе: размер, попадания и промахи,
+    # вытеснения и сбросы
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse(
+                {"Status": False, "Error": "Только для администраторов"},
+                json_dumps_params={"ensure_ascii": False},
+                status=403,
+            )
+        return Response(token_cache.stats())
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "my_project.settings")
 
-application = get_asgi_application()
+# То же, что get_asgi_application(), но эндпоинты чтения асинхронные
+# (ASGI_URLCONF) и число одновременных запросов ограничено
+# (ASGI_CONCURRENCY_LIMIT)
+django.setup(set_prefix=False)
+
+from backend.asgi import AsyncURLConfHandler, ConcurrencyLimit  # noqa: E402
+
+application = ConcurrencyLimit(AsyncURLConfHandler())
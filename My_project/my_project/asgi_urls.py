@@ -0,0 +1,9 @@
+from django.contrib import admin
+from django.urls import path, include
+
+# Адреса для запуска под ASGI: как my_project.urls, но /api/v1/ с
+# асинхронными представлениями чтения
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path("api/v1/", include("backend.async_urls", namespace="backend")),
+]
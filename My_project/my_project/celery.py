@@ -0,0 +1,16 @@
+"""
+Celery config for my_project project.
+
+Задачи ищутся в модулях tasks.py приложений, настройки берутся
+из settings.py с префиксом CELERY_.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "my_project.settings")
+
+app = Celery("my_project")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
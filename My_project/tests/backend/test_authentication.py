@@ -0,0 +1,188 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from backend.authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    bump_token_versions,
+    remember_token,
+    token_cache,
+    version_key,
+)
+from backend.models import User
+
+login_url = "/api/v1/user/login"
+details_url = "/api/v1/user/details"
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+
+
+def login(password="11ff22FF33cc44CC"):
+    response = APIClient().post(
+        login_url, {"email": "buyer@example.com", "password": password}
+    )
+    return response.json()["Token"]
+
+
+def authenticate(key):
+    return CachedTokenAuthentication().authenticate_credentials(key)
+
+
+@pytest.mark.django_db
+def test_cached_lookup_skips_database(user):
+    key = login()
+    with CaptureQueriesContext(connection) as miss:
+        assert authenticate(key)[0] == user
+    with CaptureQueriesContext(connection) as hit:
+        cached_user, token = authenticate(key)
+    assert (len(miss), len(hit)) == (1, 0)
+    assert (cached_user, token.key) == (user, key)
+    # Каждый запрос получает свою копию пользователя
+    cached_user.first_name = "Иван"
+    assert authenticate(key)[0].first_name == ""
+    assert token_cache.stats() == {
+        "size": 1,
+        "hits": 2,
+        "misses": 1,
+        "hit_rate": 0.6667,
+        "evictions": 0,
+        "invalidations": 0,
+    }
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {key}")
+    assert client.get(details_url).json()["email"] == user.email
+    assert token_cache.stats()["hits"] == 3
+    with pytest.raises(AuthenticationFailed):
+        authenticate("0" * 40)
+
+
+@pytest.mark.django_db
+def test_cache_is_invalidated(user):
+    key = login()
+    authenticate(key)
+    # Смена пароля
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {key}")
+    response = client.post(details_url, {"password": "55gg66HH77jj88KK"})
+    assert response.json()["Status"] is True
+    assert token_cache.stats()["invalidations"] == 1
+    with CaptureQueriesContext(connection) as queries:
+        authenticate(key)
+    assert len(queries) == 1
+    # Повторный вход
+    assert login("55gg66HH77jj88KK") == key
+    assert token_cache.stats()["invalidations"] == 2
+    authenticate(key)
+    # Пользователь отключен
+    user.is_active = False
+    user.save()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(key)
+    # Токен удален
+    user.is_active = True
+    user.save()
+    authenticate(key)
+    Token.objects.filter(key=key).delete()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(key)
+
+
+@pytest.mark.django_db
+def test_token_expiry_and_rotation(user, settings):
+    key = login()
+    settings.AUTH_TOKEN_TTL = 3600
+    authenticate(key)
+    Token.objects.filter(key=key).update(created=now() - timedelta(hours=2))
+    user.save()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(key)
+    # Вход заменяет устаревший токен
+    new_key = login()
+    assert new_key != key
+    assert authenticate(new_key)[0] == user
+    assert login() == new_key
+    # Смена токена при каждом входе, старый токен сразу перестает действовать
+    settings.AUTH_TOKEN_ROTATE_ON_LOGIN = True
+    rotated = login()
+    assert rotated != new_key
+    with pytest.raises(AuthenticationFailed):
+        authenticate(new_key)
+    assert authenticate(rotated)[0] == user
+
+
+def test_token_cache_limits(monkeypatch):
+    cache = TokenCache(size=2, timeout=60)
+    for key in "abc":
+        cache.set(key, Token(key=key, user_id=1), 1)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    # b использовался позже c, поэтому вытесняется c
+    cache.set("d", Token(key="d", user_id=1), 1)
+    assert [key for key in "abcd" if cache.get(key)] == ["b", "d"]
+    assert cache.stats()["evictions"] == 2
+    cache.discard(["b", "x"])
+    assert cache.stats()["invalidations"] == 1
+    # Запись живет не дольше timeout секунд
+    monkeypatch.setattr("backend.authentication.monotonic", lambda: 10**9)
+    assert cache.get("d") is None
+
+
+@pytest.mark.django_db
+def test_token_versions_only_for_known_tokens(user):
+    # Случайные токены не создают ключей в общем кеше, версия настоящего
+    # токена хранится ограниченное время
+    with pytest.raises(AuthenticationFailed):
+        authenticate("0" * 40)
+    assert cache.get(version_key("0" * 40)) is None
+    key = login()
+    cache.delete(version_key(key))
+    authenticate(key)
+    assert cache.get(version_key(key)) is not None
+    # У кеша в памяти процесса срок ключа виден в _expire_info
+    assert cache._expire_info[cache.make_key(version_key(key))] is not None
+    assert token_cache.get(key) is not None
+
+
+@pytest.mark.django_db
+def test_token_invalidated_during_lookup_is_not_cached(user):
+    # Сброс между чтением версии и выборкой из базы создает версию: данные
+    # выборки могли устареть, поэтому не кешируются
+    key = login()
+    token = Token.objects.select_related("user").get(key=key)
+    cache.delete(version_key(key))
+    bump_token_versions([version_key(key)])
+    remember_token(key, token, None)
+    assert token_cache.get(key) is None
+
+
+@pytest.mark.django_db
+def test_token_cache_stats_view(user):
+    key = login()
+    authenticate(key)
+    authenticate(key)
+    client = APIClient()
+    client.force_authenticate(user)
+    assert client.get("/api/v1/system/token-cache").status_code == 403
+    user.is_staff = True
+    user.save()
+    response = client.get("/api/v1/system/token-cache")
+    assert response.status_code == 200
+    assert response.json()["hits"] == 1
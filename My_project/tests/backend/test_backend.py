@@ -251,17 +251,38 @@ def test_get_products(client, user, product_factory):
     response = client.get(dict_url["products"])
     data = response.json()
     assert response.status_code == 200
-    assert len(data) == 3
+    assert len(data["results"]) == 3
+    assert data["next"] is None
+
+
+@pytest.mark.django_db
+def test_get_products_pages(client, user, product_factory):
+    products = product_factory(_quantity=5)
+    client.force_authenticate(user)
+    response = client.get(dict_url["products"], {"page_size": 2})
+    ids = []
+    while True:
+        data = response.json()
+        assert response.status_code == 200
+        assert len(data["results"]) <= 2
+        ids.extend(item["id"] for item in data["results"])
+        if data["next"] is None:
+            break
+        response = client.get(data["next"])
+    assert ids == sorted(product.id for product in products)
 
 
 @pytest.mark.django_db
-def test_partner_update_and_get_and_post_state(client, user):
+def test_partner_update_and_get_and_post_state(
+    client, user, django_capture_on_commit_callbacks
+):
     client.force_authenticate(user)
     data = {
         "partner": user.id,
         "url": "https://raw.githubusercontent.com/netology-code/pd-diplom/master/data/shop1.yaml",
     }
-    response = client.post(dict_url["update"], data=data, format="json")
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(dict_url["update"], data=data, format="json")
     response_get = client.get(dict_url["state"])
     data = {
         "id": 1,
@@ -0,0 +1,178 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from backend.basket import add_to_basket, place_order
+from backend.importer import PriceListImporter
+from backend.models import User, Category, Contact, Order, Shop, ProductInfo
+
+products_url = reverse("backend:Продукты")
+shops_url = reverse("backend:Магазины")
+categories_url = reverse("backend:Категории")
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def other_partner():
+    return User.objects.create_user(
+        email="other@example.com", password="11ff22FF33cc44CC", type="shop"
+    )
+
+
+@pytest.fixture
+def catalog(partner, other_partner, price_list, django_capture_on_commit_callbacks):
+    # Два магазина с одинаковым прайсом
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter(partner.id).run(price_list)
+        price_list["shop"] = "Евросеть"
+        PriceListImporter(other_partner.id).run(price_list)
+    return Shop.objects.get(user=partner), Shop.objects.get(user=other_partner)
+
+
+@pytest.mark.django_db
+def test_catalog_cached(client, catalog, django_assert_num_queries):
+    for url in (products_url, shops_url, categories_url):
+        response = client.get(url)
+        assert response.status_code == 200
+        # Повторный запрос отдается из кеша без обращений к базе
+        with django_assert_num_queries(0):
+            cached = client.get(url)
+        assert cached.status_code == 200
+        assert cached.content == response.content
+        assert cached["ETag"] == response["ETag"]
+
+
+@pytest.mark.django_db
+def test_catalog_etag(client, catalog, django_assert_num_queries):
+    response = client.get(products_url, {"page_size": 2})
+    with django_assert_num_queries(0):
+        not_modified = client.get(
+            products_url, {"page_size": 2}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+    assert not_modified.status_code == 304
+    assert not_modified["ETag"] == response["ETag"]
+    # Другие параметры запроса - другой ответ
+    other = client.get(products_url, {"page_size": 3})
+    assert other["ETag"] != response["ETag"]
+    assert (
+        client.get(
+            products_url, {"page_size": 3}, HTTP_IF_NONE_MATCH=response["ETag"]
+        ).status_code
+        == 200
+    )
+
+
+@pytest.mark.django_db
+def test_partner_state_invalidates_own_shop(
+    client, catalog, partner, django_capture_on_commit_callbacks
+):
+    shop, other_shop = catalog
+    assert len(client.get(products_url).json()["results"]) == 8
+    assert len(client.get(products_url, {"shop_id": shop.id}).json()["results"]) == 4
+    other = client.get(products_url, {"shop_id": other_shop.id})
+    client.force_authenticate(partner)
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(reverse("backend:partner-state"), {"state": "False"})
+    client.force_authenticate(None)
+    assert len(client.get(products_url).json()["results"]) == 4
+    assert client.get(products_url, {"shop_id": shop.id}).json()["results"] == []
+    assert [item["name"] for item in client.get(shops_url).json()["results"]] == [
+        "Евросеть"
+    ]
+    # Выдача другого магазина осталась в кеше
+    cached = client.get(
+        products_url, {"shop_id": other_shop.id}, HTTP_IF_NONE_MATCH=other["ETag"]
+    )
+    assert cached.status_code == 304
+
+
+@pytest.mark.django_db
+def test_import_invalidates_shop(
+    client, catalog, partner, price_list, django_capture_on_commit_callbacks
+):
+    shop, _ = catalog
+    response = client.get(products_url, {"shop_id": shop.id})
+    price_list["shop"] = shop.name
+    price_list["goods"][0]["price"] = 100000
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter(partner.id).run(price_list)
+    updated = client.get(
+        products_url, {"shop_id": shop.id}, HTTP_IF_NONE_MATCH=response["ETag"]
+    )
+    assert updated.status_code == 200
+    product_info = ProductInfo.objects.get(
+        shop=shop, external_id=price_list["goods"][0]["id"]
+    )
+    prices = {item["id"]: item["price"] for item in updated.json()["results"]}
+    assert prices[product_info.id] == 100000
+
+
+@pytest.mark.django_db
+def test_admin_save_invalidates_catalog(
+    client, catalog, django_capture_on_commit_callbacks
+):
+    _, other_shop = catalog
+    client.get(categories_url)
+    response = client.get(products_url, {"shop_id": other_shop.id})
+    category = Category.objects.first()
+    category.name = "Телефоны"
+    with django_capture_on_commit_callbacks(execute=True):
+        category.save()
+    assert "Телефоны" in {
+        item["name"] for item in client.get(categories_url).json()["results"]
+    }
+    updated = client.get(
+        products_url, {"shop_id": other_shop.id}, HTTP_IF_NONE_MATCH=response["ETag"]
+    )
+    assert updated.status_code == 200
+    product_info = ProductInfo.objects.filter(shop=other_shop).first()
+    product_info.price = 1
+    with django_capture_on_commit_callbacks(execute=True):
+        product_info.save()
+    prices = {
+        item["id"]: item["price"]
+        for item in client.get(products_url, {"shop_id": other_shop.id}).json()[
+            "results"
+        ]
+    }
+    assert prices[product_info.id] == 1
+
+
+@pytest.mark.django_db
+def test_order_invalidates_only_own_shop(
+    client, catalog, django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    # Заказ меняет только остатки: категории, магазины, общая выдача и выдача
+    # других магазинов остаются в кеше
+    shop, other_shop = catalog
+    cached = [
+        (products_url, {}),
+        (shops_url, {}),
+        (categories_url, {}),
+        (products_url, {"shop_id": other_shop.id}),
+    ]
+    etags = [client.get(url, params)["ETag"] for url, params in cached]
+    response = client.get(products_url, {"shop_id": shop.id})
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    product_info = ProductInfo.objects.filter(shop=shop).first()
+    add_to_basket(buyer.id, [{"product_info": product_info.id, "quantity": 2}])
+    with django_capture_on_commit_callbacks(execute=True):
+        place_order(buyer.id, Order.objects.get(user=buyer).id, contact.id)
+    for (url, params), etag in zip(cached, etags):
+        with django_assert_num_queries(0):
+            assert client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    updated = client.get(
+        products_url, {"shop_id": shop.id}, HTTP_IF_NONE_MATCH=response["ETag"]
+    )
+    assert updated.status_code == 200
+    quantities = {item["id"]: item["quantity"] for item in updated.json()["results"]}
+    assert quantities[product_info.id] == product_info.quantity - 2
@@ -0,0 +1,127 @@
+from threading import Thread
+
+import psycopg2
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+
+from backend.db_pool.pool import ConnectionPool
+from backend.models import User
+
+
+@pytest.fixture
+def connect(db):
+    # Подключение к тестовой базе мимо Django
+    params = connection.get_connection_params()
+    return lambda: psycopg2.connect(**params)
+
+
+def backend_pid(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid()")
+        return cursor.fetchone()[0]
+
+
+def test_pool_reuses_connection(connect):
+    pool = ConnectionPool(max_size=2)
+    conn = pool.getconn(connect)
+    pid = backend_pid(conn)
+    pool.putconn(conn)
+    conn = pool.getconn(connect)
+    assert backend_pid(conn) == pid
+    pool.putconn(conn)
+    stats = pool.stats()
+    assert stats["opened"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["size"] == stats["idle"] == 1
+    assert stats["in_use"] == 0
+    pool.close_all()
+    assert conn.closed
+
+
+def test_pool_rolls_back_on_return(connect):
+    pool = ConnectionPool(max_size=1)
+    conn = pool.getconn(connect)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    assert conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    pool.putconn(conn)
+    assert conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    assert pool.getconn(connect) is conn
+    pool.close_all()
+
+
+def test_pool_replaces_broken_connection(connect):
+    pool = ConnectionPool(max_size=2)
+    conn = pool.getconn(connect)
+    pid = backend_pid(conn)
+    pool.putconn(conn)
+    # Сервер завершил сеанс, пока соединение лежало в пуле
+    other = connect()
+    with other.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+    other.close()
+    conn = pool.getconn(connect)
+    assert backend_pid(conn) != pid
+    stats = pool.stats()
+    assert stats["broken"] == 1
+    assert stats["opened"] == 2
+    assert stats["size"] == 1
+    pool.close_all()
+
+
+def test_pool_recycles_old_connections(connect, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.db_pool.pool.monotonic", lambda: now[0])
+    pool = ConnectionPool(max_size=1, max_lifetime=60)
+    conn = pool.getconn(connect)
+    pool.putconn(conn)
+    now[0] += 61
+    assert pool.getconn(connect) is not conn
+    assert conn.closed
+    assert pool.stats()["recycled"] == 1
+    pool.close_all()
+
+
+def test_pool_waits_and_times_out(connect):
+    pool = ConnectionPool(max_size=1, timeout=0.2)
+    conn = pool.getconn(connect)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn(connect)
+    assert pool.stats()["timeouts"] == 1
+    # Ждущий поток получает соединение, как только его вернули
+    pool.timeout = 5
+    received = []
+    waiter = Thread(target=lambda: received.append(pool.getconn(connect)))
+    waiter.start()
+    while not pool.stats()["waiting"]:
+        pass
+    pool.putconn(conn)
+    waiter.join()
+    assert received == [conn]
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["opened"] == 1
+    pool.putconn(conn)
+    pool.close_all()
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn(connect)
+
+
+@pytest.mark.django_db
+def test_pool_stats_view():
+    client = APIClient()
+    user = User.objects.create_user(
+        email="admin@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    client.force_authenticate(user)
+    response = client.get("/api/v1/system/db-pool")
+    assert response.status_code == 403
+    user.is_staff = True
+    user.save()
+    response = client.get("/api/v1/system/db-pool")
+    assert response.status_code == 200
+    # Тесты идут через пул: в нем соединение тестовой базы
+    stats = next(iter(response.json().values()))
+    assert stats["max_size"] >= 1
+    assert stats["checkouts"] >= 1
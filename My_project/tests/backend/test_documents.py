@@ -0,0 +1,70 @@
+import pytest
+from django.contrib.admin.sites import site
+from rest_framework.test import APIClient
+
+from backend.importer import PriceListImporter
+from backend.models import (
+    Product,
+    ProductInfo,
+    ProductParameter,
+    ProductDocument,
+)
+from backend.serializers import ProductInfoSerializer, ProductDocumentSerializer
+
+
+def assert_documents_match_catalog():
+    # Документ должен отдавать ровно то же, что сериализатор исходных таблиц
+    product_infos = ProductInfo.objects.order_by("id")
+    documents = ProductDocument.objects.order_by("product_info_id")
+    assert ProductDocumentSerializer(documents, many=True).data == (
+        ProductInfoSerializer(product_infos, many=True).data
+    )
+
+
+@pytest.mark.django_db
+def test_documents_built_by_import(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    assert ProductDocument.objects.count() == 4
+    assert_documents_match_catalog()
+
+
+@pytest.mark.django_db
+def test_documents_follow_import_changes(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    removed = price_list["goods"].pop()
+    price_list["goods"][0]["price"] = 100000
+    price_list["goods"][1]["parameters"]["Цвет"] = "белый"
+    price_list["categories"][0]["name"] = "Телефоны"
+    PriceListImporter(partner.id).run(price_list)
+    assert not ProductDocument.objects.filter(external_id=removed["id"]).exists()
+    document = ProductDocument.objects.get(external_id=price_list["goods"][0]["id"])
+    assert document.price == 100000
+    assert set(ProductDocument.objects.values_list("category_name", flat=True)) == {
+        "Телефоны"
+    }
+    assert_documents_match_catalog()
+
+
+@pytest.mark.django_db
+def test_documents_follow_admin_edits(partner, price_list, rf):
+    PriceListImporter(partner.id).run(price_list)
+    product = Product.objects.first()
+    product.name = "Смартфон Apple iPhone 15"
+    product.save()
+    parameters = ProductParameter.objects.filter(parameter__name="Цвет")
+    site._registry[ProductParameter].delete_queryset(rf.post("/"), parameters)
+    assert_documents_match_catalog()
+    assert not ProductDocument.objects.filter(
+        parameters__contains=[{"parameter": "Цвет"}]
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_documents_follow_shop_state(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    client = APIClient()
+    client.force_authenticate(partner)
+    client.post("/api/v1/partner/state", data={"state": "False"})
+    assert not ProductDocument.objects.filter(shop_state=True).exists()
+    response = client.get("/api/v1/products")
+    assert response.json()["results"] == []
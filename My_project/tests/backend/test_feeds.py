@@ -0,0 +1,120 @@
+import tracemalloc
+from io import BytesIO, RawIOBase
+
+import pytest
+from django.conf import settings
+from yaml import safe_load
+
+from backend.feeds import guess_format, read_price_list
+
+
+class Download(RawIOBase):
+    # Поток без перемотки, как тело ответа сервера
+    def __init__(self, data):
+        self.data = BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+
+def make_yaml_feed(size):
+    # Прайс в формате YAML из size товаров
+    goods = "".join(
+        f"""  - id: {number}
+    category: 224
+    model: apple/iphone/xr
+    name: Смартфон {number}
+    price: 65000
+    price_rrc: 69990
+    quantity: 5
+    parameters:
+      "Диагональ (дюйм)": 6.1
+      "Цвет": черный
+"""
+        for number in range(size)
+    )
+    feed = "shop: Связной\ncategories:\n  - id: 224\n    name: Смартфоны\ngoods:\n"
+    return BytesIO((feed + goods).encode())
+
+
+def peak_memory(stream):
+    # Пиковый объем памяти на разбор прайса
+    tracemalloc.start()
+    for _ in read_price_list(stream)["goods"]:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def test_yaml_feed_matches_full_load():
+    path = settings.BASE_DIR / "data" / "shop1.yaml"
+    with open(path, "rb") as file:
+        expected = safe_load(file)
+    with open(path, "rb") as file:
+        data = read_price_list(file)
+        assert data["shop"] == expected["shop"]
+        assert data["categories"] == expected["categories"]
+        assert list(data["goods"]) == expected["goods"]
+
+
+def test_yaml_feed_is_lazy():
+    stream = BytesIO(
+        "shop: Связной\ngoods:\n  - id: 1\n    name: Флешка\n  - id: [\n".encode()
+    )
+    goods = read_price_list(stream)["goods"]
+    assert next(goods) == {"id": 1, "name": "Флешка"}
+    with pytest.raises(Exception):
+        next(goods)
+
+
+def test_json_lines_feed():
+    stream = BytesIO(
+        "\n".join(
+            [
+                '{"shop": "Связной", "categories": [{"id": 224, "name": "Смартфоны"}]}',
+                '{"id": 1, "category": 224, "name": "Смартфон", "parameters": {}}',
+                "",
+                '{"id": 2, "category": 224, "name": "Смартфон 2", "parameters": {}}',
+            ]
+        ).encode()
+    )
+    data = read_price_list(stream, "jsonl")
+    assert data["shop"] == "Связной"
+    assert data["categories"] == [{"id": 224, "name": "Смартфоны"}]
+    assert [item["id"] for item in data["goods"]] == [1, 2]
+
+
+def test_guess_format():
+    assert guess_format("http://localhost/shop1.yaml") == "yaml"
+    assert guess_format("http://localhost/shop1.jsonl?token=1") == "jsonl"
+
+
+def test_yaml_feed_memory_does_not_grow_with_size():
+    small = peak_memory(make_yaml_feed(1000))
+    large = peak_memory(make_yaml_feed(10000))
+    assert large < small * 2
+
+
+def test_yaml_feed_checks_keys_before_goods():
+    # Ошибочный порядок ключей виден до первого товара, в том числе в потоке
+    # без перемотки, как ответ сервера
+    for feed, error in [
+        (
+            "shop: Связной\ngoods:\n  - id: 1\n    category: 224\n"
+            "categories:\n  - id: 224\n    name: Смартфоны\n",
+            "categories",
+        ),
+        ("shop: Связной\ngods:\n  - id: 1\n", "goods"),
+        ("goods:\n  - id: 1\nshop: Связной\n", "shop"),
+    ]:
+        for stream in (BytesIO(feed.encode()), Download(feed.encode())):
+            with pytest.raises(ValueError, match=error):
+                read_price_list(stream)
+    # Прочие ключи после goods не мешают
+    feed = "shop: Связной\ngoods:\n  - id: 1\nversion: 2\n".encode()
+    for stream in (BytesIO(feed), Download(feed)):
+        assert list(read_price_list(stream)["goods"]) == [{"id": 1}]
@@ -0,0 +1,135 @@
+import pytest
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from backend.basket import add_to_basket, place_order
+from backend.flat_serializers import FlatSerializer
+from backend.importer import PriceListImporter
+from backend.models import (
+    Contact,
+    Order,
+    OrderItem,
+    ProductInfo,
+    ProductParameter,
+    ShopOrder,
+    User,
+)
+from backend.serializers import (
+    OrderItemCreateSerializer,
+    OrderSerializer,
+    PlacedOrderSerializer,
+    ProductDocumentSerializer,
+    ProductInfoSerializer,
+    ShopOrderSerializer,
+)
+
+# Списки связей DRF предзагружаются в порядке id, как у FlatSerializer
+PARAMETERS = ProductParameter.objects.select_related("parameter").order_by("pk")
+ITEMS = OrderItem.objects.order_by("pk")
+
+
+@pytest.fixture
+def orders(django_capture_on_commit_callbacks):
+    # Оформленный заказ с контактом и корзина без контакта, товары с
+    # параметрами и без них
+    partner = User.objects.create_user(
+        email="partner@example.com",
+        password="11ff22FF33cc44CC",
+        type="shop",
+        is_active=True,
+    )
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter(partner.id).run(
+            {
+                "shop": "Связной",
+                "categories": [{"id": 1, "name": "Смартфоны"}],
+                "goods": [
+                    {
+                        "id": number,
+                        "category": 1,
+                        "model": f"model/{number}",
+                        "name": f"Смартфон {number}",
+                        "price": 1000 + number,
+                        "price_rrc": 1100 + number,
+                        "quantity": 5,
+                        "parameters": (
+                            {"Цвет": "черный", "Память": 128} if number % 2 else {}
+                        ),
+                    }
+                    for number in range(6)
+                ],
+            }
+        )
+    items = list(ProductInfo.objects.order_by("id").values_list("id", flat=True))
+    add_to_basket(buyer.id, [{"product_info": item, "quantity": 2} for item in items])
+    place_order(buyer.id, Order.objects.get(user=buyer, state="basket").id, contact.id)
+    add_to_basket(
+        buyer.id, [{"product_info": item, "quantity": 1} for item in items[::-1][:3]]
+    )
+    return buyer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "serializer_class, queryset, prefetch",
+    [
+        (
+            OrderSerializer,
+            lambda: Order.objects.order_by("id"),
+            [
+                Prefetch("ordered_items", ITEMS),
+                Prefetch("ordered_items__product_info__product_parameters", PARAMETERS),
+            ],
+        ),
+        (
+            PlacedOrderSerializer,
+            lambda: Order.objects.exclude(state="basket"),
+            [Prefetch("ordered_items", ITEMS)],
+        ),
+        (
+            ShopOrderSerializer,
+            lambda: ShopOrder.objects.all(),
+            [Prefetch("ordered_items", ITEMS)],
+        ),
+        (
+            OrderItemCreateSerializer,
+            lambda: OrderItem.objects.order_by("-id"),
+            [Prefetch("product_info__product_parameters", PARAMETERS)],
+        ),
+        (
+            ProductInfoSerializer,
+            lambda: ProductInfo.objects.order_by("id"),
+            [Prefetch("product_parameters", PARAMETERS)],
+        ),
+    ],
+)
+def test_flat_serializer_matches_drf(orders, serializer_class, queryset, prefetch):
+    expected = serializer_class(queryset().prefetch_related(*prefetch), many=True)
+    flat = FlatSerializer(serializer_class).serialize(queryset())
+    assert flat == expected.data
+    assert render(flat) == render(expected.data)
+    assert FlatSerializer(serializer_class).serialize(queryset().none()) == []
+
+
+@pytest.mark.django_db
+def test_flat_serializer_queries(orders, django_assert_num_queries):
+    # Запрос заказов и по запросу на каждую связь, независимо от числа строк
+    with django_assert_num_queries(3):
+        FlatSerializer(OrderSerializer).serialize(Order.objects.all())
+    with django_assert_num_queries(0):
+        FlatSerializer(OrderSerializer).serialize(Order.objects.none())
+
+
+def test_flat_serializer_rejects_unknown_fields():
+    with pytest.raises(TypeError):
+        FlatSerializer(ProductDocumentSerializer)
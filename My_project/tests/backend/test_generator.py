@@ -0,0 +1,128 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.test import APIClient
+
+from backend.basket import recalculate_totals, recalculate_shop_totals
+from backend.documents import refresh_documents
+from backend.feeds import read_price_list
+from backend.generator import DataGenerator
+from backend.importer import PriceListImporter
+from backend.models import (
+    User,
+    Shop,
+    ProductInfo,
+    ProductParameter,
+    ProductDocument,
+    Contact,
+    Order,
+    OrderItem,
+    ShopOrder,
+)
+
+
+def price_lists(generator):
+    return [
+        {**price_list, "goods": list(price_list["goods"])}
+        for price_list in map(generator.price_list, range(generator.shops))
+    ]
+
+
+def test_generator_is_deterministic():
+    generated = price_lists(DataGenerator(1, shops=3, categories=4, products=30))
+    assert generated == price_lists(
+        DataGenerator(1, shops=3, categories=4, products=30)
+    )
+    assert generated != price_lists(
+        DataGenerator(2, shops=3, categories=4, products=30)
+    )
+    # Данные магазина не зависят от того, сколько магазинов создается
+    more_shops = price_lists(DataGenerator(1, shops=4, categories=4, products=40))
+    assert more_shops[0]["goods"][:5] == generated[0]["goods"][:5]
+    assert sum(len(price_list["goods"]) for price_list in generated) == 30
+
+
+@pytest.mark.parametrize("feed_format", ["yaml", "jsonl"])
+def test_generate_feeds(tmp_path, feed_format):
+    call_command(
+        "generate_data",
+        "--seed=5",
+        "--shops=2",
+        "--products=40",
+        f"--format={feed_format}",
+        f"--output={tmp_path}",
+        stdout=StringIO(),
+    )
+    expected = price_lists(DataGenerator(5, shops=2, categories=5, products=40))
+    for shop_number, price_list in enumerate(expected):
+        with open(tmp_path / f"shop{shop_number}.{feed_format}", "rb") as file:
+            feed = read_price_list(file, feed_format)
+            assert feed["shop"] == price_list["shop"]
+            assert feed["categories"] == price_list["categories"]
+            assert list(feed["goods"]) == price_list["goods"]
+
+
+@pytest.mark.django_db
+def test_generated_feed_imports():
+    partner = User.objects.create_user(
+        email="partner@example.com", password="11ff22FF33cc44CC", type="shop"
+    )
+    generator = DataGenerator(7, shops=1, categories=5, products=50)
+    stats = PriceListImporter(partner.id).run(generator.price_list(0))
+    assert stats["rows"]["inserted"] == 50
+    assert ProductParameter.objects.count() == sum(
+        len(item["parameters"]) for item in price_lists(generator)[0]["goods"]
+    )
+
+
+@pytest.mark.django_db
+def test_generate_database():
+    call_command(
+        "generate_data",
+        "--seed=9",
+        "--shops=3",
+        "--products=90",
+        "--users=10",
+        "--baskets=4",
+        "--orders=20",
+        "--batch-size=25",
+        stdout=StringIO(),
+    )
+    assert Shop.objects.count() == 3
+    assert ProductInfo.objects.count() == ProductDocument.objects.count() == 90
+    assert Contact.objects.count() == 10
+    assert Order.objects.filter(state="basket").count() == 4
+    assert Order.objects.exclude(state="basket").count() == 20
+    assert not OrderItem.objects.filter(shop_order=None).exclude(order__state="basket")
+    # Документы и итоги совпадают с теми, что строит и считает само приложение
+    documents = list(ProductDocument.objects.order_by("pk").values())
+    refresh_documents(ProductInfo.objects.all())
+    assert list(ProductDocument.objects.order_by("pk").values()) == documents
+    assert not ProductDocument.objects.filter(search=None).exists()
+    totals = list(Order.objects.order_by("id").values_list("total_sum", "items_count"))
+    shop_totals = list(
+        ShopOrder.objects.order_by("id").values_list("total_sum", "items_count")
+    )
+    recalculate_totals(Order.objects.all())
+    recalculate_shop_totals(ShopOrder.objects.all())
+    assert (
+        list(Order.objects.order_by("id").values_list("total_sum", "items_count"))
+        == totals
+    )
+    assert (
+        list(ShopOrder.objects.order_by("id").values_list("total_sum", "items_count"))
+        == shop_totals
+    )
+    # Покупатели входят с общим паролем, последовательности id не сбиты
+    client = APIClient()
+    response = client.post(
+        "/api/v1/user/login",
+        {"email": "buyer0-9@example.com", "password": "11ff22FF33cc44CC"},
+    )
+    assert response.json()["Status"] is True
+    Order.objects.create(user=User.objects.get(email="buyer1-9@example.com"))
+    assert len(client.get("/api/v1/products").json()["results"]) == 40
+    with pytest.raises(CommandError):
+        call_command("generate_data", "--seed=9", "--products=10", stdout=StringIO())
@@ -0,0 +1,299 @@
+from io import BytesIO
+
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from backend import tasks
+from backend.caching import SHOP_VERSION, catalog_versions
+from backend.feeds import read_price_list
+from backend.importer import PriceListImporter
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Parameter,
+    ProductParameter,
+    Order,
+    OrderItem,
+    ImportJob,
+    ImportRow,
+)
+
+
+def open_local_price_list(url):
+    # Вместо скачивания открываем прайс из папки data
+    return open(settings.BASE_DIR / "data" / "shop1.yaml", "rb")
+
+
+def make_price_list(size):
+    # Синтетический прайс из size товаров по схеме shop1.yaml
+    return {
+        "shop": "Связной",
+        "categories": [{"id": 224, "name": "Смартфоны"}],
+        "goods": [
+            {
+                "id": 1000 + number,
+                "category": 224,
+                "model": "apple/iphone/xr",
+                "name": f"Смартфон {number}",
+                "price": 60000 + number,
+                "price_rrc": 64990,
+                "quantity": 7,
+                "parameters": {"Цвет": "синий", "Встроенная память (Гб)": 256},
+            }
+            for number in range(size)
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_importer_loads_price_list(partner, price_list):
+    stats = PriceListImporter(partner.id).run(price_list)
+    assert Shop.objects.count() == 1
+    assert Category.objects.count() == 3
+    assert Category.shops.through.objects.count() == 3
+    assert Product.objects.count() == 4
+    assert ProductInfo.objects.count() == 4
+    assert Parameter.objects.count() == 4
+    assert ProductParameter.objects.count() == 16
+    assert stats["phases"]["product_info"]["rows"] == 4
+    assert stats["phases"]["product_parameters"]["rows"] == 16
+    assert set(stats["phases"]) == {
+        "stage",
+        "shop",
+        "categories",
+        "products",
+        "parameters",
+        "product_info",
+        "product_parameters",
+        "documents",
+        "delete",
+        "facets",
+    }
+    assert stats["rows"] == {"inserted": 4, "updated": 0, "unchanged": 0, "deleted": 0}
+
+
+@pytest.mark.django_db
+def test_importer_reuses_existing_rows(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    PriceListImporter(partner.id).run(price_list)
+    assert Category.objects.count() == 3
+    assert Product.objects.count() == 4
+    assert ProductInfo.objects.count() == 4
+    assert Parameter.objects.count() == 4
+    assert ProductParameter.objects.count() == 16
+
+
+@pytest.mark.django_db
+def test_importer_syncs_only_changes(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    ids = dict(ProductInfo.objects.values_list("external_id", "id"))
+    removed = price_list["goods"].pop()
+    price_list["goods"][0]["price"] = 100000
+    price_list["goods"][1]["parameters"]["Цвет"] = "белый"
+    price_list["goods"].append(dict(removed, id=1, parameters={"Цвет": "серый"}))
+    stats = PriceListImporter(partner.id).run(price_list)
+    assert stats["rows"] == {"inserted": 1, "updated": 2, "unchanged": 1, "deleted": 1}
+    assert ProductInfo.objects.count() == 4
+    assert not ProductInfo.objects.filter(external_id=removed["id"]).exists()
+    # Строки сохранившихся товаров обновляются на месте
+    for item in price_list["goods"][:3]:
+        assert ProductInfo.objects.get(external_id=item["id"]).id == ids[item["id"]]
+    assert ProductInfo.objects.get(external_id=price_list["goods"][0]["id"]).price == (
+        100000
+    )
+    assert ProductParameter.objects.filter(value="белый").count() == 1
+    assert ProductParameter.objects.filter(product_info__external_id=1).count() == 1
+
+
+@pytest.mark.django_db
+def test_importer_keeps_order_items(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    product_info = ProductInfo.objects.first()
+    order = Order.objects.create(user=partner, state="new")
+    OrderItem.objects.create(order=order, product_info=product_info, quantity=1)
+    price_list["goods"][0]["quantity"] = 1
+    PriceListImporter(partner.id).run(price_list)
+    assert OrderItem.objects.get().product_info_id == product_info.id
+
+
+@pytest.mark.django_db
+def test_importer_recalculates_baskets(partner, price_list):
+    PriceListImporter(partner.id).run(price_list)
+    first, second = (
+        ProductInfo.objects.get(external_id=item["id"])
+        for item in price_list["goods"][:2]
+    )
+    orders = {}
+    for state in ("basket", "new"):
+        orders[state] = Order.objects.create(user=partner, state=state)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=orders[state], product_info=product_info, quantity=2)
+            for product_info in (first, second)
+        )
+        Order.objects.filter(id=orders[state].id).update(
+            total_sum=2 * (first.price + second.price), items_count=4
+        )
+    price_list["goods"][0]["price"] = 1000
+    del price_list["goods"][1]
+    PriceListImporter(partner.id).run(price_list)
+    for order in orders.values():
+        order.refresh_from_db()
+    # Корзина пересчитана по новой цене и без удаленного товара,
+    # итог оформленного заказа не меняется
+    assert (orders["basket"].total_sum, orders["basket"].items_count) == (2000, 4)
+    assert orders["new"].total_sum == 2 * (first.price + second.price)
+
+
+@pytest.mark.django_db
+def test_importer_query_count_does_not_grow_with_price_list(partner):
+    PriceListImporter(partner.id).run(make_price_list(1))
+    counts = []
+    for size in (10, 100):
+        with CaptureQueriesContext(connection) as queries:
+            PriceListImporter(partner.id, batch_size=1000).run(make_price_list(size))
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_partner_update_queues_job(
+    partner, monkeypatch, django_capture_on_commit_callbacks
+):
+    monkeypatch.setattr(tasks, "open_price_list", open_local_price_list)
+    client = APIClient()
+    client.force_authenticate(partner)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            "/api/v1/partner/update",
+            data={"url": "http://localhost/shop1.yaml"},
+            format="json",
+        )
+    data = response.json()
+    assert response.status_code == 200
+    assert data["Status"] is True
+    response = client.get(f"/api/v1/partner/update/{data['Job']}")
+    job = response.json()
+    assert response.status_code == 200
+    assert job["state"] == "done"
+    assert job["processed"] == 4
+    assert job["errors"] == []
+    assert job["stats"]["rows"]["inserted"] == 4
+    assert ProductInfo.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_partner_update_job_reports_errors(partner, monkeypatch):
+    def broken_download(url):
+        raise ValueError("Прайс недоступен")
+
+    monkeypatch.setattr(tasks, "open_price_list", broken_download)
+    job = ImportJob.objects.create(user=partner, url="http://localhost/shop1.yaml")
+    tasks.import_price_list.delay(job.id)
+    job.refresh_from_db()
+    assert job.state == "failed"
+    assert job.errors == ["Прайс недоступен"]
+
+
+@pytest.mark.django_db
+def test_partner_update_status_of_foreign_job(partner):
+    other = User.objects.create_user(
+        email="other@example.com", password="11ff22FF33cc44CC", type="shop"
+    )
+    job = ImportJob.objects.create(user=other, url="http://localhost/shop1.yaml")
+    client = APIClient()
+    client.force_authenticate(partner)
+    response = client.get(f"/api/v1/partner/update/{job.id}")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_importer_reads_goods_stream_in_batches(partner):
+    with open_local_price_list(None) as stream:
+        data = read_price_list(stream)
+        stats = PriceListImporter(partner.id, batch_size=3).run(data)
+    assert stats["rows"]["inserted"] == 4
+    assert ProductInfo.objects.count() == 4
+    assert ProductParameter.objects.count() == 16
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "feed, error",
+    [
+        (
+            "shop: Связной\ngoods:\n  - id: 1\n    category: 224\n    name: Флешка\n"
+            "    model: ''\n    price: 1\n    price_rrc: 1\n    quantity: 1\n"
+            "    parameters: {}\ncategories:\n  - id: 224\n    name: Смартфоны\n",
+            "categories",
+        ),
+        ("shop: Связной\ncategories: []\ngods: []\n", "goods"),
+    ],
+)
+def test_rejected_feed_does_not_touch_catalog(
+    partner, price_list, monkeypatch, settings, feed, error
+):
+    # Прайс с ошибкой в ключах отклоняется до записи товаров: ничего не
+    # добавляется и не удаляется, даже если товары пишутся по одному
+    settings.IMPORT_BATCH_SIZE = 1
+    PriceListImporter(partner.id).run(price_list)
+    before = list(ProductInfo.objects.order_by("id").values_list("id", "price"))
+    monkeypatch.setattr(tasks, "open_price_list", lambda url: BytesIO(feed.encode()))
+    job = ImportJob.objects.create(user=partner, url="http://localhost/shop1.yaml")
+    with pytest.raises(ValueError, match=error):
+        tasks.import_price_list(job.id)
+    job.refresh_from_db()
+    assert job.state == "failed"
+    assert list(ProductInfo.objects.order_by("id").values_list("id", "price")) == before
+    assert not ProductInfo.objects.filter(external_id=1).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize(
+    "broken",
+    [{"price": "дорого"}, {"category": 999}],
+)
+def test_failed_import_keeps_catalog(partner, price_list, broken):
+    # Ошибка в середине прайса не оставляет магазин наполовину обновленным:
+    # записанные пачки откатываются, удаления не выполняются, кеш не
+    # сбрасывается. Внешние ключи проверяются при фиксации, поэтому тест
+    # работает с настоящими транзакциями
+    PriceListImporter(partner.id).run(price_list)
+    shop = Shop.objects.get()
+    version = catalog_versions([SHOP_VERSION.format(shop.id)])
+    before = list(ProductInfo.objects.order_by("id").values_list("id", "price"))
+    price_list["goods"][0]["price"] = 1
+    price_list["goods"][-1].update(broken)
+    del price_list["goods"][1]
+    with pytest.raises(Exception):
+        PriceListImporter(partner.id, batch_size=1).run(price_list)
+    assert catalog_versions([SHOP_VERSION.format(shop.id)]) == version
+    assert list(ProductInfo.objects.order_by("id").values_list("id", "price")) == before
+    assert not ImportRow.objects.exists()
+
+
+@pytest.mark.django_db
+def test_partner_update_broker_down(
+    partner, monkeypatch, django_capture_on_commit_callbacks
+):
+    def broker_down(job_id):
+        raise ConnectionError("Брокер недоступен")
+
+    monkeypatch.setattr(tasks.import_price_list, "delay", broker_down)
+    client = APIClient()
+    client.force_authenticate(partner)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            "/api/v1/partner/update",
+            data={"url": "http://localhost/shop1.yaml"},
+            format="json",
+        )
+    assert response.json()["Status"] is True
+    job = client.get(f"/api/v1/partner/update/{response.json()['Job']}").json()
+    assert job["state"] == "failed"
+    assert "Брокер недоступен" in job["errors"][0]
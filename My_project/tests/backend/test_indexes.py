@@ -0,0 +1,165 @@
+import pytest
+from django.db import connection
+from django.http import QueryDict
+
+from backend.documents import refresh_documents
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    ProductDocument,
+    Order,
+    OrderItem,
+    ShopOrder,
+)
+from backend.search import ProductSearch
+
+SHOPS = 20
+CATEGORIES = 20
+PRODUCTS = 4000
+USERS = 50
+PLACED_ORDERS = 20
+ORDER_LINES = 5
+
+
+@pytest.fixture
+def dataset():
+    # Набор данных, на котором Postgres выбирает план честно, по статистике
+    users = User.objects.bulk_create(
+        User(email=f"user{number}@example.com", username=f"user{number}")
+        for number in range(USERS)
+    )
+    shops = Shop.objects.bulk_create(
+        Shop(name=f"Магазин {number}") for number in range(SHOPS)
+    )
+    categories = Category.objects.bulk_create(
+        Category(name=f"Категория {number}") for number in range(CATEGORIES)
+    )
+    products = Product.objects.bulk_create(
+        Product(name=f"Смартфон {number}", category=categories[number % CATEGORIES])
+        for number in range(PRODUCTS)
+    )
+    product_infos = ProductInfo.objects.bulk_create(
+        ProductInfo(
+            product=product,
+            shop=shops[number % SHOPS],
+            external_id=number,
+            model=f"model/{number}",
+            # В наличии только каждый десятый товар
+            quantity=5 if number % 10 == 0 else 0,
+            price=1000 + number,
+            price_rrc=1100 + number,
+        )
+        for number, product in enumerate(products)
+    )
+    refresh_documents(ProductInfo.objects.all())
+    baskets = Order.objects.bulk_create(
+        Order(user=user, state="basket") for user in users
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=basket, product_info=product_infos[number], quantity=1)
+        for basket in baskets
+        for number in range(3)
+    )
+    placed = Order.objects.bulk_create(
+        # Заказы разных покупателей перемешаны, как при обычной работе магазина
+        Order(user=user, state="new")
+        for _ in range(PLACED_ORDERS)
+        for user in users
+    )
+    shop_orders = ShopOrder.objects.bulk_create(
+        ShopOrder(order=order, shop=shops[number % SHOPS])
+        for number, order in enumerate(placed)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(
+            order_id=shop_order.order_id,
+            shop_order=shop_order,
+            product_info=product_infos[number],
+            quantity=1,
+        )
+        for shop_order in shop_orders
+        for number in range(ORDER_LINES)
+    )
+    with connection.cursor() as cursor:
+        # Новые строки GIN индекса копятся в списке ожидания, пока его не
+        # разберет autovacuum, и до этого индекс кажется планировщику дорогим
+        cursor.execute("SELECT gin_clean_pending_list('product_document_search')")
+        cursor.execute("ANALYZE")
+    return {"user": users[0], "shop": shops[0], "category": categories[0]}
+
+
+def hot_queries(dataset):
+    # Запросы в том виде, в каком их строят представления, и ожидаемый индекс
+    user, shop, category = dataset["user"], dataset["shop"], dataset["category"]
+    documents = ProductDocument.objects.filter(shop_state=True).defer(
+        "keywords", "search"
+    )
+    return {
+        "basket": (
+            Order.objects.filter(user_id=user.id, state="basket"),
+            "order_basket",
+        ),
+        "order_history": (
+            Order.objects.filter(user_id=user.id)
+            .exclude(state="basket")
+            .order_by("-datatime"),
+            # История без постраничной выдачи, ее проще отсортировать после
+            # индекса по внешнему ключу, чем держать отдельный индекс
+            "backend_order_user_id",
+        ),
+        "basket_lines": (
+            OrderItem.objects.filter(order__user_id=user.id, order__state="basket"),
+            "order_basket",
+        ),
+        "partner_orders": (
+            ShopOrder.objects.filter(shop_id=shop.id).order_by("-created_at"),
+            "shop_order_shop_created",
+        ),
+        "products_by_shop": (
+            documents.filter(shop_id=shop.id).order_by("product_info_id")[:41],
+            "product_document_shop_page",
+        ),
+        "products_by_category": (
+            documents.filter(category_id=category.id).order_by("product_info_id")[:41],
+            "product_document_category_page",
+        ),
+        "products_in_stock": (
+            ProductSearch(QueryDict("in_stock=1"))
+            .filter(documents)
+            .order_by("product_info_id")[:41],
+            "product_document_in_stock",
+        ),
+        "products_search": (
+            ProductSearch(QueryDict("q=1717")).filter(documents),
+            "product_document_search",
+        ),
+        "import_sync": (
+            ProductInfo.objects.filter(shop_id=shop.id, external_id__in=[0, 20, 40]),
+            "unique_product_info",
+        ),
+    }
+
+
+QUERIES = [
+    "basket",
+    "order_history",
+    "basket_lines",
+    "partner_orders",
+    "products_by_shop",
+    "products_by_category",
+    "products_in_stock",
+    "products_search",
+    "import_sync",
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", QUERIES)
+def test_hot_query_uses_index(dataset, name):
+    queryset, index = hot_queries(dataset)[name]
+    plan = queryset.explain()
+    assert "Seq Scan" not in plan, f"{name}: полный перебор таблицы\n{plan}"
+    assert index in plan, f"{name}: не используется индекс {index}\n{plan}"
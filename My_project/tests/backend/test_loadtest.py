@@ -0,0 +1,118 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from backend.loadtest import compare, parse_mix, percentile, summarize
+from backend.models import ImportJob, Order
+from backend.sinks import SMTPSink
+
+MIX = "browse=1,basket=1,order=1,partner_orders=1,partner_update=1"
+
+
+def test_summary_and_regressions():
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
+    assert percentile([5], 95) == 5
+    report = summarize({"GET /shops": [0.01 * n for n in range(1, 101)]}, {}, 2)
+    assert report == {
+        "GET /shops": {
+            "count": 100,
+            "errors": 0,
+            "rps": 50,
+            "p50": 500,
+            "p95": 950,
+            "p99": 990,
+        }
+    }
+    assert compare(report, report, 0.2) == []
+    slower = {
+        "GET /shops": {**report["GET /shops"], "p95": 1200, "rps": 30, "errors": 10}
+    }
+    assert compare(slower, report, 0.2) == [
+        "GET /shops: p95 1200.00 мс, было 950.00 мс",
+        "GET /shops: RPS 30.00, было 50.00",
+        "GET /shops: ошибок 10.0%, было 0.0%",
+    ]
+    # Запросы, которых нет в базовом прогоне, не сравниваются
+    assert compare({**slower, "GET /order": report["GET /shops"]}, report, 0.5) == [
+        "GET /shops: ошибок 10.0%, было 0.0%",
+    ]
+
+
+def test_parse_mix():
+    assert parse_mix("browse=3, order=1") == {"browse": 3, "order": 1}
+    for mix in ("browse=3,unknown=1", "browse=x", "browse=0"):
+        with pytest.raises(ValueError):
+            parse_mix(mix)
+
+
+def test_smtp_sink(settings):
+    with SMTPSink() as sink:
+        settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+        settings.EMAIL_HOST, settings.EMAIL_PORT = sink.address
+        settings.EMAIL_USE_SSL = False
+        settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ""
+        send_mail("Заказ", "Заказ оформлен\n.", "shop@example.com", ["a@example.com"])
+    [message] = sink.messages
+    assert message["to"] == ["<a@example.com>"]
+    assert message["message"]["Subject"] == "Заказ"
+    assert message["message"].get_content() == "Заказ оформлен\n.\n"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_load_test_command(tmp_path):
+    call_command(
+        "generate_data",
+        "--seed=3",
+        "--shops=2",
+        "--products=60",
+        "--users=2",
+        "--baskets=0",
+        "--orders=2",
+        stdout=StringIO(),
+    )
+    options = [
+        "--seed=3",
+        "--shops=2",
+        "--products=60",
+        "--buyers=2",
+        "--partners=2",
+        "--concurrency=2",
+        "--iterations=30",
+        f"--mix={MIX}",
+    ]
+    output = StringIO()
+    call_command(
+        "load_test",
+        *options,
+        f"--save-baseline={tmp_path / 'base.json'}",
+        stdout=output,
+    )
+    with open(tmp_path / "base.json", encoding="utf-8") as file:
+        baseline = json.load(file)
+    endpoints = baseline["endpoints"]
+    assert {"GET /products", "POST /basket", "POST /order"} <= set(endpoints)
+    assert sum(row["errors"] for row in endpoints.values()) == 0, output.getvalue()
+    for label in endpoints:
+        assert label in output.getvalue()
+    # Сценарии действительно выполнялись на сервере
+    assert Order.objects.exclude(state="basket").count() > 2
+    if "POST /partner/update" in endpoints:
+        assert set(ImportJob.objects.values_list("state", flat=True)) == {"done"}
+    # Прогон заметно медленнее базового считается регрессией
+    for row in endpoints.values():
+        row.update(p50=0, p95=0, p99=0)
+    with open(tmp_path / "fast.json", "w", encoding="utf-8") as file:
+        json.dump(baseline, file)
+    output = StringIO()
+    with pytest.raises(CommandError):
+        call_command(
+            "load_test", *options, f"--baseline={tmp_path / 'fast.json'}", stdout=output
+        )
+    assert "Регрессия: GET /products: p50" in output.getvalue()
+    with pytest.raises(CommandError):
+        call_command("load_test", "--seed=4", "--iterations=1", stdout=StringIO())
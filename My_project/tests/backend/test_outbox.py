@@ -0,0 +1,244 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection, transaction
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    Product,
+    ProductInfo,
+    Contact,
+    Order,
+    OutboxEmail,
+)
+from backend import outbox, tasks
+from backend.outbox import deliver_outbox, enqueue_email
+from backend.sinks import SMTPSink
+
+register_url = "/api/v1/user/register"
+basket_url = "/api/v1/basket"
+order_url = "/api/v1/order"
+
+
+@pytest.fixture
+def smtp(settings):
+    # Письма уходят на локальный SMTP сервер
+    with SMTPSink(reject=["bad@example.com"]) as sink:
+        settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+        settings.EMAIL_HOST, settings.EMAIL_PORT = sink.address
+        settings.EMAIL_USE_SSL = False
+        settings.EMAIL_HOST_USER = "shop@example.com"
+        settings.EMAIL_HOST_PASSWORD = ""
+        settings.OUTBOX_RETRY_DELAY = 60
+        settings.OUTBOX_MAX_ATTEMPTS = 3
+        yield sink
+
+
+@pytest.mark.django_db
+def test_register_sends_email_after_commit(smtp, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = APIClient().post(
+            register_url,
+            {
+                "first_name": "Иван",
+                "last_name": "Иванов",
+                "email": "ivan@example.com",
+                "password": "11ff22FF33cc44CC",
+                "company": "Связной",
+                "position": "Менеджер",
+            },
+        )
+    assert response.json()["Status"] is True
+    # Запрос только ставит письмо в очередь, SMTP не трогает
+    email = OutboxEmail.objects.get()
+    assert (email.state, email.to) == ("pending", ["ivan@example.com"])
+    assert email.body == response.json()["token"]
+    assert smtp.connections == 0
+    for callback in callbacks:
+        callback()
+    email.refresh_from_db()
+    assert (email.state, email.attempts) == ("sent", 1)
+    [message] = smtp.messages
+    assert message["to"] == ["<ivan@example.com>"]
+    assert message["message"]["From"] == "shop@example.com"
+    assert message["message"].get_content().strip() == email.body
+
+
+@pytest.mark.django_db
+def test_register_with_broker_down(
+    smtp, monkeypatch, django_capture_on_commit_callbacks
+):
+    # Регистрация уже зафиксирована: сбой брокера не превращает ее в ошибку,
+    # письмо ждет в очереди периодического запуска send_outbox
+    def broker_down():
+        raise ConnectionError("Брокер недоступен")
+
+    monkeypatch.setattr(tasks.send_outbox, "delay", broker_down)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = APIClient().post(
+            register_url,
+            {
+                "first_name": "Иван",
+                "last_name": "Иванов",
+                "email": "ivan@example.com",
+                "password": "11ff22FF33cc44CC",
+                "company": "Связной",
+                "position": "Менеджер",
+            },
+        )
+    assert response.json()["Status"] is True
+    assert OutboxEmail.objects.get().state == "pending"
+    deliver_outbox()
+    assert OutboxEmail.objects.get().state == "sent"
+    assert len(smtp.messages) == 1
+
+
+@pytest.mark.django_db
+def test_email_is_part_of_transaction():
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            enqueue_email("Тема", "Текст", ["a@example.com"])
+            raise ValueError
+    assert not OutboxEmail.objects.exists()
+
+
+@pytest.mark.django_db
+def test_order_email(smtp, django_capture_on_commit_callbacks):
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", type="buyer"
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    product_info = ProductInfo.objects.create(
+        product=Product.objects.create(
+            name="Смартфон", category=Category.objects.create(name="Смартфоны")
+        ),
+        shop=Shop.objects.create(name="Связной"),
+        external_id=1,
+        model="model",
+        quantity=1,
+        price=100,
+        price_rrc=110,
+    )
+    client = APIClient()
+    client.force_authenticate(buyer)
+    client.post(
+        basket_url,
+        {"items": [{"product_info": product_info.id, "quantity": 1}]},
+        format="json",
+    )
+    basket = Order.objects.get(user=buyer, state="basket")
+    # Заказ не оформлен - письма нет
+    ProductInfo.objects.filter(id=product_info.id).update(quantity=0)
+    response = client.post(order_url, {"id": basket.id, "contact": contact.id})
+    assert response.json()["Status"] is False
+    assert not OutboxEmail.objects.exists()
+    ProductInfo.objects.filter(id=product_info.id).update(quantity=5)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(order_url, {"id": basket.id, "contact": contact.id})
+    assert response.json()["Status"] is True
+    email = OutboxEmail.objects.get()
+    assert (email.state, email.body, email.to) == (
+        "sent",
+        "Заказ сформирован",
+        ["buyer@example.com"],
+    )
+    assert len(smtp.messages) == 1
+
+
+@pytest.mark.django_db
+def test_one_connection_per_batch(smtp):
+    for number in range(25):
+        enqueue_email(f"Письмо {number}", "Текст", [f"user{number}@example.com"])
+    assert deliver_outbox(batch_size=10) == {"sent": 25, "retried": 0, "failed": 0}
+    assert smtp.connections == 3
+    assert len(smtp.messages) == 25
+    assert set(OutboxEmail.objects.values_list("state", flat=True)) == {"sent"}
+    # Повторный запуск ничего не отправляет
+    assert deliver_outbox() == {"sent": 0, "retried": 0, "failed": 0}
+    assert smtp.connections == 3
+
+
+@pytest.mark.django_db
+def test_retry_with_backoff(smtp):
+    enqueue_email("Письмо", "Текст", ["good@example.com"])
+    bad = enqueue_email("Письмо", "Текст", ["bad@example.com"])
+    started = now()
+    assert deliver_outbox() == {"sent": 1, "retried": 1, "failed": 0}
+    bad.refresh_from_db()
+    assert (bad.state, bad.attempts) == ("pending", 1)
+    assert "bad@example.com" in bad.last_error
+    assert timedelta(seconds=60) <= bad.next_attempt_at - started
+    assert bad.next_attempt_at - now() <= timedelta(seconds=60)
+    # Срок повтора не наступил
+    assert deliver_outbox() == {"sent": 0, "retried": 0, "failed": 0}
+    # Интервал растет вдвое, после OUTBOX_MAX_ATTEMPTS попыток письмо не отправлено
+    for attempts, delay, state in ((2, 120, "pending"), (3, None, "failed")):
+        OutboxEmail.objects.filter(id=bad.id).update(next_attempt_at=now())
+        started = now()
+        deliver_outbox()
+        bad.refresh_from_db()
+        assert (bad.state, bad.attempts) == (state, attempts)
+        if delay:
+            assert timedelta(seconds=delay) <= bad.next_attempt_at - started
+    assert deliver_outbox() == {"sent": 0, "retried": 0, "failed": 0}
+    assert [message["to"] for message in smtp.messages] == [["<good@example.com>"]]
+
+
+@pytest.mark.django_db
+def test_smtp_unavailable(smtp, settings):
+    smtp.stop()
+    enqueue_email("Письмо", "Текст", ["good@example.com"])
+    assert deliver_outbox() == {"sent": 0, "retried": 1, "failed": 0}
+    email = OutboxEmail.objects.get()
+    assert (email.state, email.attempts) == ("pending", 1)
+    assert email.last_error
+    # Сервер снова доступен - письмо уходит при следующей попытке
+    with SMTPSink() as sink:
+        settings.EMAIL_HOST, settings.EMAIL_PORT = sink.address
+        OutboxEmail.objects.update(next_attempt_at=now())
+        assert deliver_outbox() == {"sent": 1, "retried": 0, "failed": 0}
+    assert len(sink.messages) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_batch_is_claimed_before_sending(smtp, monkeypatch):
+    # SMTP идет вне транзакции, а пачка уже захвачена: параллельный
+    # воркер ее не выбирает
+    enqueue_email("Письмо", "Текст", ["good@example.com"])
+    send_batch = outbox.send_batch
+    parallel = []
+
+    def sending(emails):
+        assert not connection.in_atomic_block
+        assert OutboxEmail.objects.get().next_attempt_at > now()
+        parallel.append(deliver_outbox())
+        return send_batch(emails)
+
+    monkeypatch.setattr(outbox, "send_batch", sending)
+    assert deliver_outbox() == {"sent": 1, "retried": 0, "failed": 0}
+    assert parallel == [{"sent": 0, "retried": 0, "failed": 0}]
+    assert len(smtp.messages) == 1
+
+
+@pytest.mark.django_db
+def test_expired_claim_returns_to_queue(smtp):
+    email = enqueue_email("Письмо", "Текст", ["good@example.com"])
+    # Воркер захватил письмо и упал, не записав результат
+    emails, lease = outbox.claim_batch(10, now())
+    assert [claimed.id for claimed in emails] == [email.id]
+    assert deliver_outbox() == {"sent": 0, "retried": 0, "failed": 0}
+    # Срок захвата истек - письмо отправляет другой воркер
+    OutboxEmail.objects.update(next_attempt_at=now())
+    assert deliver_outbox() == {"sent": 1, "retried": 0, "failed": 0}
+    # Результат упавшего воркера поверх чужого уже не пишется
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    outbox.record_results(emails, {email.id: "ошибка"}, lease, stats)
+    assert stats == {"sent": 0, "retried": 0, "failed": 0}
+    email.refresh_from_db()
+    assert (email.state, email.attempts, email.last_error) == ("sent", 1, "")
@@ -0,0 +1,248 @@
+import re
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from yaml import safe_dump
+
+from backend.basket import add_to_basket, place_order
+from backend.importer import PriceListImporter
+from backend.models import User, Shop, Contact, Order, ImportJob
+from backend.sinks import FeedServer
+
+# Число позиций в каталоге магазина, корзине и заказе покупателя
+SIZES = [10, 100, 1000]
+
+LITERALS = [
+    # Строки, числа и списки значений не влияют на вид запроса
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    # Имена точек сохранения и серверных курсоров уникальны для каждого вызова
+    (re.compile(r'"s\w+_x\d+"'), '"s?"'),
+    (re.compile(r'"_django_curs_\w+"'), '"_django_curs_?"'),
+    (re.compile(r"\b(?:\d+(?:\.\d+)?|NULL|true|false)\b"), "?"),
+    # Приведение типа значения (?::uuid) - то же значение
+    (re.compile(r"\?::\w+"), "?"),
+    (re.compile(r"\(\?(?:, \?)*\)"), "(...)"),
+    (re.compile(r"\(\.\.\.\)(?:, \(\.\.\.\))+"), "(...)"),
+    # bulk_update пишет по ветке CASE на строку
+    (
+        re.compile(r"(WHEN \([^()]*\) THEN [^ ]+)(?: WHEN \([^()]*\) THEN [^ ]+)+"),
+        r"\1 ...",
+    ),
+]
+
+
+def fingerprint(sql):
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def check_budget(name, captured):
+    # captured - словарь размер данных -> список выполненных запросов
+    # Число запросов не должно расти с данными; если выросло, в отчет
+    # попадают запросы, которых стало больше, с точностью до значений
+    counts = {
+        size: Counter(fingerprint(query["sql"]) for query in queries)
+        for size, queries in captured.items()
+    }
+    smallest = counts[SIZES[0]]
+    for size in SIZES[1:]:
+        grown = counts[size] - smallest
+        if grown or counts[size].total() != smallest.total():
+            report = "\n".join(
+                f"  +{count} {query}" for query, count in grown.most_common()
+            )
+            pytest.fail(
+                f"{name}: {counts[size].total()} запросов на {size} строк, "
+                f"{smallest.total()} на {SIZES[0]}\n{report}",
+                pytrace=False,
+            )
+
+
+def make_price_list(shop, size):
+    return {
+        "shop": shop,
+        "categories": [
+            {"id": number, "name": f"Категория {number}"}
+            for number in range(size // 10 + 1)
+        ],
+        "goods": [
+            {
+                "id": number,
+                "category": number // 10,
+                "model": f"model/{number}",
+                "name": f"Смартфон {number}",
+                "price": 1000 + number,
+                "price_rrc": 1100 + number,
+                "quantity": 5,
+                "parameters": {
+                    "Диагональ (дюйм)": 6.1,
+                    "Цвет": ["черный", "белый", "красный"][number % 3],
+                },
+            }
+            for number in range(size)
+        ],
+    }
+
+
+@pytest.fixture
+def feed_server():
+    # Локальный сервер вместо сайта поставщика
+    with FeedServer() as server:
+        yield server
+
+
+@pytest.fixture
+def seed(django_capture_on_commit_callbacks):
+    def seed(size):
+        # Магазин из size товаров, корзина и история заказов на size позиций
+        partner = User.objects.create_user(
+            email=f"partner{size}@example.com", password="11ff22FF33cc44CC", type="shop"
+        )
+        buyer = User.objects.create_user(
+            email=f"buyer{size}@example.com", password="11ff22FF33cc44CC"
+        )
+        contact = Contact.objects.create(
+            user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            PriceListImporter(partner.id).run(make_price_list(f"Магазин {size}", size))
+        shop = Shop.objects.get(user=partner)
+        items = [
+            {"product_info": product_info.id, "quantity": 1}
+            for product_info in shop.product_info.all()
+        ]
+        # История растет вместе с каталогом: заказы по десять позиций
+        for start in range(0, size, 10):
+            add_to_basket(buyer.id, items[start : start + 10])
+            basket = Order.objects.get(user=buyer, state="basket")
+            place_order(buyer.id, basket.id, contact.id)
+        add_to_basket(buyer.id, items)
+        basket = Order.objects.get(user=buyer, state="basket")
+        return SimpleNamespace(
+            size=size,
+            partner=partner,
+            buyer=buyer,
+            contact=contact,
+            shop=shop,
+            items=items,
+            basket=basket,
+            lines=list(basket.ordered_items.values_list("id", flat=True)),
+        )
+
+    return seed
+
+
+def as_buyer(client, world):
+    client.force_authenticate(world.buyer)
+    return client
+
+
+def as_partner(client, world):
+    client.force_authenticate(world.partner)
+    return client
+
+
+def partner_update(client, world, feed_server):
+    # Прайс с новыми ценами загружается с локального сервера, задача
+    # выполняется сразу после фиксации транзакции и тоже входит в бюджет
+    price_list = make_price_list(world.shop.name, world.size)
+    for good in price_list["goods"]:
+        good["price"] += 1
+    feed_server.feeds[f"/{world.size}.yaml"] = safe_dump(
+        price_list, allow_unicode=True, sort_keys=False
+    ).encode()
+    return as_partner(client, world).post(
+        "/api/v1/partner/update", {"url": feed_server.url(f"/{world.size}.yaml")}
+    )
+
+
+ENDPOINTS = {
+    "products": lambda client, world, _: client.get(
+        "/api/v1/products", {"page_size": 100}
+    ),
+    "products_by_shop": lambda client, world, _: client.get(
+        "/api/v1/products", {"shop_id": world.shop.id, "q": "смартфон"}
+    ),
+    "categories": lambda client, world, _: client.get("/api/v1/categories"),
+    "shops": lambda client, world, _: client.get("/api/v1/shops"),
+    "basket_get": lambda client, world, _: as_buyer(client, world).get(
+        "/api/v1/basket"
+    ),
+    "basket_post": lambda client, world, _: as_buyer(client, world).post(
+        "/api/v1/basket",
+        {"items": [{**item, "quantity": 2} for item in world.items]},
+        format="json",
+    ),
+    "basket_put": lambda client, world, _: as_buyer(client, world).put(
+        "/api/v1/basket",
+        {"items": [{"id": id, "quantity": 3} for id in world.lines]},
+        format="json",
+    ),
+    "basket_delete": lambda client, world, _: as_buyer(client, world).delete(
+        "/api/v1/basket",
+        {"items": ",".join(map(str, world.lines))},
+        format="json",
+    ),
+    "order_get": lambda client, world, _: as_buyer(client, world).get("/api/v1/order"),
+    "order_post": lambda client, world, _: as_buyer(client, world).post(
+        "/api/v1/order",
+        {"id": world.basket.id, "contact": world.contact.id},
+        format="json",
+    ),
+    "partner_orders": lambda client, world, _: as_partner(client, world).get(
+        "/api/v1/partner/orders"
+    ),
+    "partner_state": lambda client, world, _: as_partner(client, world).post(
+        "/api/v1/partner/state", {"state": "False"}
+    ),
+    "partner_update": partner_update,
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", ENDPOINTS)
+def test_query_budget(
+    name, seed, feed_server, settings, django_capture_on_commit_callbacks
+):
+    # Вся загрузка прайса - одна пачка, число пачек растет с прайсом намеренно
+    settings.IMPORT_BATCH_SIZE = max(SIZES)
+    captured = {}
+    for size in SIZES:
+        world = seed(size)
+        # Каталог отдается из кеша, замеряется запрос мимо кеша
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = ENDPOINTS[name](APIClient(), world, feed_server)
+        assert response.status_code == 200, response.content
+        data = response.json()
+        assert not isinstance(data, dict) or data.get("Status", True), data
+        captured[size] = queries.captured_queries
+    if name == "partner_update":
+        # Прайсы действительно загрузились, а не упали на первом запросе
+        assert set(ImportJob.objects.values_list("state", flat=True)) == {"done"}
+    check_budget(name, captured)
+
+
+def test_budget_report():
+    captured = {
+        SIZES[0]: [{"sql": "SELECT * FROM shop WHERE id IN (1, 2)"}],
+        SIZES[1]: [
+            {"sql": "SELECT * FROM shop WHERE id IN (1, 2, 3)"},
+            {"sql": "SELECT * FROM item WHERE shop_id = 1"},
+            {"sql": "SELECT * FROM item WHERE shop_id = 2"},
+        ],
+        SIZES[2]: [{"sql": "SELECT * FROM shop WHERE id IN (5)"}],
+    }
+    with pytest.raises(pytest.fail.Exception) as error:
+        check_budget("shops", captured)
+    assert str(error.value) == (
+        f"shops: 3 запросов на {SIZES[1]} строк, 1 на {SIZES[0]}\n"
+        "  +2 SELECT * FROM item WHERE shop_id = ?"
+    )
@@ -0,0 +1,175 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.basket import add_to_basket, place_order
+from backend.caching import bump_catalog
+from backend.importer import PriceListImporter
+from backend.models import Category, Contact, Order, Shop, User
+from backend.replicas import CATALOG_WRITES, SHOP_WRITES, USER_WRITES
+
+# Реплика - отдельная тестовая база без репликации (tests/conftest.py):
+# что записано только в основную базу, с реплики не читается
+pytestmark = pytest.mark.django_db(databases=["default", "replica"])
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASE_REPLICAS = ["replica"]
+
+
+@pytest.fixture
+def product(django_capture_on_commit_callbacks):
+    partner = User.objects.create_user(
+        email="partner@example.com",
+        password="11ff22FF33cc44CC",
+        type="shop",
+        is_active=True,
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter(partner.id).run(
+            {
+                "shop": "Связной",
+                "categories": [{"id": 1, "name": "Смартфоны"}],
+                "goods": [
+                    {
+                        "id": 1,
+                        "category": 1,
+                        "model": "apple/iphone",
+                        "name": "Смартфон",
+                        "price": 1000,
+                        "price_rrc": 1100,
+                        "quantity": 5,
+                        "parameters": {},
+                    }
+                ],
+            }
+        )
+    return Shop.objects.get(user=partner).product_info.get()
+
+
+def category_names(response):
+    return [category["name"] for category in response.json()["results"]]
+
+
+def test_catalog_reads_from_replica(replica, django_capture_on_commit_callbacks):
+    Category.objects.create(name="Основная")
+    Category.objects.using("replica").create(name="Реплика")
+    client = APIClient()
+    assert category_names(client.get("/api/v1/categories")) == ["Реплика"]
+    # После изменения каталога списки читаются из основной базы
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_catalog()
+    assert cache.get(CATALOG_WRITES)
+    assert category_names(client.get("/api/v1/categories")) == ["Основная"]
+    cache.clear()
+    assert category_names(client.get("/api/v1/categories")) == ["Реплика"]
+
+
+def test_catalog_without_replicas():
+    Category.objects.create(name="Основная")
+    Category.objects.using("replica").create(name="Реплика")
+    response = APIClient().get("/api/v1/categories")
+    assert category_names(response) == ["Основная"]
+
+
+def test_reads_follow_own_writes(replica, product):
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    client = APIClient()
+    client.force_authenticate(buyer)
+    pin = USER_WRITES.format(buyer.id)
+    assert client.get("/api/v1/basket").json() == []
+    # Корзина изменена: следующее чтение из основной базы
+    response = client.post(
+        "/api/v1/basket",
+        {"items": [{"product_info": product.id, "quantity": 2}]},
+        format="json",
+    )
+    assert response.json()["Status"] is True
+    assert cache.get(pin)
+    basket = client.get("/api/v1/basket").json()
+    assert [item["quantity"] for item in basket[0]["ordered_items"]] == [2]
+    # Заказ оформлен: история заказов из основной базы
+    response = client.post(
+        "/api/v1/order", {"id": basket[0]["id"], "contact": contact.id}, format="json"
+    )
+    assert response.json() == {"Status": True}
+    assert [order["id"] for order in client.get("/api/v1/order").json()] == [
+        basket[0]["id"]
+    ]
+    # Отметка истекла: чтение снова с реплики, куда изменения не дошли
+    cache.delete(pin)
+    assert client.get("/api/v1/order").json() == []
+    assert client.get("/api/v1/basket").json() == []
+    assert Order.objects.get().state == "new"
+
+
+def test_order_pins_only_own_shop(replica, product, django_capture_on_commit_callbacks):
+    # Заказ не закрепляет весь каталог за основной базой, только выдачу
+    # магазина, в котором изменились остатки. Отметку загрузки прайса из
+    # фикстуры снимаем
+    cache.delete(CATALOG_WRITES)
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    add_to_basket(buyer.id, [{"product_info": product.id, "quantity": 2}])
+    with django_capture_on_commit_callbacks(execute=True):
+        place_order(buyer.id, Order.objects.get(user=buyer).id, contact.id)
+    assert cache.get(CATALOG_WRITES) is None
+    assert cache.get(SHOP_WRITES.format(product.shop_id))
+    Category.objects.using("replica").create(name="Реплика")
+    client = APIClient()
+    assert category_names(client.get("/api/v1/categories")) == ["Реплика"]
+    assert client.get("/api/v1/products").json()["results"] == []
+    response = client.get("/api/v1/products", {"shop_id": product.shop_id})
+    assert [item["quantity"] for item in response.json()["results"]] == [3]
+
+
+def test_async_views_use_replica(replica, settings):
+    settings.ROOT_URLCONF = "my_project.asgi_urls"
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    Order.objects.create(user=buyer, state="new")
+    Category.objects.create(name="Основная")
+    Category.objects.using("replica").create(name="Реплика")
+    client = AsyncClient()
+    response = async_to_sync(client.get)("/api/v1/categories")
+    assert category_names(response) == ["Реплика"]
+    headers = {"Authorization": f"Token {Token.objects.create(user=buyer).key}"}
+    response = async_to_sync(client.get)("/api/v1/order", headers=headers)
+    assert response.json() == []
+    cache.set(USER_WRITES.format(buyer.id), True)
+    response = async_to_sync(client.get)("/api/v1/order", headers=headers)
+    assert len(response.json()) == 1
+
+
+def test_login_keeps_catalog_on_replica(
+    replica, settings, django_capture_on_commit_callbacks
+):
+    # Вход сбрасывает кеш токенов, но каталог не меняет
+    settings.AUTH_TOKEN_ROTATE_ON_LOGIN = True
+    User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    Category.objects.using("replica").create(name="Реплика")
+    client = APIClient()
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            "/api/v1/user/login",
+            {"email": "buyer@example.com", "password": "11ff22FF33cc44CC"},
+        )
+    assert response.json()["Status"] is True
+    assert cache.get(CATALOG_WRITES) is None
+    assert category_names(client.get("/api/v1/categories")) == ["Реплика"]
@@ -0,0 +1,203 @@
+import pytest
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from rest_framework.test import APIClient
+from yaml import load as load_yaml, Loader
+
+from backend.basket import add_to_basket, place_order
+from backend.importer import PriceListImporter
+from backend.models import Contact, Order, ProductDocument, ProductInfo, User
+from backend.search import ProductSearch
+from backend.views import catalog_scope, product_documents
+
+url = "/api/v1/products"
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def catalog():
+    partner = User.objects.create_user(
+        email="partner@example.com", password="11ff22FF33cc44CC", type="shop"
+    )
+    with open(settings.BASE_DIR / "data" / "shop1.yaml", encoding="utf-8") as file:
+        PriceListImporter(partner.id).run(load_yaml(file, Loader=Loader))
+    return partner
+
+
+def external_ids(response):
+    return sorted(item["id"] for item in response.json()["results"])
+
+
+@pytest.mark.django_db
+def test_search_by_name_with_stemming(client, catalog):
+    response = client.get(url, {"q": "черные смартфоны"})
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data["results"]) == 1
+    assert data["results"][0]["product"]["name"].endswith("(черный)")
+
+
+@pytest.mark.django_db
+def test_search_by_parameters_and_price(client, catalog):
+    response = client.get(url, {"param": "Цвет=черный"})
+    assert len(response.json()["results"]) == 1
+    response = client.get(url, {"param": "Встроенная память (Гб)>=256"})
+    assert len(response.json()["results"]) == 4
+    response = client.get(
+        url, {"param": ["Встроенная память (Гб)>300", "Цвет=золотистый"]}
+    )
+    assert len(response.json()["results"]) == 1
+    response = client.get(url, {"price_min": 61000, "price_max": 70000})
+    assert len(response.json()["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_search_zero_price_bounds(client, catalog):
+    # Граница 0 - это граница, а не ее отсутствие
+    assert client.get(url, {"price_max": 0}).json()["results"] == []
+    ProductDocument.objects.filter(
+        product_info_id=ProductDocument.objects.values("product_info_id")[:1]
+    ).update(price=0)
+    cache.clear()
+    assert len(client.get(url, {"price_max": 0}).json()["results"]) == 1
+    assert len(client.get(url, {"price_min": 0}).json()["results"]) == 4
+    assert len(client.get(url, {"price_max": ""}).json()["results"]) == 4
+
+
+@pytest.mark.django_db
+def test_search_in_stock(client, catalog):
+    assert len(client.get(url).json()["results"]) == 4
+    ProductDocument.objects.filter(
+        product_info_id=ProductDocument.objects.values("product_info_id")[:1]
+    ).update(quantity=0)
+    assert len(client.get(url, {"in_stock": 1}).json()["results"]) == 3
+    assert len(client.get(url, {"in_stock": "true"}).json()["results"]) == 3
+
+
+@pytest.mark.django_db
+def test_search_facets(client, catalog):
+    response = client.get(url, {"q": "iphone xr"})
+    facets = response.json()["facets"]
+    assert sorted(facets["parameters"]["Цвет"], key=lambda row: row["value"]) == [
+        {"value": "красный", "count": 1},
+        {"value": "синий", "count": 1},
+        {"value": "черный", "count": 1},
+    ]
+    assert facets["parameters"]["Диагональ (дюйм)"] == [{"value": "6.1", "count": 3}]
+    assert facets["price"] == {"min": 60000, "max": 65000}
+
+
+def colors(facets):
+    return {row["value"]: row["count"] for row in facets["parameters"]["Цвет"]}
+
+
+def facets(params):
+    # Фасеты в обход кеша ответов каталога
+    query_params = QueryDict(params)
+    search = ProductSearch(query_params)
+    return search.facets(
+        product_documents(query_params, search), catalog_scope(query_params)
+    )
+
+
+@pytest.mark.django_db
+def test_catalog_facets_from_summary(client, catalog, django_assert_num_queries):
+    # Без условий поиска фасеты складываются из сводки двумя запросами
+    with django_assert_num_queries(2):
+        summary = facets("")
+    assert summary["exact"] is True
+    assert colors(summary) == {"золотистый": 1, "красный": 1, "черный": 1, "синий": 1}
+    assert summary["price"] == {"min": 60000, "max": 110000}
+    # И совпадают с подсчетом по всем найденным товарам
+    counted = facets("price_min=0")
+    assert counted["exact"] is True
+    assert counted["parameters"] == summary["parameters"]
+    assert counted["price"] == summary["price"]
+    category_id = ProductDocument.objects.values_list("category_id", flat=True)[0]
+    assert facets(f"category_id={category_id}")["parameters"] == summary["parameters"]
+    assert facets("category_id=0")["parameters"] == {}
+    assert client.get(url).json()["facets"] == summary
+
+
+@pytest.mark.django_db
+def test_search_facets_sample(catalog, settings):
+    # Фасеты поиска считаются по первым SEARCH_FACET_SAMPLE товарам
+    settings.SEARCH_FACET_SAMPLE = 2
+    sample = facets("q=iphone")
+    assert sample["exact"] is False
+    assert sum(colors(sample).values()) == 2
+    settings.SEARCH_FACET_SAMPLE = 3
+    assert facets("q=iphone xr")["exact"] is False
+    settings.SEARCH_FACET_SAMPLE = 4
+    assert facets("q=iphone xr")["exact"] is True
+
+
+@pytest.mark.django_db
+def test_catalog_facets_follow_changes(
+    client, catalog, rf, django_capture_on_commit_callbacks
+):
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    black = ProductDocument.objects.get(name__endswith="(черный)")
+    # Распроданный товар уходит из фасетов товаров в наличии
+    add_to_basket(
+        buyer.id, [{"product_info": black.product_info_id, "quantity": black.quantity}]
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        place_order(
+            buyer.id, Order.objects.get(user=buyer, state="basket").id, contact.id
+        )
+    assert "черный" not in colors(client.get(url, {"in_stock": 1}).json()["facets"])
+    assert "черный" in colors(client.get(url).json()["facets"])
+    # Сохранение товара через save() пересобирает сводку через сигнал
+    product_info = ProductInfo.objects.get(id=black.product_info_id)
+    product_info.price = 10
+    with django_capture_on_commit_callbacks(execute=True):
+        product_info.save()
+    assert client.get(url).json()["facets"]["price"]["min"] == 10
+    # Удаление товара в админке убирает его из сводки
+    with django_capture_on_commit_callbacks(execute=True):
+        site._registry[ProductInfo].delete_model(rf.post("/"), product_info)
+    assert "черный" not in colors(client.get(url).json()["facets"])
+    # Магазин перестал принимать заказы: его товаров нет и в фасетах
+    client.force_authenticate(catalog)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post("/api/v1/partner/state", {"state": "False"})
+    assert response.json() == {"Status": True}
+    assert client.get(url).json()["facets"] == {
+        "parameters": {},
+        "price": {"min": None, "max": None},
+        "exact": True,
+    }
+
+
+@pytest.mark.django_db
+def test_search_bad_parameter(client, catalog):
+    response = client.get(url, {"param": "Встроенная память (Гб)>=много"})
+    assert response.status_code == 400
+    assert response.json()["Status"] is False
+
+
+@pytest.mark.django_db
+def test_search_uses_gin_index(catalog):
+    # На маленькой таблице Postgres выбирает полный перебор,
+    # поэтому запрещаем его, чтобы проверить, что индекс вообще подходит
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    for params, index in (
+        ("q=смартфон", "product_document_search"),
+        ("param=Цвет=черный", "product_document_parameters"),
+    ):
+        search = ProductSearch(QueryDict(params))
+        assert index in search.filter(ProductDocument.objects.all()).explain()
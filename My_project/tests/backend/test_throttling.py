@@ -0,0 +1,101 @@
+import os
+from time import sleep
+
+import pytest
+from rest_framework.test import APIClient
+
+from backend.models import User
+from backend.throttling import (
+    LocalBucketStore,
+    RedisBucketStore,
+    parse_rate,
+    redis,
+)
+
+
+def test_parse_rate():
+    assert parse_rate("120/min") == (120, 2)
+    assert parse_rate("10/hour") == (10, 10 / 3600)
+    assert parse_rate("5/s") == (5, 5)
+
+
+def check_store(store, clock):
+    # Корзина на 3 запроса, жетон в секунду
+    assert [store.take("throttle:a", 3, 1)[0] for _ in range(4)] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    allowed, delay = store.take("throttle:a", 3, 1)
+    assert not allowed and 0 < delay <= 1
+    # Другой ключ считается отдельно
+    assert store.take("throttle:b", 3, 1)[0]
+    clock(1.1)
+    assert store.take("throttle:a", 3, 1)[0]
+    assert not store.take("throttle:a", 3, 1)[0]
+
+
+def test_local_store(monkeypatch):
+    now = [1000.0]
+
+    def clock(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr("backend.throttling.monotonic", lambda: now[0])
+    check_store(LocalBucketStore(), clock)
+    # Число ключей ограничено, вытесняются давно не использованные
+    store = LocalBucketStore(size=2)
+    for key in "abc":
+        store.take(key, 1, 1)
+    assert list(store.buckets) == ["b", "c"]
+
+
+def test_redis_store():
+    url = os.environ.get("THROTTLE_TEST_REDIS_URL", "redis://localhost:6379/15")
+    if redis is None:
+        pytest.skip("Нет пакета redis")
+    store = RedisBucketStore(url)
+    try:
+        store.clear()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis недоступен: {url}")
+    check_store(store, sleep)
+    store.clear()
+
+
+@pytest.mark.django_db
+def test_scopes(settings):
+    settings.THROTTLE_RATES = {
+        "anon": "2/min",
+        "user": "2/min",
+        "catalog": "3/min",
+        "login": "2/min",
+    }
+    client = APIClient()
+    statuses = [client.get("/api/v1/categories").status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    response = client.get("/api/v1/shops")
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 20
+    # Вход и остальные эндпоинты считаются отдельно от каталога
+    login = {"email": "buyer@example.com", "password": "11ff22FF33cc44CC"}
+    assert [client.post("/api/v1/user/login", login).status_code for _ in range(3)] == [
+        200,
+        200,
+        429,
+    ]
+    assert client.post("/api/v1/user/register/confirm").status_code == 200
+    # Вошедший пользователь считается по id, а не по IP
+    user = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    client.force_authenticate(user)
+    assert client.get("/api/v1/categories").status_code == 200
+    assert [client.get("/api/v1/user/details").status_code for _ in range(3)] == [
+        200,
+        200,
+        429,
+    ]
+    # Загрузка прайса без частоты в THROTTLE_RATES не ограничивается
+    assert client.post("/api/v1/partner/update").status_code != 429
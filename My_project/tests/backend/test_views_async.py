@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from backend.asgi import ConcurrencyLimit
+from backend.basket import add_to_basket, place_order
+from backend.importer import PriceListImporter
+from backend.models import Contact, Order, Shop, User
+
+
+@pytest.fixture
+def shop(django_capture_on_commit_callbacks):
+    # Магазин на 30 товаров и покупатель с тремя оформленными заказами
+    partner = User.objects.create_user(
+        email="partner@example.com",
+        password="11ff22FF33cc44CC",
+        type="shop",
+        is_active=True,
+    )
+    buyer = User.objects.create_user(
+        email="buyer@example.com", password="11ff22FF33cc44CC", is_active=True
+    )
+    contact = Contact.objects.create(
+        user=buyer, city="Москва", street="Тверская", phone="+79990000000"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter(partner.id).run(
+            {
+                "shop": "Связной",
+                "categories": [{"id": 1, "name": "Смартфоны"}],
+                "goods": [
+                    {
+                        "id": number,
+                        "category": 1,
+                        "model": f"model/{number}",
+                        "name": f"Смартфон {number}",
+                        "price": 1000 + number,
+                        "price_rrc": 1100 + number,
+                        "quantity": 5,
+                        "parameters": {"Цвет": ["черный", "белый"][number % 2]},
+                    }
+                    for number in range(30)
+                ],
+            }
+        )
+    shop = Shop.objects.get(user=partner)
+    items = list(shop.product_info.values_list("id", flat=True))
+    for start in range(0, 30, 10):
+        add_to_basket(
+            buyer.id,
+            [
+                {"product_info": item, "quantity": 1}
+                for item in items[start : start + 10]
+            ],
+        )
+        basket = Order.objects.get(user=buyer, state="basket")
+        place_order(buyer.id, basket.id, contact.id)
+    return {
+        "shop": shop,
+        "buyer": Token.objects.create(user=buyer).key,
+        "partner": Token.objects.create(user=partner).key,
+    }
+
+
+def get_sync(path, token=None):
+    cache.clear()
+    headers = {"HTTP_AUTHORIZATION": f"Token {token}"} if token else {}
+    return Client().get(path, **headers)
+
+
+def get_async(path, token=None):
+    cache.clear()
+    headers = {"Authorization": f"Token {token}"} if token else {}
+    return async_to_sync(AsyncClient().get)(path, headers=headers)
+
+
+@pytest.mark.django_db
+def test_async_views_match_sync(shop, settings):
+    shop_id = shop["shop"].id
+    requests = [
+        ("/api/v1/categories", None),
+        ("/api/v1/shops", None),
+        ("/api/v1/shops?page=5", None),
+        (f"/api/v1/products?shop_id={shop_id}&page_size=7", None),
+        (f"/api/v1/products?shop_id={shop_id}&param=Цвет=белый", None),
+        ("/api/v1/products?price_min=дешево", None),
+        ("/api/v1/order", shop["buyer"]),
+        ("/api/v1/order", "0" * 40),
+        ("/api/v1/partner/orders", shop["partner"]),
+    ]
+    expected = [get_sync(path, token) for path, token in requests]
+    cursor = expected[3].json()["next"].split("?")[1]
+    expected.append(get_sync(f"/api/v1/products?{cursor}"))
+    settings.ROOT_URLCONF = "my_project.asgi_urls"
+    responses = [get_async(path, token) for path, token in requests]
+    responses.append(get_async(f"/api/v1/products?{cursor}"))
+    for (path, _), sync, response in zip(requests, expected, responses):
+        assert response.status_code == sync.status_code, path
+        assert response.content == sync.content, path
+        assert response.headers["Content-Type"] == sync.headers["Content-Type"]
+        assert response.headers["Allow"] == sync.headers["Allow"]
+    assert [response.status_code for response in responses] == [
+        200,
+        200,
+        404,
+        200,
+        200,
+        400,
+        200,
+        403,
+        200,
+        200,
+    ]
+    # Вторая страница и продолжение через курсор
+    assert len(responses[-1].json()["results"]) == 7
+    assert responses[-1].json()["previous"]
+    # Кеш каталога и ETag работают так же
+    etag = get_async("/api/v1/categories").headers["ETag"]
+    response = async_to_sync(AsyncClient().get)(
+        "/api/v1/categories", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_async_views_guard_and_throttle(shop, settings):
+    settings.ROOT_URLCONF = "my_project.asgi_urls"
+    settings.THROTTLE_RATES = {"anon": "2/min", "user": "2/min", "catalog": "2/min"}
+    client = AsyncClient()
+    # Анонимам и покупателям закрытые списки отдают отказ, как и синхронно
+    response = async_to_sync(client.get)("/api/v1/order")
+    assert response.status_code == 403
+    response = get_async("/api/v1/partner/orders", shop["buyer"])
+    assert response.json() == {"Status": False, "Error": "Только для магазинов"}
+    statuses = [
+        async_to_sync(client.get)("/api/v1/shops").status_code for _ in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+    response = async_to_sync(client.get)("/api/v1/categories")
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 30
+    # Запись по тому же адресу обрабатывает синхронное представление
+    response = async_to_sync(client.post)(
+        "/api/v1/order",
+        {"id": "1", "contact": "1"},
+        content_type="application/json",
+        headers={"Authorization": f"Token {shop['buyer']}"},
+    )
+    assert response.json()["Status"] is False
+
+
+@pytest.mark.django_db
+def test_sync_views_guard(shop):
+    forbidden = {"Status": False, "Error": "Требуется вход в систему"}
+    for path in ["/api/v1/order", "/api/v1/basket", "/api/v1/partner/orders"]:
+        response = get_sync(path)
+        assert response.status_code == 403
+        assert response.json() == forbidden
+    response = get_sync("/api/v1/partner/orders", shop["buyer"])
+    assert response.status_code == 403
+    assert response.json() == {"Status": False, "Error": "Только для магазинов"}
+    response = get_sync("/api/v1/partner/state", shop["buyer"])
+    assert response.json() == {"Status": False, "Error": "Только для магазинов"}
+    response = Client().post("/api/v1/basket", {"items": "[]"})
+    assert response.json() == forbidden
+    assert len(get_sync("/api/v1/order", shop["buyer"]).json()) == 3
+
+
+def test_concurrency_limit():
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.2)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def call(application):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await application({"type": "http"}, None, send)
+        return messages[0]["status"], dict(messages[0]["headers"])
+
+    async def run(limit, timeout):
+        application = ConcurrencyLimit(app, limit=limit, timeout=timeout)
+        return await asyncio.gather(*(call(application) for _ in range(3)))
+
+    # Двое обрабатываются, третий не дождался очереди
+    results = async_to_sync(run)(2, 0.05)
+    assert sorted(status for status, _ in results) == [200, 200, 503]
+    assert [
+        headers[b"retry-after"] for status, headers in results if status == 503
+    ] == [b"1"]
+    # С запасом по времени ожидания дождутся все
+    assert [status for status, _ in async_to_sync(run)(2, 1)] == [200, 200, 200]
+    assert [status for status, _ in async_to_sync(run)(0, 0)] == [200, 200, 200]
@@ -0,0 +1,52 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from yaml import load as load_yaml, Loader
+
+from backend.models import User
+from backend.throttling import bucket_store
+from my_project import celery_app
+
+
+@pytest.fixture(autouse=True)
+def celery_eager():
+    # Фоновые задачи выполняются сразу в процессе теста, брокер не нужен
+    # Настройки Celery читаются с префиксом CELERY_, поэтому меняем ключ с префиксом
+    always_eager = celery_app.conf.task_always_eager
+    celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True
+    yield
+    celery_app.conf.CELERY_TASK_ALWAYS_EAGER = always_eager
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Без очистки кеша и счетчиков throttling тесты влияют друг на друга
+    cache.clear()
+    bucket_store().clear()
+
+
+@pytest.fixture
+def partner():
+    # Поставщик для загрузки прайсов в tests/backend
+    return User.objects.create_user(
+        email="partner@example.com", password="11ff22FF33cc44CC", type="shop"
+    )
+
+
+@pytest.fixture
+def price_list():
+    # Прайс из data/shop1.yaml, загруженный целиком
+    with open(settings.BASE_DIR / "data" / "shop1.yaml", encoding="utf-8") as file:
+        return load_yaml(file, Loader=Loader)
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    # Вторая тестовая база на том же сервере - реплика для tests/backend/test_replicas.py.
+    # Репликации между ними нет: данные в реплику пишутся явно, поэтому по
+    # ответу видно, из какой базы он прочитан
+    default = settings.DATABASES["default"]
+    settings.DATABASES["replica"] = {
+        **default,
+        "TEST": {**default.get("TEST", {}), "NAME": f"test_{default['NAME']}_replica"},
+    }